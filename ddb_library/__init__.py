@@ -2,5 +2,11 @@ from .library import Library
 from .book import Book
 from .page import Page
 from .content_reference import ContentReference
+from .reference_graph import ReferenceGraph
+from .watcher import LibraryWatcher
+from .change_feed import ChangeFeed
+from .html_cache import HtmlCache
+from .exporter import ContentExporter
+from .federation import Federation
 
-__all__ = ['Library','Book','Page','ContentReference']
\ No newline at end of file
+__all__ = ['Library','Book','Page','ContentReference','ReferenceGraph','LibraryWatcher','ChangeFeed','HtmlCache','ContentExporter','Federation']
@@ -0,0 +1,184 @@
+from .fs_snapshot import LIVE_FILE_SYSTEM, MOUNTS, FileSystemSnapshot, mount, unmount
+import io
+import json
+import mmap
+import os
+import struct
+import zlib
+
+MAGIC = b'DDBPACK1'
+TRAILER = struct.Struct('<QQ')
+VERSION = 1
+
+def is_archive(path):
+    """Returns True if the given file is a packed library archive.
+    """
+    if not os.path.isfile(path): return False
+    with open(path, 'rb') as fin:
+        return fin.read(len(MAGIC)) == MAGIC
+
+def absolute_paths(d):
+    """Returns a copy of a library dict with every `path` made absolute,
+    so the library and its archive don't depend on the working folder.
+    """
+    if type(d) is list:
+        return [absolute_paths(v) for v in d]
+    if type(d) is not dict:
+        return d
+    return {k: os.path.abspath(v) if k == 'path' and type(v) is str else absolute_paths(v)
+        for k, v in d.items()}
+
+def write_archive(path, root, files, **kwargs):
+    """Writes the given files, a dict of path to modification time, into a
+    single archive at `path`. Paths are stored relative to `root`.
+
+    Each file is compressed with zlib unless `compress` is False, or an int
+    giving the compression level. Any `library` dict is stored in the index
+    alongside the files. The root and the library's paths are stored as 
+    absolute paths, so archives packed from different folders are mounted
+    at different roots.
+    """
+    compress = kwargs.get('compress', True)
+    level = compress if type(compress) is int else 6
+
+    root = os.path.abspath(root)
+    library = kwargs.get('library', None)
+    index = {'version': VERSION, 'root': root, 'library': absolute_paths(library) if library else None, 'files': {}}
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fout:
+        fout.write(MAGIC)
+        for file_path in sorted(files):
+            data = LIVE_FILE_SYSTEM.read_bytes(file_path)
+            size = len(data)
+            compressed = False
+            if compress:
+                packed = zlib.compress(data, level)
+                if len(packed) < size:
+                    data, compressed = packed, True
+            name = os.path.relpath(file_path, root).replace(os.sep, '/')
+            index['files'][name] = [fout.tell(), len(data), size, files[file_path], compressed]
+            fout.write(data)
+
+        index_data = json.dumps(index).encode('utf-8')
+        index_offset = fout.tell()
+        fout.write(index_data)
+        fout.write(TRAILER.pack(index_offset, len(index_data)))
+        fout.write(MAGIC)
+    os.replace(tmp_path, path)
+    return path
+
+class LibraryArchive(FileSystemSnapshot):
+    """A packed library: its pages, sources file and library.json in one
+    indexed file, read through a memory map.
+
+    An archive answers the same questions as a FileSystemSnapshot of the
+    library's folder without any directory walks. Once mounted, every read
+    of a path below the library's folder, through Page.get_html or any
+    other method, comes from the archive instead of the disk.
+    """
+    def __init__(self, path, **kwargs):
+        self.path = os.path.abspath(path)
+        self.fin = open(self.path, 'rb')
+        self.data = mmap.mmap(self.fin.fileno(), 0, access=mmap.ACCESS_READ)
+
+        end = len(self.data) - len(MAGIC)
+        if self.data[:len(MAGIC)] != MAGIC or self.data[end:] != MAGIC:
+            self.close()
+            raise ValueError(f'"{path}" is not a library archive.')
+        index_offset, index_size = TRAILER.unpack(self.data[end - TRAILER.size:end])
+        self.index = json.loads(self.data[index_offset:index_offset + index_size].decode('utf-8'))
+
+        self.library = self.index['library']
+        self.entries = {
+            os.path.join(self.index['root'], *name.split('/')): entry
+            for name, entry in self.index['files'].items()
+        }
+        super().__init__(self.index['root'], files=[])
+        if kwargs.get('mount', False):
+            self.mount()
+
+    def __repr__(self):
+        return f'LibraryArchive(path={self.path!r}, root={self.root!r}, files={len(self.files)})'
+
+    def __reduce__(self):
+        return (self.__class__, (self.path,), {'mounted': self.is_mounted()})
+
+    def __setstate__(self, state):
+        if state.get('mounted', False):
+            self.mount()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        """Unmounts the archive and closes its file.
+        """
+        if getattr(self, 'root', None):
+            self.unmount()
+        if getattr(self, 'data', None) is not None:
+            self.data.close()
+            self.data = None
+        self.fin.close()
+
+    def is_mounted(self):
+        return MOUNTS.get(self.root, None) is self
+
+    def mount(self):
+        return mount(self)
+
+    def unmount(self):
+        return unmount(self)
+
+    def read_bytes(self, path):
+        """Returns the contents of a packed file.
+        """
+        if path not in self.entries:
+            raise FileNotFoundError(f'No such file in archive: "{path}"')
+        offset, length, size, modified, compressed = self.entries[path]
+        data = self.data[offset:offset + length]
+        return zlib.decompress(data) if compressed else data
+
+    def read_range(self, path, start, end):
+        """Returns bytes `start` to `end` of a packed file. Uncompressed
+        files are sliced straight from the memory map.
+        """
+        if path not in self.entries:
+            raise FileNotFoundError(f'No such file in archive: "{path}"')
+        offset, length, size, modified, compressed = self.entries[path]
+        if compressed:
+            return self.read_bytes(path)[start:end]
+        start, end = min(start, size), min(end, size)
+        return self.data[offset + start:offset + end]
+
+    def read_text(self, path):
+        """Returns the contents of a packed file, decoded and with newlines
+        translated the same way as reading it with `open(path, 'r')`.
+        """
+        return io.TextIOWrapper(io.BytesIO(self.read_bytes(path))).read()
+
+    def refresh(self):
+        """Builds the folder tree from the archive's index. Archives can't
+        change, so this only needs to run once.
+        """
+        self.files = {path: entry[3] for path, entry in self.entries.items()}
+        self.dirs = {self.root: ([], [])}
+        for path in sorted(self.files):
+            dirpath, filename = os.path.split(path)
+            self.add_dir(dirpath)
+            self.dirs[dirpath][1].append(filename)
+        return self
+
+    def add_dir(self, path):
+        if path in self.dirs or not self.covers(path): return
+        parent, dirname = os.path.split(path)
+        self.add_dir(parent)
+        self.dirs[path] = ([], [])
+        self.dirs[parent][0].append(dirname)
+
+    def size(self):
+        """Returns the number of packed files.
+        """
+        return len(self.entries)
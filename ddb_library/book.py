@@ -1,11 +1,19 @@
+from .content_reference import SourceDescriptor
 from .myencoder import MyEncoder
+from .fs_snapshot import LIVE_FILE_SYSTEM
 from .page import Page
+from .parallel import extract_books
 from bs4 import BeautifulSoup
+import hashlib
 import json
 import os
 import re
 
 class Book:
+    __slots__ = ['name', 'acronym', 'url', 'owned_content', 'path', 'table_of_contents', 'pages']
+
+    FIELDS = ['name', 'acronym', 'url', 'owned_content', 'path', 'table_of_contents', 'pages']
+
     def __init__(self, *args, **kwargs):
         d = args[0] if args else kwargs
         self.name = d.get('name', None)
@@ -25,13 +33,14 @@ class Book:
         #self.pages = [Page(**page) for page in d.get('pages', [])]
 
     def __repr__(self):
-        return f'{self.__dict__}'
+        return f'{self.to_dict()}'
 
     def add_page(self, page, **kwargs):
         replace = kwargs.get('replace', False)
 
         if type(page) is Page:
             new_page = page
+            if not new_page.root: new_page.set_root(self.path)
         else:
             new_page = Page(**page, root_path=self.path)
         
@@ -63,6 +72,7 @@ class Book:
 
         if type(page) is Page:
             new_page = page
+            if not new_page.root: new_page.set_root(self.path)
         else:
             new_page = Page(**page, root_path=self.path)
         
@@ -71,13 +81,25 @@ class Book:
         
         return self
     
+    def clone(self):
+        """Returns a copy of the book with copies of its table of contents
+        and pages, which can be updated without changing this book.
+        """
+        book = Book(name=self.name, acronym=self.acronym, url=self.url, owned_content=self.owned_content, path=self.path)
+        pages = ([self.table_of_contents] if self.table_of_contents else []) + self.pages
+        copies = [Page(**page.to_dict(), root_path=page.root) for page in pages]
+        if self.table_of_contents:
+            book.table_of_contents = copies.pop(0)
+        book.pages = copies
+        return book
+
     def copy(self, path, **kwargs):
         """Copies the contents of this folder to a new location."""
 
         dryrun = kwargs.get('dryrun', False)
         logging = kwargs.get('logging', True)
 
-        if not self.folder_exists():
+        if not self.folder_exists(**kwargs):
             raise FileNotFoundError("Folder does not exist.")
         
         # destination folder
@@ -100,8 +122,20 @@ class Book:
 
         return self
     
-    def folder_exists(self):
-        return os.path.isdir(self.path)
+    def fingerprint(self):
+        """Returns a 64 bit hash of the book details sent to worker
+        processes and the path, modification time and hash of each page,
+        which changes whenever the book or any of its pages is updated.
+        """
+        h = hashlib.blake2b(digest_size=8)
+        h.update(repr((self.name, self.acronym, self.url, self.owned_content, self.path)).encode('utf-8'))
+        for page in self.pages:
+            h.update(repr((page.path, page.modified, page.hash)).encode('utf-8'))
+        return int.from_bytes(h.digest(), 'little')
+
+    def folder_exists(self, **kwargs):
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
+        return fs.isdir(self.path)
 
     def get_html(self, **kwargs):
         if kwargs.get('extract_main_body', False):
@@ -123,70 +157,125 @@ class Book:
         return '\n'.join(html_start + book_html + html_end)
     
     def get_content(self, **kwargs):
+        if kwargs.get('workers', None):
+            return next(extract_books('content', [self], **kwargs))
+
         book_content = []
         for page in self.pages:
-            page_content = page.get_content(**kwargs)
-            for content in page_content:
-                content.sources = [{
-                    "name": self.name,
-                    "acronym": self.acronym,
-                    "url": self.url,
-                    "path": self.path,
-                    "page": {
-                        "name": page.name,
-                        "url": page.url,
-                        "path": page.path,
-                    }
-                }]
-            
-            book_content += page_content
+            book_content += self.get_page_content(page, **kwargs)
         return book_content
     
     def get_encounters(self, **kwargs):
+        if kwargs.get('workers', None):
+            return next(extract_books('encounters', [self], **kwargs))
+
         encounters = []
         for page in self.pages:
-            page_encounters = page.get_encounters(**kwargs)
-            for encounter in page_encounters:
-                encounter['book'] = self.name
-                encounter['book_path'] = self.name + '; ' + encounter['book_path']
-            encounters += page_encounters
+            encounters += self.get_page_encounters(page, **kwargs)
 
         return encounters
 
+    def get_page_content(self, page, **kwargs):
+        """Returns the content found in the given page of this book, with
+        its sources set to this book and page.
+        """
+        page_content = page.get_content(**kwargs)
+        if not page_content: return page_content
+
+        # one read-only descriptor is shared by all content from the page
+        source = SourceDescriptor({
+            "name": self.name,
+            "acronym": self.acronym,
+            "url": self.url,
+            "path": self.path,
+            "page": SourceDescriptor({
+                "name": page.name,
+                "url": page.url,
+                "path": page.path,
+            })
+        })
+        for content in page_content:
+            content.sources = [source]
+        return page_content
+
+    def get_page_encounters(self, page, **kwargs):
+        """Returns the encounters found in the given page of this book.
+        """
+        page_encounters = page.get_encounters(**kwargs)
+        for encounter in page_encounters:
+            encounter['book'] = self.name
+            encounter['book_path'] = self.name + '; ' + encounter['book_path']
+        return page_encounters
+
     def get_magic_items(self, **kwargs):
         return self.get_content(types=['magic item'], **kwargs)
     
     def get_monsters(self, **kwargs):
         return self.get_content(types=['monster'], **kwargs)
     
+    def get_section(self, heading_path, **kwargs):
+        """Returns the html of the section under the given headings, a list
+        or a '; ' separated string ending with the section's own heading,
+        e.g. 'Chapter 1; Goblin Arrows'. Leading headings can be left out.
+        Returns None if no page has a matching section.
+
+        Only the section's part of the page file is read, and it's processed
+        with any `process_html` options given.
+        """
+        if type(heading_path) is str:
+            heading_path = heading_path.split(';')
+        heading_path = [h.strip().lower() for h in heading_path if h.strip()]
+        if not heading_path: return None
+
+        for page, section in self.sections(**kwargs):
+            path = [h.lower() for h in section['path']]
+            if path[-len(heading_path):] == heading_path:
+                return page.get_section(section, **kwargs)
+        return None
+
     def get_spells(self, **kwargs):
         return self.get_content(types=['spell'], **kwargs)
     
+    def header(self):
+        """Returns a copy of this book without its pages, used to pass
+        book details to worker processes.
+        """
+        return Book(name=self.name, acronym=self.acronym, url=self.url, 
+            owned_content=self.owned_content, path=self.path)
+
     def is_owned_content(self):
         return self.owned_content
 
     def last_modified(self):
-        lm = 0 if not self.table_of_contents else self.table_of_contents.modified
-        if self.pages:
-            lm = max(lm, max([p.modified for p in self.pages]))
-        return lm
+        """Returns the latest modification time of the book's files, or 0.
+        Placeholder pages without a file are ignored.
+        """
+        pages = ([self.table_of_contents] if self.table_of_contents else []) + self.pages
+        return max([p.modified for p in pages if p.modified is not None], default=0)
+
+    def folder_files(self, **kwargs):
+        """Returns the path of each html file in the book's folder, in the
+        order they're loaded by `load_folder`.
+        """
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
+        return [os.path.join(dirpath, file)
+            for (dirpath, dirnames, filenames) in fs.walk(self.path)
+            for file in filenames if file.endswith('.html')]
 
     def load_folder(self, **kwargs):
-        if not self.folder_exists():
+        if not self.folder_exists(**kwargs):
             raise FileNotFoundError("folder doesn't exist")
         
         # add a page for each html file in folder
-        for (dirpath, dirnames, filenames) in os.walk(self.path):
-            for file in filenames:
-                if file.endswith('.html'):
-                    file = os.path.join(dirpath, file).replace(self.path+'/', '')
-                    file_path = os.path.join(self.path, file)
-                    page = Page(file=file, path=file_path)
-                    page.update()
-                    if page.type == 'toc':
-                        self.add_toc(page)
-                    else:
-                        self.add_page(page)
+        for file_path in self.folder_files(**kwargs):
+            file = file_path.replace(self.path+'/', '')
+            file_path = os.path.join(self.path, file)
+            page = Page(file=file, path=file_path, root_path=self.path)
+            page.update(**kwargs)
+            if page.type == 'toc':
+                self.add_toc(page)
+            else:
+                self.add_page(page)
         
         # construct final set of pages with toc at the front and in correct page order
         if self.table_of_contents:
@@ -196,6 +285,28 @@ class Book:
         
         return self
 
+    def load_files(self, paths, **kwargs):
+        """Adds or replaces the pages for the given html files, then 
+        reconstructs the book's page order.
+        """
+        for file_path in paths:
+            file = file_path.replace(self.path+'/', '')
+            page = Page(file=file, path=file_path, root_path=self.path)
+            page.update(**kwargs)
+            if page.type == 'toc':
+                self.add_toc(page, replace=True)
+            else:
+                self.add_page(page, replace=True)
+        
+        # drop placeholder pages so they aren't matched ahead of new files
+        self.pages = [page for page in self.pages if page.path]
+        if self.table_of_contents:
+            self.load_toc()
+        
+        self.order_pages()
+        
+        return self
+
     def load_toc(self, **kwargs):
         """Finds all pages listed in the book's table of contents.
         """
@@ -213,8 +324,8 @@ class Book:
         
         if not self.table_of_contents: return []
 
-        with open(self.table_of_contents.path, 'r') as fin:
-            soup = BeautifulSoup(fin.read(), 'html.parser')
+        html_text = LIVE_FILE_SYSTEM.read_text(self.table_of_contents.path)
+        soup = BeautifulSoup(html_text, 'html.parser')
 
         if not soup: return []
         
@@ -289,13 +400,45 @@ class Book:
                 return page
         return None
     
+    def read_order(self):
+        """Returns the paths of the book's files in the order `copy` and 
+        `get_html` read them.
+        """
+        pages = ([self.table_of_contents] if self.table_of_contents else []) + self.pages
+        return [page.path for page in pages if page.path]
+
+    def page_paths(self):
+        """Returns the paths of all pages in the book.
+        """
+        return [page.path for page in self.pages if page.path]
+
+    def refresh_modified(self, **kwargs):
+        """Records the new modification times of the book's files whose
+        contents still match their stored hash. Returns the number of files
+        refreshed. See `Page.refresh_modified`.
+        """
+        pages = ([self.table_of_contents] if self.table_of_contents else []) + self.pages
+        return len([page for page in pages if page.refresh_modified(**kwargs)])
+
+    def sections(self, **kwargs):
+        """Yields (page, section) for each heading in the book's pages, in
+        page order. See `Page.get_sections`.
+        """
+        for page in self.pages:
+            if not page.path: continue
+            for section in page.get_sections(**kwargs):
+                yield page, section
+
     def size(self):
         """Returns the number of pages in the book.
         """
         return len(self.pages)
     
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
     def to_json(self, **kwargs):
-        return json.dumps(self.__dict__, cls=MyEncoder, **kwargs)
+        return json.dumps(self.to_dict(), cls=MyEncoder, **kwargs)
     
     def update(self, **kwargs):
         self.name = kwargs.get('name', self.name)
@@ -303,18 +446,25 @@ class Book:
         self.url = kwargs.get('url', self.url)
         self.owned_content = kwargs.get('owned_content', self.owned_content)
         self.path = kwargs.get('path', self.path)
+        options = {'hash': kwargs.get('hash', False), 'snapshot': kwargs.get('snapshot', None),
+            'digests': kwargs.get('digests', None)}
+        fs = options['snapshot'] or LIVE_FILE_SYSTEM
         
-        if self.table_of_contents and self.table_of_contents.update_available():
-            self.table_of_contents.update()
+        if self.table_of_contents and self.table_of_contents.update_available(**options):
+            self.table_of_contents.update(**options)
             self.load_toc()
+        elif self.table_of_contents and options['hash']:
+            self.table_of_contents.refresh_modified(**options)
 
         if self.pages:
             for page in self.pages:
-                if page.update_available():
-                    page.update()
-        elif self.folder_exists():
-            if len(os.listdir(self.path)) > 0:
-                self.load_folder()
+                if page.update_available(**options):
+                    page.update(**options)
+                elif options['hash']:
+                    page.refresh_modified(**options)
+        elif self.folder_exists(**options):
+            if len(fs.listdir(self.path)) > 0:
+                self.load_folder(**options)
         
         return self
 
@@ -323,37 +473,40 @@ class Book:
         modified since this was created or last updated.
         """
         logging = kwargs.get('logging', False)
+        options = {'hash': kwargs.get('hash', False), 'snapshot': kwargs.get('snapshot', None),
+            'digests': kwargs.get('digests', None)}
+        fs = options['snapshot'] or LIVE_FILE_SYSTEM
 
-        if self.table_of_contents and self.table_of_contents.update_available():
+        if self.table_of_contents and self.table_of_contents.update_available(**options):
             if logging: print('Update available - table of contents')
             return True
         
         if self.pages:
             for page in self.pages:
-                if page.update_available():
+                if page.update_available(**options):
                     if logging: print('Update available - pages')
                     return True
         
-        elif self.folder_exists():
-            if len(os.listdir(self.path)) > 0:
+        elif self.folder_exists(**options):
+            if len(fs.listdir(self.path)) > 0:
                 if logging: print('Update available - folder')
                 return True
         
         if logging: print('Update not available')
         return False
 
-    def validate(self):
+    def validate(self, **kwargs):
         if not self.path:
             return False
         
-        if not os.path.isdir(self.path):
+        if not self.folder_exists(**kwargs):
             return False
         
-        if self.table_of_contents and not self.table_of_contents.validate():
+        if self.table_of_contents and not self.table_of_contents.validate(**kwargs):
             return False
         
         for page in self.pages:
-            if not page.validate():
+            if not page.validate(**kwargs):
                 return False
             
         return True
\ No newline at end of file
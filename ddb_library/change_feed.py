@@ -0,0 +1,199 @@
+from .myencoder import MyEncoder
+import hashlib
+import json
+
+VERSION = 2
+KEEP = 100
+
+def item_hash(item):
+    """Returns a hash of a ContentReference or encounter, ignoring its
+    modification time.
+    """
+    d = item if type(item) is dict else item.__dict__
+    d = {k: v for k, v in d.items() if k != 'modified'}
+    data = json.dumps(d, cls=MyEncoder, sort_keys=True).encode('utf-8')
+    return hashlib.blake2b(data, digest_size=16).hexdigest()
+
+def feed_items(**kwargs):
+    """Returns a dict mapping a stable key to (kind, item) for the given
+    `content` and `encounters`. Content is keyed by id. Encounters are
+    keyed by page, heading, and their position under that heading.
+    """
+    items = {}
+    for content in kwargs.get('content', None) or []:
+        items['content/' + content.id] = ('content', content)
+
+    counts = {}
+    for encounter in kwargs.get('encounters', None) or []:
+        group = f"encounter/{encounter['path']}#{encounter['book_path']}"
+        counts[group] = counts.get(group, -1) + 1
+        items[f'{group}#{counts[group]}'] = ('encounter', encounter)
+    return items
+
+def item_scope(kind, item):
+    """Returns the content type and page paths recorded with an item, so
+    later partial extractions can tell whether they cover it.
+    """
+    if kind == 'content':
+        return {'type': item.type, 'paths': sorted({s['page']['path'] for s in item.sources})}
+    return {'paths': [item['path']]}
+
+def in_scope(entry, types, paths):
+    """Returns whether an extraction limited to content `types` and page
+    `paths` covers an entry. None means the extraction wasn't limited.
+    Entries recorded without a scope are only covered by full extractions.
+    """
+    if types is not None and entry['kind'] == 'content' and entry.get('type', None) not in types:
+        return False
+    if paths is not None and not any(path in paths for path in entry.get('paths', [])):
+        return False
+    return True
+
+class ChangeFeed:
+    """Records the content and encounters extracted from a library at a
+    series of numbered checkpoints, and lists what was added, modified or
+    removed since any earlier checkpoint.
+
+    Only a hash of each item is kept between runs. Items are compared by
+    everything but their modification time, so pages that are saved again
+    without changes don't show up as modified.
+
+    Removed items are remembered for the last `keep` checkpoints (default
+    100). Changes since an older checkpoint can't list every removal, so
+    they list every current item as added and set `reset`.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.checkpoint = d.get('checkpoint', 0)
+        self.keep = d.get('keep', KEEP)
+        self.oldest = d.get('oldest', 0)
+        self.entries = d.get('entries', {})
+        self.removed = d.get('removed', {})
+
+    @classmethod
+    def from_json_file(cls, json_path):
+        with open(json_path, 'r') as fin:
+            json_dict = json.load(fin)
+        return cls(json_dict)
+
+    def __repr__(self):
+        return f'ChangeFeed(checkpoint={self.checkpoint}, entries={len(self.entries)}, removed={len(self.removed)})'
+
+    def changes(self, **kwargs):
+        """Returns the changes made since checkpoint `since`, which defaults
+        to 0 and lists every current item as added. Pass the current
+        `content` and `encounters` to include each added or modified item
+        in the feed, rather than only its key.
+
+        Removed items are only listed if they existed at `since`. An item
+        removed and added again is listed as added, so consumers should
+        treat added and modified items alike. If `since` is older than the
+        oldest checkpoint whose removals are still known, every item is
+        listed as added and `reset` is set, so consumers should replace
+        everything they hold.
+        """
+        since = kwargs.get('since', None) or 0
+        reset = 0 < since < self.oldest
+        if reset: since = 0
+        items = feed_items(**kwargs)
+
+        changes = {
+            'version': VERSION,
+            'since': since,
+            'checkpoint': self.checkpoint,
+            'reset': reset,
+            'added': [],
+            'modified': [],
+            'removed': [],
+        }
+        for key in sorted(self.entries):
+            entry = self.entries[key]
+            if entry['added'] > since:
+                change = 'added'
+            elif entry['modified'] > since:
+                change = 'modified'
+            else:
+                continue
+            d = {'key': key, 'kind': entry['kind'], 'hash': entry['hash']}
+            if key in items:
+                d['item'] = items[key][1]
+            changes[change].append(d)
+
+        for key in sorted(self.removed):
+            entry = self.removed[key]
+            if entry['removed'] > since and entry['added'] <= since:
+                changes['removed'].append({'key': key, 'kind': entry['kind']})
+        return changes
+
+    def record(self, **kwargs):
+        """Compares the given `content` and/or `encounters` with the last
+        checkpoint and starts a new checkpoint if anything changed. Returns
+        the current checkpoint.
+
+        Only the kinds given are compared. If the extraction was limited to
+        some content `types` or to the pages at `paths`, only items of
+        those types or from those pages count as removed when missing, and
+        items also found on other pages are left for a full extraction.
+        """
+        kinds = [kind for kind, k in [('content', 'content'), ('encounter', 'encounters')]
+            if kwargs.get(k, None) is not None]
+        types = kwargs.get('types', None)
+        paths = kwargs.get('paths', None)
+        if paths is not None: paths = set(paths)
+        items = feed_items(**kwargs)
+        checkpoint = self.checkpoint + 1
+        changed = False
+
+        for key, (kind, item) in items.items():
+            digest = item_hash(item)
+            entry = self.entries.get(key, None)
+            if entry is not None and paths is not None and not paths.issuperset(entry.get('paths', [])):
+                # only partly extracted, e.g. content merged from other books
+                continue
+            if entry is None:
+                self.entries[key] = {'kind': kind, 'hash': digest, 'added': checkpoint, 'modified': checkpoint}
+                self.removed.pop(key, None)
+                changed = True
+            elif entry['hash'] != digest:
+                entry['hash'] = digest
+                entry['modified'] = checkpoint
+                changed = True
+            self.entries[key].update(item_scope(kind, item))
+
+        for key in [key for key, entry in self.entries.items()
+                if entry['kind'] in kinds and key not in items and in_scope(entry, types, paths)]:
+            entry = self.entries.pop(key)
+            self.removed[key] = {'kind': entry['kind'], 'added': entry['added'], 'removed': checkpoint}
+            changed = True
+
+        if changed:
+            self.checkpoint = checkpoint
+            self.prune()
+        return self.checkpoint
+
+    def prune(self):
+        """Forgets items removed before the oldest of the last `keep`
+        checkpoints.
+        """
+        self.oldest = max(self.oldest, self.checkpoint - self.keep)
+        self.removed = {key: entry for key, entry in self.removed.items() if entry['removed'] > self.oldest}
+
+    def save_json(self, path, **kwargs):
+        logging = kwargs.get('logging', True)
+        if logging: print(f'Saving change feed to {path}.')
+        with open(path, 'w') as fout:
+            fout.write(self.to_json(indent=kwargs.get('indent', None)))
+
+    def size(self):
+        """Returns the number of items currently recorded.
+        """
+        return len(self.entries)
+
+    def to_json(self, **kwargs):
+        return json.dumps({
+            'checkpoint': self.checkpoint,
+            'keep': self.keep,
+            'oldest': self.oldest,
+            'entries': self.entries,
+            'removed': self.removed,
+        }, cls=MyEncoder, **kwargs)
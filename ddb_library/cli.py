@@ -0,0 +1,377 @@
+from .archive import is_archive
+from .html_cache import HtmlCache
+from .library import Library
+from .myencoder import MyEncoder
+import argparse
+import cProfile
+import io
+import json
+import os
+import pstats
+import sys
+import time
+
+class Timer:
+    """Collects wall clock timings for named stages of a command."""
+    def __init__(self):
+        self.timings = {}
+        self.start = time.perf_counter()
+
+    def stage(self, name):
+        return TimerStage(self, name)
+
+    def total(self):
+        return time.perf_counter() - self.start
+
+class TimerStage:
+    def __init__(self, timer, name):
+        self.timer = timer
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *args):
+        elapsed = time.perf_counter() - self.start
+        self.timer.timings[self.name] = self.timer.timings.get(self.name, 0) + elapsed
+
+def library_json_path(path):
+    """Returns the path to library.json for a library folder or json file.
+    """
+    return os.path.join(path, 'library.json') if os.path.isdir(path) else path
+
+def load_library(args, timer):
+    with timer.stage('load'):
+        if is_archive(args.library):
+            return Library.from_archive(args.library)
+        return Library.from_json_file(library_json_path(args.library))
+
+def cmd_build(args, timer):
+    if args.shard:
+        shard, shards = [int(v) for v in args.shard.split('/')]
+        output = args.output or f'library.shard-{shard}-of-{shards}.json'
+    else:
+        output = args.output or 'library.json'
+    
+    json_path = os.path.join(args.path, output)
+    if args.incremental and os.path.isfile(json_path):
+        with timer.stage('load'):
+            lib = Library.from_json_file(json_path)
+        with timer.stage('update'):
+            lib.update(logging=args.logging)
+    else:
+        lib = Library(name=args.name, path=args.path, sources_file=args.sources_file)
+        with timer.stage('load_sources'):
+            lib.load_sources(logging=args.logging)
+        with timer.stage('load_books'):
+            if args.shard or args.acronyms:
+                lib = lib.build_shard(
+                    shard=shard if args.shard else 0,
+                    shards=shards if args.shard else None,
+                    acronyms=args.acronyms,
+                    logging=args.logging,
+                )
+            else:
+                lib.load_books(logging=args.logging)
+
+    with timer.stage('save'):
+        lib.save_json(file=output, logging=args.logging)
+    return library_stats(lib)
+
+def cmd_merge(args, timer):
+    with timer.stage('load'):
+        shards = [Library.from_json_file(path) for path in args.shards]
+    with timer.stage('merge'):
+        lib = Library.merge(shards, conflict=args.conflict)
+    with timer.stage('save'):
+        lib.save_json(file=args.output, logging=args.logging)
+    return library_stats(lib)
+
+def cmd_update(args, timer):
+    # an archive's files can't change, and saving would overwrite it
+    if is_archive(args.library):
+        raise SystemExit(f'Cannot update the packed archive "{args.library}". '
+            'Update the library folder it was packed from, then pack it again.')
+    lib = load_library(args, timer)
+    with timer.stage('update_available'):
+        updated = lib.get_book_names(update_available=True)
+        sources_updated = lib.sources.update_available(hash=lib.hash_files)
+    with timer.stage('update'):
+        lib.update(logging=args.logging)
+    if updated or sources_updated:
+        json_path = library_json_path(args.library)
+        with timer.stage('save'):
+            lib.save_json(path=os.path.dirname(json_path), file=os.path.basename(json_path), logging=args.logging)
+    return {'sources_updated': sources_updated, 'books_updated': updated}
+
+def cmd_copy(args, timer):
+    lib = load_library(args, timer)
+    options = json.loads(args.options) if args.options else {}
+    if args.html_cache:
+        options['html_cache'] = HtmlCache(args.html_cache)
+    if args.incremental:
+        options['book_names'] = [book.name for book in lib.books
+            if not copy_is_current(book, os.path.join(args.destination, 'sources', os.path.basename(book.path)))]
+    with timer.stage('copy'):
+        lib.copy(args.destination, logging=args.logging, **options)
+    book_names = options.get('book_names', lib.get_book_names())
+    return {
+        'destination': args.destination,
+        'books_copied': [name for name in lib.get_book_names(validate=True) if name in book_names],
+    }
+
+def copy_is_current(book, path):
+    """Returns True if every page of the book has already been copied to
+    the given folder since it was last modified.
+    """
+    pages = book.pages + ([book.table_of_contents] if book.table_of_contents else [])
+    for page in pages:
+        if not page.file: return False
+        copy_path = os.path.join(path, page.file)
+        if not os.path.isfile(copy_path): return False
+        if os.path.getmtime(copy_path) < (page.modified or 0): return False
+    return bool(pages)
+
+def extraction_args(args):
+    """Returns the arguments that decide what an extraction outputs, saved
+    next to the output so it's only reused for the same arguments.
+    """
+    return {
+        'library': os.path.abspath(args.library),
+        'encounters': args.encounters,
+        'types': args.types,
+        'acronyms': args.acronyms,
+        'parser': args.parser,
+    }
+
+def extraction_args_path(output):
+    return output + '.args.json'
+
+def cmd_extract(args, timer):
+    lib = load_library(args, timer)
+    json_path = library_json_path(args.library)
+    output = args.output or ('encounters.json' if args.encounters else 'content.json')
+    args_path = extraction_args_path(output)
+    if args.incremental and os.path.isfile(output) and os.path.isfile(args_path):
+        with timer.stage('update_available'):
+            with open(args_path, 'r') as fin:
+                current = json.load(fin) == extraction_args(args)
+            current = (current and not lib.update_available()
+                and os.path.getmtime(output) >= os.path.getmtime(json_path))
+        if current:
+            return {'output': output, 'reused': True}
+
+    kwargs = {'types': args.types, 'acronyms': args.acronyms, 'logging': args.logging, 'workers': args.jobs, 'parser': args.parser}
+    if args.html_cache:
+        kwargs['html_cache'] = HtmlCache(args.html_cache)
+    with timer.stage('extract'):
+        if args.encounters:
+            items = lib.get_encounters(**kwargs)
+        else:
+            items = lib.get_content(**kwargs)
+
+    with timer.stage('save'):
+        with open(output, 'w') as fout:
+            json.dump(items, fout, cls=MyEncoder)
+        with open(args_path, 'w') as fout:
+            json.dump(extraction_args(args), fout)
+    return {
+        'output': output,
+        'reused': False,
+        'count': len(items),
+    }
+
+def cmd_export(args, timer):
+    lib = load_library(args, timer)
+    kwargs = {'types': args.types, 'acronyms': args.acronyms, 'logging': args.logging, 'workers': args.jobs,
+        'format': args.format, 'write_workers': args.write_workers, 'merge': not args.no_merge}
+    if args.html_cache:
+        kwargs['html_cache'] = HtmlCache(args.html_cache)
+    with timer.stage('export'):
+        stats = lib.export_content(args.destination, **kwargs)
+    return stats
+
+def cmd_manifest(args, timer):
+    lib = load_library(args, timer)
+    with timer.stage('manifest'):
+        manifest = lib.save_manifest(manifest_file=args.manifest_file, logging=args.logging)
+    return {'hash': manifest.hash, 'books': len(manifest.books), 'pages': manifest.size()}
+
+def cmd_diff(args, timer):
+    lib = load_library(args, timer)
+    with timer.stage('diff'):
+        if os.path.isdir(args.other):
+            other = Library.from_json_file(library_json_path(args.other))
+        else:
+            other = args.other
+        changes = lib.diff(other, manifest_file=args.manifest_file)
+    if args.output:
+        with timer.stage('save'):
+            with open(args.output, 'w') as fout:
+                json.dump(changes, fout)
+    return changes
+
+def cmd_pack(args, timer):
+    lib = load_library(args, timer)
+    output = args.output or os.path.join(lib.path, 'library.ddbpack')
+    with timer.stage('pack'):
+        lib.pack(output, compress=not args.no_compress, logging=args.logging)
+    return {'output': output, 'size': os.path.getsize(output)}
+
+def cmd_changes(args, timer):
+    lib = load_library(args, timer)
+    kwargs = {'types': args.types, 'logging': args.logging, 'workers': args.jobs, 'feed_file': args.feed_file}
+    if args.since is not None:
+        kwargs['since'] = args.since
+    with timer.stage('extract'):
+        changes = lib.get_changes(**kwargs)
+
+    if args.output:
+        with timer.stage('save'):
+            with open(args.output, 'w') as fout:
+                json.dump(changes, fout, cls=MyEncoder)
+    return {
+        'output': args.output,
+        'since': changes['since'],
+        'checkpoint': changes['checkpoint'],
+        'added': len(changes['added']),
+        'modified': len(changes['modified']),
+        'removed': len(changes['removed']),
+    }
+
+def cmd_stats(args, timer):
+    lib = load_library(args, timer)
+    with timer.stage('stats'):
+        stats = library_stats(lib)
+        stats['books_update_available'] = lib.get_book_names(update_available=True)
+        stats['sources_update_available'] = lib.sources.update_available(hash=lib.hash_files)
+    return stats
+
+def library_stats(lib):
+    owned = [book for book in lib.books if book.is_owned_content()]
+    return {
+        'name': lib.name,
+        'path': lib.path,
+        'books': lib.size(),
+        'owned_books': len(owned),
+        'pages': sum(book.size() for book in owned),
+    }
+
+def make_parser():
+    parser = argparse.ArgumentParser(prog='ddb_library', description='Build and query local D&D Beyond libraries.')
+    common = argparse.ArgumentParser(add_help=False)
+    common.add_argument('--incremental', action='store_true', help='reuse existing library state and outputs')
+    common.add_argument('--profile', action='store_true', help='report timings and the slowest functions')
+    common.add_argument('--json', action='store_true', help='print machine-readable output only')
+
+    # only commands that extract content use worker processes
+    extracting = argparse.ArgumentParser(add_help=False)
+    extracting.add_argument('--jobs', '-j', type=int, default=1, help='number of worker processes used for extraction')
+
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    p = subparsers.add_parser('build', parents=[common], help='build a library from its sources file')
+    p.add_argument('path', help='library folder')
+    p.add_argument('--name', default='local DDB library')
+    p.add_argument('--sources-file', default='sources.html')
+    p.add_argument('--output', help='output json file, defaults to library.json')
+    p.add_argument('--shard', help='build only shard I of N, given as I/N')
+    p.add_argument('--acronyms', nargs='+', help='build only the given books')
+    p.set_defaults(func=cmd_build)
+
+    p = subparsers.add_parser('merge', parents=[common], help='merge partial libraries built with --shard')
+    p.add_argument('shards', nargs='+', help='partial library json files')
+    p.add_argument('--conflict', default='newest', choices=['newest','first','last','error'])
+    p.add_argument('--output', default='library.json')
+    p.set_defaults(func=cmd_merge)
+
+    p = subparsers.add_parser('update', parents=[common], help='update a library from modified files')
+    p.add_argument('library', help='library folder or json file')
+    p.set_defaults(func=cmd_update)
+
+    p = subparsers.add_parser('copy', parents=[common], help='copy a library to a new location')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('destination', help='destination folder')
+    p.add_argument('--options', help='json object of html processing options')
+    p.add_argument('--html-cache', help='folder used to cache processed html between runs')
+    p.set_defaults(func=cmd_copy)
+
+    p = subparsers.add_parser('extract', parents=[common, extracting], help='extract content or encounters')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('--types', nargs='+', default=['magic item','monster','spell'])
+    p.add_argument('--acronyms', nargs='+')
+    p.add_argument('--encounters', action='store_true', help='extract encounters instead of content')
+    p.add_argument('--parser', default='tree', choices=['tree','stream'], help='how encounters are found in each page')
+    p.add_argument('--html-cache', help='folder used to cache processed html between runs')
+    p.add_argument('--output', help='output json file')
+    p.set_defaults(func=cmd_extract)
+
+    p = subparsers.add_parser('export', parents=[common, extracting], help='export content as html files, json lines or a bundle')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('destination', help='output folder or .jsonl, .tar, .tar.gz or .zip file')
+    p.add_argument('--format', choices=['html','jsonl','tar','tar.gz','zip'], help='defaults to the extension of the destination')
+    p.add_argument('--types', nargs='+', default=['magic item','monster','spell'])
+    p.add_argument('--acronyms', nargs='+')
+    p.add_argument('--write-workers', type=int, default=8, help='number of threads writing html files')
+    p.add_argument('--no-merge', action='store_true', help='write each book as it is extracted, without merging by id')
+    p.add_argument('--html-cache', help='folder used to cache processed html between runs')
+    p.set_defaults(func=cmd_export)
+
+    p = subparsers.add_parser('changes', parents=[common, extracting], help='list content changed since a checkpoint')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('--types', nargs='+', default=['magic item','monster','spell'])
+    p.add_argument('--since', type=int, help='checkpoint to list changes from, defaults to the last run')
+    p.add_argument('--feed-file', default='changes.json', help='change feed file in the library folder')
+    p.add_argument('--output', help='output json file for the changes')
+    p.set_defaults(func=cmd_changes)
+
+    p = subparsers.add_parser('manifest', parents=[common], help='save a manifest of hashes of the library files')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('--manifest-file', default='manifest.json', help='manifest file in the library folder')
+    p.set_defaults(func=cmd_manifest)
+
+    p = subparsers.add_parser('diff', parents=[common], help='list the books and pages that differ from another copy')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('other', help='manifest json file or library folder of the other copy')
+    p.add_argument('--manifest-file', default='manifest.json', help='saved manifest used to skip hashing unchanged files')
+    p.add_argument('--output', help='output json file for the differences')
+    p.set_defaults(func=cmd_diff)
+
+    p = subparsers.add_parser('pack', parents=[common], help='pack a library into a single archive')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.add_argument('--output', help='archive file, defaults to library.ddbpack in the library folder')
+    p.add_argument('--no-compress', action='store_true', help='store files without compression')
+    p.set_defaults(func=cmd_pack)
+
+    p = subparsers.add_parser('stats', parents=[common], help='summarize a library')
+    p.add_argument('library', help='library folder, json file or packed archive')
+    p.set_defaults(func=cmd_stats)
+
+    return parser
+
+def main(argv=None):
+    args = make_parser().parse_args(argv)
+    args.logging = not args.json
+    timer = Timer()
+
+    profiler = cProfile.Profile() if args.profile else None
+    if profiler: profiler.enable()
+    result = args.func(args, timer)
+    if profiler: profiler.disable()
+
+    result = {'command': args.command, 'result': result}
+    if args.profile:
+        result['timings'] = dict(timer.timings, total=timer.total())
+        stream = io.StringIO()
+        pstats.Stats(profiler, stream=stream).sort_stats('cumulative').print_stats(15)
+        print(stream.getvalue(), file=sys.stderr)
+
+    if args.json:
+        print(json.dumps(result))
+    else:
+        for k, v in result['result'].items():
+            print(f'{k}: {v}')
+        for k, v in result.get('timings', {}).items():
+            print(f'{k} time: {v:.3f}s')
+    return 0
@@ -1,6 +1,19 @@
 import json
 from .myencoder import MyEncoder
 
+class SourceDescriptor(dict):
+    """A read-only dict describing a book and page content was found in.
+    Descriptors are shared between content references, so they can't be 
+    modified in place.
+    """
+    def __readonly(self, *args, **kwargs):
+        raise TypeError('SourceDescriptor is read-only')
+
+    __setitem__ = __delitem__ = clear = pop = popitem = setdefault = update = __readonly
+
+    def __reduce__(self):
+        return (SourceDescriptor, (dict(self),))
+
 class ContentReference:
     def __init__(self, *args, **kwargs):
         d = args[0] if args else kwargs
@@ -9,7 +22,7 @@ class ContentReference:
         self.id = d.get('id', None)
         self.modified = d.get('modified', None)
         self.path = d.get('path', None)
-        self.sources = d.get('path', [])
+        self.sources = d.get('sources', [])
         self.html = d.get('html', None)
 
     def __repr__(self):
@@ -0,0 +1,323 @@
+from html.parser import HTMLParser
+import re
+
+TEXT_TO_NUMBER = {
+    'one': 1,
+    'two': 2,
+    'three': 3,
+    'four': 4,
+    'five': 5,
+    'six': 6,
+    'seven': 7,
+    'eight': 8,
+    'nine': 9,
+    'ten': 10,
+    'eleven': 11,
+    'twelve': 12,
+    'dozen': 12,
+    'thirteen': 13,
+    'fourteen': 14,
+    'fifteen': 15,
+    'sixteen': 16,
+    'seventeen': 17,
+    'eighteen': 18,
+    'nineteen': 19,
+    'twenty': 20,
+    '.': 1,
+}
+
+RE_CONTENT_ID = re.compile(r'^(?P<id_num>\d+)-.*$')
+RE_NUMBER = re.compile(r'.*\b(?P<number>\d+|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|dozen|thirteen|fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|\.)\b', re.IGNORECASE)
+RE_DIGITS = re.compile(r'\d+')
+
+HEADINGS = ['h2','h3','h4','h5']
+
+# characters of html fed to the parser at a time
+BLOCK_SIZE = 1 << 16
+
+# tags that BeautifulSoup never leaves open, and tags whose strings it
+# leaves out of `get_text` or doesn't collapse when they're whitespace.
+VOID_TAGS = {
+    'area','base','br','col','embed','hr','img','input','keygen','link',
+    'menuitem','meta','param','source','track','wbr','basefont','bgsound',
+    'command','frame','image','isindex','nextid','spacer',
+}
+STRING_CONTAINER_TAGS = {'rt','rp','style','script','template'}
+PRESERVE_WHITESPACE_TAGS = {'pre','textarea'}
+ASCII_SPACES = '\x20\x0a\x09\x0c\x0d'
+
+def text_to_number(text):
+    """Returns the number of monsters given by the last number or number
+    word on the first line of the given text, or None if there isn't one.
+    """
+    m = RE_NUMBER.match(text)
+    if not m: return None
+    number = m['number'].lower()
+    if RE_DIGITS.match(number):
+        return int(number)
+    return TEXT_TO_NUMBER.get(number, 1)
+
+def monster_id(href):
+    """Returns the monster id at the end of a monster link, if it has one.
+    """
+    monster = href.split('/')[-1]
+    return monster if RE_CONTENT_ID.match(monster) else None
+
+class Heading:
+    """The text of a heading, collected as it's parsed."""
+    __slots__ = ['parts']
+
+    def __init__(self):
+        self.parts = []
+
+    def text(self):
+        return ''.join(self.parts)
+
+class Element:
+    """An open tag, with the parse state of paragraphs and plural monster
+    spans."""
+    __slots__ = ['name', 'kind', 'heading', 'monsters', 'number', 'text', 'headings', 'paragraph', 'index']
+
+    def __init__(self, name, kind=None):
+        self.name = name
+        self.kind = kind
+
+class EncounterParser(HTMLParser):
+    """Finds encounters in html in a single pass, without building a tree.
+
+    Gives the same results as `Page.get_encounters` parsing the same html
+    with BeautifulSoup's html.parser: headings h2 to h5 set the heading
+    path, and each paragraph's monster links, and the numbers written in
+    the text before them, make up an encounter. Only the open tags, the
+    paragraphs being read and the encounters not yet taken with
+    `iter_parse` are held in memory.
+    """
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self.stack = []
+        self.data = []
+        self.skipping = 0
+        self.containers = 0
+        self.preserving = 0
+        self.headings = {h: None for h in HEADINGS}
+        self.open_headings = []
+        self.open_paragraphs = []
+        self.plural_spans = []
+        self.already_closed = []
+        self.slots = []
+        self.encounters = []
+
+    def parse(self, html_text):
+        """Returns (headings, monsters, text) for each encounter in the
+        given html, where headings are the h2 to h5 headings it's under.
+        """
+        return list(self.iter_parse(html_blocks(html_text)))
+
+    def iter_parse(self, blocks):
+        """Yields (headings, monsters, text) for each encounter in the html
+        given as an iterable of strings, as soon as the paragraph holding
+        it is closed. Only encounters not yet yielded are held.
+        """
+        for block in blocks:
+            self.feed(block)
+            yield from self.take()
+
+        self.close()
+        self.flush()
+        while self.stack:
+            self.pop()
+        yield from self.take()
+
+    def take(self):
+        """Returns and forgets the encounters found so far, unless a heading
+        they might be under is still being read.
+        """
+        if not self.encounters or self.open_headings:
+            return []
+        encounters, self.encounters = self.encounters, []
+        return [([h.text() if h else None for h in headings], monsters, text)
+            for (headings, monsters, text) in encounters]
+
+    def flush(self, **kwargs):
+        """Handles the text read since the last tag as a single string,
+        the same way BeautifulSoup would.
+        """
+        if not self.data: return
+        text = ''.join(self.data)
+        self.data = []
+        if not text: return
+        if not self.preserving and not text.strip(ASCII_SPACES):
+            text = '\n' if '\n' in text else ' '
+        self.add_string(text, visible=kwargs.get('visible', not self.containers))
+
+    def add_string(self, text, **kwargs):
+        if self.skipping: return
+        if not kwargs['visible']:
+            text = ''
+        else:
+            for p in self.open_paragraphs:
+                p.text.append(text)
+            if self.open_headings:
+                stripped = text.strip()
+                if stripped:
+                    for h in self.open_headings:
+                        h.heading.parts.append(stripped)
+
+        # a string directly inside a paragraph may give the number of the
+        # next monster
+        top = self.stack[-1] if self.stack else None
+        if top is not None and top.kind == 'p':
+            number = text_to_number(text)
+            if number is not None:
+                top.number = number
+
+    def add_monster(self, p, attrs):
+        if 'monster-tooltip' not in (attrs.get('class', None) or '').split(): return
+        if 'href' not in attrs: return
+        monster = monster_id(attrs['href'] or '')
+        if not monster: return
+        p.monsters.append((p.number, monster))
+        p.number = 1
+
+    def handle_starttag(self, tag, attrs):
+        self.start_tag(tag, attrs)
+        if tag in VOID_TAGS:
+            self.already_closed.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.start_tag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.end_tag(tag)
+
+    def handle_endtag(self, tag):
+        # a later end tag for a void tag is ignored, without ending the text
+        if tag in self.already_closed:
+            self.already_closed.remove(tag)
+            return
+        self.end_tag(tag)
+
+    def start_tag(self, tag, attrs):
+        self.flush()
+        attrs = dict(attrs)
+        classes = (attrs.get('class', None) or '').split()
+        parent = self.stack[-1] if self.stack else None
+        element = Element(tag)
+
+        if self.skipping:
+            pass
+        elif tag == 'div' and 'flexible-double-column' in classes:
+            element.kind = 'skip'
+        elif tag in HEADINGS:
+            for h in reversed(HEADINGS):
+                if h == tag: break
+                self.headings[h] = None
+            element.kind = 'heading'
+            element.heading = self.headings[tag] = Heading()
+        elif tag == 'p':
+            element.kind = 'p'
+            element.monsters = []
+            element.number = 1
+            element.text = []
+            element.headings = [self.headings[h] for h in HEADINGS]
+            element.index = None
+            if 'Stat-Block-Styles_Stat-Block-Title' not in classes:
+                # nested paragraphs finish in reverse, so each one holds 
+                # its place until the outermost paragraph is closed
+                element.index = len(self.slots)
+                self.slots.append(None)
+
+        if not self.skipping:
+            if tag == 'a':
+                for span in self.plural_spans:
+                    if span.paragraph is None: continue
+                    self.add_monster(span.paragraph, attrs)
+                    span.paragraph = None
+                if parent is not None and parent.kind == 'p' and parent.index is not None:
+                    self.add_monster(parent, attrs)
+            elif tag == 'span' and 'plural-monster-tooltip' in classes:
+                if parent is not None and parent.kind == 'p' and parent.index is not None:
+                    element.kind = 'span'
+                    element.paragraph = parent
+
+        if tag not in VOID_TAGS:
+            self.push(element)
+
+    def end_tag(self, tag):
+        self.flush()
+        for i in range(len(self.stack) - 1, -1, -1):
+            if self.stack[i].name == tag:
+                while len(self.stack) > i:
+                    self.pop()
+                return
+
+    def handle_data(self, data):
+        self.data.append(data)
+
+    def handle_comment(self, data):
+        self.flush()
+
+    def handle_decl(self, decl):
+        self.flush()
+
+    def handle_pi(self, data):
+        self.flush()
+
+    def unknown_decl(self, data):
+        self.flush()
+        if data.upper().startswith('CDATA['):
+            self.data = [data[len('CDATA['):]]
+            self.flush(visible=True)
+
+    def push(self, element):
+        self.stack.append(element)
+        if element.kind == 'skip':
+            self.skipping += 1
+        elif element.kind == 'heading':
+            self.open_headings.append(element)
+        elif element.kind == 'p':
+            self.open_paragraphs.append(element)
+        elif element.kind == 'span':
+            self.plural_spans.append(element)
+        if element.name in STRING_CONTAINER_TAGS:
+            self.containers += 1
+        if element.name in PRESERVE_WHITESPACE_TAGS:
+            self.preserving += 1
+
+    def pop(self):
+        element = self.stack.pop()
+        if element.kind == 'skip':
+            self.skipping -= 1
+        elif element.kind == 'heading':
+            self.open_headings.remove(element)
+        elif element.kind == 'p':
+            self.open_paragraphs.remove(element)
+            if element.index is not None and element.monsters:
+                self.slots[element.index] = (element.headings, element.monsters, ''.join(element.text))
+            if not self.open_paragraphs:
+                self.encounters += [e for e in self.slots if e]
+                self.slots = []
+        elif element.kind == 'span':
+            self.plural_spans.remove(element)
+        if element.name in STRING_CONTAINER_TAGS:
+            self.containers -= 1
+        if element.name in PRESERVE_WHITESPACE_TAGS:
+            self.preserving -= 1
+        return element
+
+def html_blocks(html_text):
+    """Yields the given html a block at a time.
+    """
+    for start in range(0, len(html_text), BLOCK_SIZE):
+        yield html_text[start:start + BLOCK_SIZE]
+
+def iter_encounters(html_text):
+    """Yields (headings, monsters, text) for each encounter in the given
+    html as it's found. See EncounterParser.
+    """
+    return EncounterParser().iter_parse(html_blocks(html_text))
+
+def parse_encounters(html_text):
+    """Returns (headings, monsters, text) for each encounter in the given
+    html. See EncounterParser.
+    """
+    return EncounterParser().parse(html_text)
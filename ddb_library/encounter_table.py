@@ -0,0 +1,144 @@
+import numpy as np
+
+def encode_column(values):
+    """Returns (categories, codes) for the given list of strings, with
+    categories listed in the order they first appear.
+    """
+    categories = {}
+    codes = np.fromiter(
+        (categories.setdefault(v, len(categories)) for v in values),
+        dtype=np.int32, count=len(values),
+    )
+    return list(categories), codes
+
+class EncounterTable:
+    """Columnar view of the encounters returned by `get_encounters`.
+
+    Each row is one (encounter, monster) pair. String columns are stored
+    as integer codes into a list of categories so aggregations can be
+    done with numpy instead of python loops.
+    """
+    COLUMNS = ['book', 'book_path', 'path', 'monster']
+
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.encounter = np.asarray(d.get('encounter', []), dtype=np.int32)
+        self.number = np.asarray(d.get('number', []), dtype=np.int32)
+        self.categories = {}
+        self.codes = {}
+        for column in self.COLUMNS:
+            self.categories[column] = list(d.get('categories', {}).get(column, []))
+            self.codes[column] = np.asarray(d.get('codes', {}).get(column, []), dtype=np.int32)
+
+    @classmethod
+    def from_encounters(cls, encounters):
+        """Constructs a table from a list of encounter dicts.
+        """
+        rows = [(i, e, n, m) for i, e in enumerate(encounters) for (n, m) in e['monsters']]
+        table = {
+            'encounter': [r[0] for r in rows],
+            'number': [r[2] for r in rows],
+            'categories': {},
+            'codes': {},
+        }
+        columns = {
+            'book': [r[1]['book'] for r in rows],
+            'book_path': [r[1]['book_path'] for r in rows],
+            'path': [r[1]['path'] for r in rows],
+            'monster': [r[3] for r in rows],
+        }
+        for column, values in columns.items():
+            table['categories'][column], table['codes'][column] = encode_column(values)
+        return cls(table)
+
+    def __repr__(self):
+        return f'EncounterTable(rows={self.size()}, encounters={self.encounter_count()})'
+
+    def column(self, name):
+        """Returns the decoded values of the given column as a numpy array.
+        """
+        if name in ['encounter', 'number']:
+            return getattr(self, name)
+        return np.asarray(self.categories[name], dtype=object)[self.codes[name]]
+
+    def encounter_count(self):
+        """Returns the number of distinct encounters in the table.
+        """
+        return len(np.unique(self.encounter))
+
+    def heading_codes(self, depth):
+        """Returns (categories, codes) for the heading path truncated to
+        the given depth, e.g. depth=2 gives 'book; chapter'.
+        """
+        truncated = ['; '.join(p.split('; ')[:depth]) for p in self.categories['book_path']]
+        categories, mapping = encode_column(truncated)
+        return categories, mapping[self.codes['book_path']]
+
+    def group_codes(self, by, depth=None):
+        if by == 'book_path' and depth:
+            return self.heading_codes(depth)
+        return self.categories[by], self.codes[by]
+
+    def count_by(self, by='monster', depth=None):
+        """Returns a dict with the number of rows for each value of the
+        given column. There's a row for each monster entry in an encounter,
+        so a monster listed twice in one encounter is counted twice.
+        """
+        categories, codes = self.group_codes(by, depth)
+        counts = np.bincount(codes, minlength=len(categories))
+        return dict(zip(categories, counts.tolist()))
+
+    def total_by(self, by='book_path', depth=None):
+        """Returns a dict with the total number of monsters for each value
+        of the given column.
+        """
+        categories, codes = self.group_codes(by, depth)
+        totals = np.bincount(codes, weights=self.number, minlength=len(categories))
+        return dict(zip(categories, totals.astype(np.int64).tolist()))
+
+    def monster_frequency(self, by='book', depth=None, weighted=False):
+        """Returns (row labels, monster ids, matrix) where the matrix holds
+        how many times each monster appears for each value of the given
+        column. If weighted, monster numbers are summed instead.
+        """
+        categories, codes = self.group_codes(by, depth)
+        monsters = self.categories['monster']
+        matrix = np.zeros((len(categories), len(monsters)), dtype=np.int64)
+        np.add.at(matrix, (codes, self.codes['monster']), self.number if weighted else 1)
+        return categories, monsters, matrix
+
+    def monster_mask(self, monster):
+        """Returns a boolean row mask for the given monster id.
+        """
+        if monster not in self.categories['monster']:
+            return np.zeros(self.size(), dtype=bool)
+        return self.codes['monster'] == self.categories['monster'].index(monster)
+
+    def encounters_with(self, monster):
+        """Returns the sorted indices of encounters that include the given
+        monster id.
+        """
+        return np.unique(self.encounter[self.monster_mask(monster)])
+
+    def size(self):
+        """Returns the number of rows in the table.
+        """
+        return len(self.encounter)
+
+    def to_dataframe(self):
+        """Returns the table as a pandas DataFrame with categorical columns.
+        """
+        import pandas as pd
+
+        data = {'encounter': self.encounter, 'number': self.number}
+        for column in self.COLUMNS:
+            data[column] = pd.Categorical.from_codes(self.codes[column], self.categories[column])
+        return pd.DataFrame(data)
+
+    def to_dict(self):
+        return {
+            'encounter': self.encounter.tolist(),
+            'number': self.number.tolist(),
+            'categories': self.categories,
+            'codes': {k: v.tolist() for k, v in self.codes.items()},
+        }
@@ -0,0 +1,284 @@
+from .content_reference import ContentReference
+from .myencoder import MyEncoder
+from concurrent.futures import ThreadPoolExecutor
+import io
+import json
+import os
+import re
+import shutil
+import tarfile
+import tempfile
+import time
+import zipfile
+
+FORMATS = ['html', 'jsonl', 'tar', 'tar.gz', 'zip']
+
+RE_UNSAFE = re.compile(r'[^\w.-]')
+
+def export_format(dest):
+    """Returns the export format implied by the destination's extension,
+    or 'html' for a folder.
+    """
+    name = dest.lower()
+    if name.endswith('.jsonl'): return 'jsonl'
+    if name.endswith('.tar.gz') or name.endswith('.tgz'): return 'tar.gz'
+    if name.endswith('.tar'): return 'tar'
+    if name.endswith('.zip'): return 'zip'
+    return 'html'
+
+def index_entry(content, file):
+    """Returns the details of a piece of content listed in an export's
+    index, without its html.
+    """
+    d = {k: v for k, v in content.__dict__.items() if k != 'html'}
+    d['file'] = file
+    return d
+
+def write_files(folder, files):
+    """Writes a batch of (name, data) files to the given folder.
+    """
+    for name, data in files:
+        with open(os.path.join(folder, name), 'wb') as fout:
+            fout.write(data)
+    return len(files)
+
+class MergedContent:
+    """Merges content by id as each book's is added, the same way as
+    `merge_content`, keeping the html in a temporary file rather than in
+    memory until the merged entries are read back, in order, by iterating.
+    Use as a context manager, or call `close`.
+    """
+    def __init__(self):
+        self.spool = tempfile.TemporaryFile()
+        self.content = {}
+        self.html = {}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def __len__(self):
+        return len(self.content)
+
+    def __iter__(self):
+        for id, content in self.content.items():
+            offset, size = self.html[id]
+            html = None
+            if size >= 0:
+                self.spool.seek(offset)
+                html = self.spool.read(size).decode('utf-8')
+            yield ContentReference(dict(content.__dict__, html=html))
+
+    def add(self, content):
+        """Adds a list of ContentReferences. Later entries take precedence
+        for the modified, path and html fields.
+        """
+        self.spool.seek(0, io.SEEK_END)
+        for c in content:
+            offset = self.spool.tell()
+            size = -1
+            if c.html is not None:
+                size = self.spool.write(c.html.encode('utf-8'))
+            if c.id in self.content:
+                merged = self.content[c.id]
+                merged.sources = merged.sources + c.sources
+                merged.modified = c.modified
+                merged.path = c.path
+            else:
+                self.content[c.id] = ContentReference(dict(c.__dict__, html=None))
+            self.html[c.id] = (offset, size)
+        return self
+
+    def close(self):
+        self.spool.close()
+
+class ContentExporter:
+    """Writes extracted content to a single export, in batches.
+
+    Formats are:
+     * **html.** a folder with an html file per entry, written by a pool of
+       `write_workers` threads.
+     * **jsonl.** a JSON Lines file with one entry per line.
+     * **tar, tar.gz, zip.** a single file with an html file per entry.
+
+    The html formats also list every entry, without its html, in an
+    `index.jsonl` file. Files are named after the content id.
+
+    Everything is written next to `dest` and moved into place when the
+    export is finished, so a failed export leaves any earlier export as it
+    was. Use as a context manager, or call `finish` or `abort`.
+    """
+    def __init__(self, dest, **kwargs):
+        self.dest = os.path.abspath(dest)
+        self.format = kwargs.get('format', None) or export_format(dest)
+        if self.format not in FORMATS:
+            raise ValueError(f'Unknown export format "{self.format}".')
+        self.batch_size = kwargs.get('batch_size', 500)
+        self.write_workers = kwargs.get('write_workers', 8)
+        self.logging = kwargs.get('logging', False)
+
+        self.tmp_path = self.dest + '.tmp'
+        self.names = {}
+        self.index = []
+        self.batch = []
+        self.futures = []
+        self.entries = 0
+        self.bytes = 0
+        self.start = time.perf_counter()
+        self.stats = None
+        self.open()
+
+    def __repr__(self):
+        return f'ContentExporter(dest={self.dest!r}, format={self.format!r}, entries={self.entries})'
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, *args):
+        if exc_type is not None:
+            self.abort()
+        elif self.stats is None:
+            self.finish()
+
+    def open(self):
+        if os.path.isdir(self.tmp_path):
+            shutil.rmtree(self.tmp_path)
+        elif os.path.exists(self.tmp_path):
+            os.remove(self.tmp_path)
+
+        self.fout = self.archive = self.executor = None
+        if self.format == 'html':
+            os.makedirs(self.tmp_path)
+            self.executor = ThreadPoolExecutor(max_workers=self.write_workers)
+        elif self.format == 'jsonl':
+            self.fout = open(self.tmp_path, 'wb')
+        elif self.format == 'zip':
+            self.archive = zipfile.ZipFile(self.tmp_path, 'w', compression=zipfile.ZIP_DEFLATED)
+        else:
+            self.archive = tarfile.open(self.tmp_path, 'w:gz' if self.format == 'tar.gz' else 'w')
+
+    def file_name(self, content):
+        """Returns a unique file name for a piece of content.
+        """
+        name = RE_UNSAFE.sub('_', content.id or content.name or 'content')
+        count = self.names.get(name, 0) + 1
+        self.names[name] = count
+        return f'{name}.html' if count == 1 else f'{name}-{count}.html'
+
+    def write(self, content):
+        """Adds a list of ContentReferences to the export.
+        """
+        for c in content:
+            self.batch.append(c)
+            if len(self.batch) >= self.batch_size:
+                self.flush()
+        return self
+
+    def flush(self):
+        """Writes the current batch.
+        """
+        batch, self.batch = self.batch, []
+        if not batch: return
+
+        if self.format == 'jsonl':
+            data = ''.join(json.dumps(c.__dict__, cls=MyEncoder) + '\n' for c in batch).encode('utf-8')
+            self.fout.write(data)
+            self.bytes += len(data)
+            self.entries += len(batch)
+            return
+
+        files = []
+        for c in batch:
+            name = self.file_name(c)
+            self.index.append(index_entry(c, name))
+            files.append((name, (c.html or '').encode('utf-8')))
+        self.bytes += sum(len(data) for name, data in files)
+        self.entries += len(batch)
+
+        if self.executor:
+            self.futures.append(self.executor.submit(write_files, self.tmp_path, files))
+            # surface write errors without waiting for the whole export
+            while self.futures and self.futures[0].done():
+                self.futures.pop(0).result()
+        else:
+            for name, data in files:
+                self.add_to_archive(name, data)
+
+    def add_to_archive(self, name, data):
+        if self.format == 'zip':
+            self.archive.writestr(name, data)
+        else:
+            info = tarfile.TarInfo(name)
+            info.size = len(data)
+            info.mtime = int(time.time())
+            self.archive.addfile(info, io.BytesIO(data))
+
+    def finish(self):
+        """Writes what's left, moves the export into place, and returns the
+        number of entries and bytes written and the rate they were written.
+        """
+        self.flush()
+        if self.format != 'jsonl':
+            data = ''.join(json.dumps(d, cls=MyEncoder) + '\n' for d in self.index).encode('utf-8')
+            self.bytes += len(data)
+            if self.executor:
+                self.futures.append(self.executor.submit(write_files, self.tmp_path, [('index.jsonl', data)]))
+            else:
+                self.add_to_archive('index.jsonl', data)
+        self.close()
+        self.replace()
+
+        seconds = time.perf_counter() - self.start
+        self.stats = {
+            'format': self.format,
+            'path': self.dest,
+            'entries': self.entries,
+            'bytes': self.bytes,
+            'seconds': seconds,
+            'entries_per_second': self.entries / seconds if seconds else None,
+            'bytes_per_second': self.bytes / seconds if seconds else None,
+        }
+        if self.logging: print(f'Exported {self.entries} entries ({self.bytes} bytes) to "{self.dest}" in {seconds:.2f}s.')
+        return self.stats
+
+    def close(self):
+        if self.executor:
+            try:
+                for future in self.futures:
+                    future.result()
+            finally:
+                self.executor.shutdown()
+                self.executor = None
+                self.futures = []
+        if self.fout:
+            self.fout.close()
+            self.fout = None
+        if self.archive:
+            self.archive.close()
+            self.archive = None
+
+    def replace(self):
+        """Moves the finished export over any earlier one.
+        """
+        if os.path.isdir(self.dest):
+            old_path = self.dest + '.old'
+            if os.path.exists(old_path):
+                shutil.rmtree(old_path)
+            os.replace(self.dest, old_path)
+            os.replace(self.tmp_path, self.dest)
+            shutil.rmtree(old_path)
+        else:
+            os.replace(self.tmp_path, self.dest)
+
+    def abort(self):
+        """Stops the export and removes what was written of it.
+        """
+        try:
+            self.close()
+        finally:
+            if os.path.isdir(self.tmp_path):
+                shutil.rmtree(self.tmp_path)
+            elif os.path.exists(self.tmp_path):
+                os.remove(self.tmp_path)
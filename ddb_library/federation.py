@@ -0,0 +1,202 @@
+from .archive import is_archive
+from .html_cache import HtmlCache
+from .library import Library, merge_content
+from .myencoder import MyEncoder
+import json
+import os
+import threading
+
+class FederationMember:
+    """One library of a federation, loaded the first time it's used.
+
+    `path` is a library folder, its library.json, or a packed archive. A
+    folder's `library.ddbpack` is mounted in place of its files if it was
+    packed after library.json was last saved. An `html_cache` folder is
+    used when reading the library's pages.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        if type(d) is str:
+            d = {'path': d}
+        self.path = d.get('path', None)
+        self.name = d.get('name', None)
+        self.html_cache = d.get('html_cache', None)
+        self.library = None
+        self.cache = None
+        self.lock = threading.Lock()
+
+    def __repr__(self):
+        return f'FederationMember(name={self.name!r}, path={self.path!r}, loaded={self.library is not None})'
+
+    def archive_path(self):
+        """Returns the archive to load the library from, if any.
+        """
+        if is_archive(self.path):
+            return self.path
+        if not os.path.isdir(self.path):
+            return None
+        archive_path = os.path.join(self.path, 'library.ddbpack')
+        json_path = os.path.join(self.path, 'library.json')
+        if not os.path.isfile(archive_path): return None
+        if os.path.isfile(json_path) and os.path.getmtime(archive_path) < os.path.getmtime(json_path):
+            return None
+        return archive_path
+
+    def load(self):
+        """Returns the member's library, loading it if needed.
+        """
+        with self.lock:
+            if self.library is None:
+                archive_path = self.archive_path()
+                if archive_path:
+                    self.library = Library.from_archive(archive_path)
+                elif os.path.isdir(self.path):
+                    self.library = Library.from_json_file(os.path.join(self.path, 'library.json'))
+                else:
+                    self.library = Library.from_json_file(self.path)
+                if self.html_cache and self.cache is None:
+                    self.cache = HtmlCache(self.html_cache)
+                if not self.name:
+                    self.name = self.library.name
+            return self.library
+
+    def is_loaded(self):
+        return self.library is not None
+
+    def options(self, **kwargs):
+        """Returns the given options with this member's html cache, unless
+        one was given.
+        """
+        if self.cache is not None and not kwargs.get('html_cache', None):
+            kwargs['html_cache'] = self.cache
+        return kwargs
+
+    def to_dict(self):
+        return {'path': self.path, 'name': self.name, 'html_cache': self.html_cache}
+
+class Federation:
+    """Several libraries read as one, e.g. one library per campaign
+    setting or edition.
+
+    Each library is only loaded when a query first needs it. Content is
+    extracted from every library and merged by id in the order the
+    libraries are given, the same way `Library.get_content` merges content
+    found in several books, so content found in more than one library has
+    the sources of each.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.name = d.get('name', None)
+        self.members = []
+        for member in d.get('libraries', []):
+            self.add_library(member)
+
+    @classmethod
+    def from_json_file(cls, json_path):
+        with open(json_path, 'r') as fin:
+            json_dict = json.load(fin)
+        return cls(json_dict)
+
+    def __repr__(self):
+        return f'Federation(name={self.name!r}, libraries={len(self.members)})'
+
+    def add_library(self, *args, **kwargs):
+        """Adds a library given by its path, a dict of `path`, `name` and
+        `html_cache`, or an already loaded Library.
+        """
+        member = args[0] if args else kwargs
+        if type(member) is Library:
+            library = member
+            member = FederationMember(path=library.path, name=kwargs.get('name', library.name))
+            member.library = library
+        elif type(member) is not FederationMember:
+            member = FederationMember(member)
+        self.members.append(member)
+        return self
+
+    def book(self, *args, **kwargs):
+        """Returns the first book matching the given name, `acronym` or
+        `path` in any of the libraries.
+        """
+        for library in self.libraries():
+            book = library.book(*args, **kwargs)
+            if book: return book
+        return None
+
+    def find_sections(self, text, **kwargs):
+        """Returns the sections of every library whose heading contains the
+        given text. See `Library.find_sections`.
+        """
+        sections = []
+        for member in self.members:
+            for section in member.load().find_sections(text, **kwargs):
+                section['library'] = member.name
+                sections.append(section)
+        return sections
+
+    def get_book_names(self, **kwargs):
+        return [name for library in self.libraries() for name in library.get_book_names(**kwargs)]
+
+    def get_content(self, **kwargs):
+        """Extracts content from every library, merged by id. Accepts the
+        same options as `Library.get_content`.
+        """
+        lib_content = []
+        for member in self.members:
+            options = member.options(**kwargs)
+            lib_content += member.load().get_content(**dict(options, merge=False))
+
+        if not kwargs.get('merge', True):
+            return lib_content
+        return merge_content(lib_content)
+
+    def get_encounters(self, **kwargs):
+        """Extracts encounters from every library, in library order.
+        """
+        encounters = []
+        for member in self.members:
+            encounters += member.load().get_encounters(**member.options(**kwargs))
+        return encounters
+
+    def get_magic_items(self, **kwargs):
+        return self.get_content(types=['magic item'], **kwargs)
+
+    def get_monsters(self, **kwargs):
+        return self.get_content(types=['monster'], **kwargs)
+
+    def get_spells(self, **kwargs):
+        return self.get_content(types=['spell'], **kwargs)
+
+    def libraries(self):
+        """Yields each member library, loading it if needed.
+        """
+        for member in self.members:
+            yield member.load()
+
+    def library(self, name):
+        """Returns the member library with the given name or path.
+        """
+        for member in self.members:
+            if member.path == name or member.name == name:
+                return member.load()
+        for member in self.members:
+            if member.load().name == name:
+                return member.library
+        return None
+
+    def save_json(self, path, **kwargs):
+        logging = kwargs.get('logging', True)
+        if logging: print(f'Saving federation to {path}.')
+        with open(path, 'w') as fout:
+            fout.write(self.to_json(indent=kwargs.get('indent', 4)))
+
+    def size(self):
+        """Returns the number of member libraries.
+        """
+        return len(self.members)
+
+    def to_json(self, **kwargs):
+        return json.dumps({
+            'name': self.name,
+            'libraries': [member.to_dict() for member in self.members],
+        }, cls=MyEncoder, **kwargs)
@@ -0,0 +1,189 @@
+import io
+import os
+import threading
+
+# archives mounted with `mount`, by root folder
+MOUNTS = {}
+
+# running Prefetchers, whose files are read before going to the disk,
+# added and removed under PREFETCHERS_LOCK
+PREFETCHERS = []
+PREFETCHERS_LOCK = threading.Lock()
+
+def mount(fs):
+    """Answers every path below `fs.root` from the given file system, e.g.
+    a LibraryArchive, until it is unmounted.
+    """
+    MOUNTS[fs.root] = fs
+    return fs
+
+def unmount(fs):
+    if MOUNTS.get(fs.root, None) is fs:
+        MOUNTS.pop(fs.root)
+    return fs
+
+def find_mount(path):
+    """Returns the mounted file system containing the given path, if any.
+    """
+    if not MOUNTS or not path: return None
+    for root, fs in MOUNTS.items():
+        if path == root or path.startswith(root + os.sep):
+            return fs
+    return None
+
+def add_prefetcher(prefetcher):
+    with PREFETCHERS_LOCK:
+        PREFETCHERS.append(prefetcher)
+    return prefetcher
+
+def remove_prefetcher(prefetcher):
+    with PREFETCHERS_LOCK:
+        if prefetcher in PREFETCHERS:
+            PREFETCHERS.remove(prefetcher)
+    return prefetcher
+
+def take_prefetched(path):
+    """Returns the contents of the given file if a running Prefetcher has
+    already read it, otherwise None.
+    """
+    with PREFETCHERS_LOCK:
+        prefetchers = list(PREFETCHERS)
+    for prefetcher in prefetchers:
+        data = prefetcher.take(path)
+        if data is not None:
+            return data
+    return None
+
+class FileSystem:
+    """Reads file system state directly, one call at a time. Paths inside a
+    mounted archive are read from the archive.
+    """
+    def isfile(self, path):
+        fs = find_mount(path)
+        return fs.isfile(path) if fs else os.path.isfile(path)
+
+    def isdir(self, path):
+        fs = find_mount(path)
+        return fs.isdir(path) if fs else os.path.isdir(path)
+
+    def getmtime(self, path):
+        fs = find_mount(path)
+        return fs.getmtime(path) if fs else os.path.getmtime(path)
+
+    def listdir(self, path):
+        fs = find_mount(path)
+        return fs.listdir(path) if fs else os.listdir(path)
+
+    def walk(self, path):
+        fs = find_mount(path)
+        return fs.walk(path) if fs else os.walk(path)
+
+    def read_bytes(self, path):
+        fs = find_mount(path)
+        if fs: return fs.read_bytes(path)
+        data = take_prefetched(path) if PREFETCHERS else None
+        if data is not None: return data
+        with open(path, 'rb') as fin:
+            return fin.read()
+
+    def read_range(self, path, start, end):
+        """Returns bytes `start` to `end` of the given file.
+        """
+        fs = find_mount(path)
+        if fs: return fs.read_range(path, start, end)
+        with open(path, 'rb') as fin:
+            fin.seek(start)
+            return fin.read(end - start)
+
+    def read_text(self, path):
+        fs = find_mount(path)
+        if fs: return fs.read_text(path)
+        data = take_prefetched(path) if PREFETCHERS else None
+        if data is not None: return io.TextIOWrapper(io.BytesIO(data)).read()
+        with open(path, 'r') as fin:
+            return fin.read()
+
+class FileSystemSnapshot(FileSystem):
+    """The state of a folder tree read in a single `os.scandir` walk.
+
+    Paths below `root`, and any extra `files`, are answered from the
+    snapshot. Other paths fall back to the file system. Call `refresh` to
+    read the tree again.
+    """
+    def __init__(self, root, **kwargs):
+        self.root = root
+        self.extra_files = kwargs.get('files', [])
+        self.refresh()
+
+    def __repr__(self):
+        return f'FileSystemSnapshot(root={self.root!r}, files={len(self.files)}, dirs={len(self.dirs)})'
+
+    def covers(self, path):
+        return path == self.root or path.startswith(self.root + os.sep) or path in self.extra_files
+
+    def isfile(self, path):
+        if not path: return False
+        if not self.covers(path): return super().isfile(path)
+        return path in self.files
+
+    def isdir(self, path):
+        if not path: return False
+        if not self.covers(path): return super().isdir(path)
+        return path in self.dirs
+
+    def getmtime(self, path):
+        if not self.covers(path): return super().getmtime(path)
+        if path not in self.files:
+            raise FileNotFoundError(f'No such file: "{path}"')
+        return self.files[path]
+
+    def listdir(self, path):
+        if not self.covers(path): return super().listdir(path)
+        if path not in self.dirs:
+            raise FileNotFoundError(f'No such directory: "{path}"')
+        dirnames, filenames = self.dirs[path]
+        return dirnames + filenames
+
+    def walk(self, path):
+        """Yields (dirpath, dirnames, filenames) like a top down `os.walk`.
+        """
+        if not self.covers(path):
+            yield from super().walk(path)
+            return
+        if path not in self.dirs: return
+        dirnames, filenames = self.dirs[path]
+        yield path, list(dirnames), list(filenames)
+        for dirname in dirnames:
+            yield from self.walk(os.path.join(path, dirname))
+
+    def refresh(self):
+        """Reads the state of the folder tree again.
+        """
+        self.files = {}
+        self.dirs = {}
+        self.scan(self.root)
+        for path in self.extra_files:
+            try:
+                self.files[path] = os.stat(path).st_mtime
+            except FileNotFoundError:
+                pass
+        return self
+
+    def scan(self, path):
+        try:
+            entries = list(os.scandir(path))
+        except (FileNotFoundError, NotADirectoryError):
+            return
+
+        dirnames, filenames = [], []
+        self.dirs[path] = (dirnames, filenames)
+        for entry in entries:
+            if entry.is_dir():
+                dirnames.append(entry.name)
+                self.scan(entry.path)
+            elif entry.is_file():
+                filenames.append(entry.name)
+                self.files[entry.path] = entry.stat().st_mtime
+
+# shared instance used when no snapshot is given
+LIVE_FILE_SYSTEM = FileSystem()
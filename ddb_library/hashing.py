@@ -0,0 +1,27 @@
+from .fs_snapshot import find_mount
+import hashlib
+
+def file_hash(path, **kwargs):
+    """Returns a BLAKE2b hex digest of the contents of the given file.
+
+    Pass a dict as `digests` to share digests between calls, e.g. over one
+    update: a digest already held for the path is returned without reading
+    the file again, and new digests are added to it.
+    """
+    digests = kwargs.get('digests', None)
+    if digests is not None and path in digests:
+        return digests[path]
+
+    chunk_size = kwargs.get('chunk_size', 1 << 20)
+    digest = hashlib.blake2b(digest_size=kwargs.get('digest_size', 16))
+    archive = find_mount(path)
+    if archive:
+        digest.update(archive.read_bytes(path))
+    else:
+        with open(path, 'rb') as fin:
+            for chunk in iter(lambda: fin.read(chunk_size), b''):
+                digest.update(chunk)
+
+    if digests is not None:
+        digests[path] = digest.hexdigest()
+    return digest.hexdigest()
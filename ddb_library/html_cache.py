@@ -0,0 +1,125 @@
+from .html_processor import options_fingerprint
+import hashlib
+import os
+import tempfile
+
+# bumped whenever process_html's output changes, so older entries miss
+VERSION = 1
+
+class HtmlCache:
+    """A folder of html already run through `process_html`, keyed by the
+    source file, its modification time or hash, and the options used.
+
+    Pass a cache as `html_cache` to `Page.get_html`, or to any method that
+    reads pages such as `copy`, `get_content` and `get_encounters`. Once
+    the folder grows beyond `max_size` bytes, the least recently used
+    entries are removed.
+    """
+    def __init__(self, path, **kwargs):
+        self.path = path
+        self.max_size = kwargs.get('max_size', 256 * 1024 * 1024)
+        self.size = None
+        self.hits = 0
+        self.misses = 0
+
+    def __repr__(self):
+        return f'HtmlCache(path={self.path!r}, hits={self.hits}, misses={self.misses})'
+
+    def key(self, path, version, **kwargs):
+        """Returns the cache key for a file at the given version, a
+        modification time or hash, processed with the given options.
+        """
+        data = '\0'.join([str(VERSION), path, str(version), options_fingerprint(**kwargs)])
+        return hashlib.blake2b(data.encode('utf-8'), digest_size=16).hexdigest()
+
+    def entry_path(self, key):
+        return os.path.join(self.path, key + '.html')
+
+    def get(self, key):
+        """Returns the cached html for the given key, or None.
+        """
+        entry_path = self.entry_path(key)
+        try:
+            with open(entry_path, 'r', encoding='utf-8', newline='') as fin:
+                html_text = fin.read()
+        except FileNotFoundError:
+            self.misses += 1
+            return None
+        
+        # mark the entry as recently used
+        try:
+            os.utime(entry_path)
+        except FileNotFoundError:
+            pass
+        self.hits += 1
+        return html_text
+
+    def put(self, key, html_text):
+        """Stores processed html under the given key.
+        """
+        if not os.path.isdir(self.path):
+            os.makedirs(self.path, exist_ok=True)
+        
+        entry_path = self.entry_path(key)
+        fd, tmp_path = tempfile.mkstemp(dir=self.path, prefix=key + '.', suffix='.tmp')
+        try:
+            with open(fd, 'w', encoding='utf-8', newline='') as fout:
+                fout.write(html_text)
+            os.replace(tmp_path, entry_path)
+        except BaseException:
+            os.remove(tmp_path)
+            raise
+
+        if self.size is None:
+            self.size = self.disk_size()
+        else:
+            self.size += len(html_text.encode('utf-8'))
+        if self.size > self.max_size:
+            self.evict()
+        return self
+
+    def entries(self):
+        """Returns (modified, size, path) for each cached entry, oldest first.
+        """
+        try:
+            files = list(os.scandir(self.path))
+        except FileNotFoundError:
+            return []
+        entries = []
+        for entry in files:
+            if not entry.name.endswith('.html'): continue
+            try:
+                stat = entry.stat()
+            except FileNotFoundError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, entry.path))
+        return sorted(entries)
+
+    def disk_size(self):
+        return sum(size for (modified, size, path) in self.entries())
+
+    def evict(self):
+        """Removes the least recently used entries until the cache is 
+        below 90% of its maximum size.
+        """
+        entries = self.entries()
+        self.size = sum(size for (modified, size, path) in entries)
+        for (modified, size, path) in entries:
+            if self.size <= 0.9 * self.max_size: break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self.size -= size
+        return self
+
+    def clear(self):
+        """Removes every cached entry.
+        """
+        for (modified, size, path) in self.entries():
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+        self.size = 0
+        return self
@@ -1,4 +1,5 @@
 from bs4 import BeautifulSoup
+import hashlib
 import re
 
 TAG_ATTRIBUTES = [
@@ -12,6 +13,41 @@ TAG_ATTRIBUTES = [
     'data-chapter-slug'
 ]
 
+# options read by process_html, in the order they are fingerprinted
+HTML_OPTIONS = [
+    'extract_main_body', 'html_start', 'html_end', 'remove_empty_tags',
+    'remove_tags', 'unwrap_tags', 'remove_tag_attributes', 'cleanup_divs',
+    'remove_comments', 'remove_blank_lines', 'replace_invisibles', 'prettify',
+]
+
+RE_COMMENT = re.compile(r'<!--.*-->[\r\n]')
+RE_LINE = re.compile(r'[^\r\n]+')
+
+INVISIBLES = {
+    0x00a0: ' ',    # replace invisible character U+00a0 with space.
+    0x00ad: '',     # replace invisible character U+00ad with nothing.
+}
+
+DASHES = {
+    0x2212: '-',    # replace dash characters U+2212, U+2013 and U+2014 with dashes.
+    0x2013: '-',
+    0x2014: '-',
+}
+
+# (pattern, replacement, literal text one of which must be present to match)
+PRETTIFY_RULES = [
+    (re.compile(r'\s+(?=[\r\n])'), '', None),                         # remove trailing spaces
+    (re.compile(r'(\s*<br/>\s*)+'), '<br/>\n', ['<br/>']),              # ensure a <br/> is always followed by a new line and multiple aren't chained together
+    (re.compile(r'</div>(?=</div>)'), '</div>\n', ['</div></div>']),    # split multiple closed div tags across multiple lines.
+    (re.compile(r'<(\w+)> +'), r'<\1>', ['> ']),                        # remove spaces after open tag 
+    (re.compile(r' +</(\w+)>'), r'</\1>', [' </']),                     # remove spaces before close tag 
+    (re.compile(r'\s*<(li|p)>\s*'), r'\n<\1>', ['<li>','<p>']),          # put <li> and <p> tags at the start of their own line.
+    (re.compile(r'\s*</(li|p)>\s*'), r'</\1>\n', ['</li>','</p>']),      # put <li> and <p> tags at the start of their own line.
+    (re.compile(r'(?<!>)\n(?=[^<]+</p>)'), '', ['</p>']),               # makes sure paragraphs aren't broken up unnecessarily
+    (re.compile(r'\s*(</?blockquote>)\s*'), r'\n\1\n', ['blockquote>']), # put <blockquote> tags on their own line
+    (re.compile(r'\s*(</?caption>)\s*'), r'\n\1\n', ['caption>']),      # put <caption> tags on their own line
+]
+
 def cleanup_div(soup):
     re_reps = re.compile('\n')
 
@@ -46,6 +82,15 @@ def cleanup_div(soup):
     
     return soup
 
+def options_fingerprint(**kwargs):
+    """Returns a hash of the `process_html` options that affect its output.
+    Unset and disabled options are ignored, as are any other arguments.
+    """
+    options = [(k, kwargs[k]) for k in HTML_OPTIONS if kwargs.get(k, None)]
+    if not kwargs.get('extract_main_body', False):
+        options = [(k, v) for (k, v) in options if k not in ['html_start', 'html_end']]
+    return hashlib.blake2b(repr(options).encode('utf-8'), digest_size=16).hexdigest()
+
 def process_html(html_text, **kwargs):
     """
     options = {
@@ -131,31 +176,35 @@ def process_html(html_text, **kwargs):
     if kwargs.get('cleanup_divs', False):
         soup = cleanup_div(soup)
     
-    html_text = str(soup)
+    return format_text(str(soup), **kwargs)
+
+def format_text(html_text, **kwargs):
+    """Applies the text based options of `process_html` to serialized html.
 
+    Character replacements are made in a single `str.translate` pass and
+    prettify rules are skipped when the text they match can't be present.
+    The output is identical to applying each option in turn.
+    """
     if kwargs.get('remove_comments', False):
-        html_text = re.sub(r'<!--.*-->[\r\n]', '', html_text)
+        html_text = RE_COMMENT.sub('', html_text)
 
     # remove blank lines
     if kwargs.get('remove_blank_lines', False):
-        html_text = re.sub(r'[\r\n]+', '\n', html_text)
-        html_text = '\n'.join([l for l in html_text.split('\n') if len(l) > 0])
+        html_text = '\n'.join(RE_LINE.findall(html_text))
 
+    # replace invisible characters, and dashes when prettifying, at once. 
+    # none of the prettify rules below match these characters differently.
+    table = {}
     if kwargs.get('replace_invisibles', False):
-        html_text = html_text.replace(' ', ' ') # replace invisible character U+00a0 with space.
-        html_text = html_text.replace('­', '')   # replace invisible character U+00ad with nothing.
+        table.update(INVISIBLES)
+    if kwargs.get('prettify', False):
+        table.update(DASHES)
+    if table:
+        html_text = html_text.translate(table)
     
     if kwargs.get('prettify', False):
-        html_text = re.sub(r'\s+(?=[\r\n])', '', html_text)                     # remove trailing spaces
-        html_text = re.sub(r'(\s*<br/>\s*)+', '<br/>\n', html_text)             # ensure a <br/> is always followed by a new line and multiple aren't chained together
-        html_text = re.sub(r'</div>(?=</div>)', '</div>\n', html_text)          # split multiple closed div tags across multiple lines.
-        html_text = re.sub(r'<(\w+)> +', r'<\1>', html_text)                    # remove spaces after open tag 
-        html_text = re.sub(r' +</(\w+)>', r'</\1>', html_text)                  # remove spaces before close tag 
-        html_text = re.sub(r'[−–—]', '-', html_text)                            # replace dash characters U+2212 and U+2013 with dashes.
-        html_text = re.sub(r'\s*<(li|p)>\s*', r'\n<\1>', html_text)             # put <li> and <p> tags at the start of their own line.
-        html_text = re.sub(r'\s*</(li|p)>\s*', r'</\1>\n', html_text)           # put <li> and <p> tags at the start of their own line.
-        html_text = re.sub(r'(?<!>)\n(?=[^<]+</p>)', '', html_text)             # makes sure paragraphs aren't broken up unnecessarily
-        html_text = re.sub(r'\s*(</?blockquote>)\s*', r'\n\1\n', html_text)     # put <blockquote> tags on their own line
-        html_text = re.sub(r'\s*(</?caption>)\s*', r'\n\1\n', html_text)        # put <caption> tags on their own line
+        for pattern, replacement, triggers in PRETTIFY_RULES:
+            if triggers and not any(t in html_text for t in triggers): continue
+            html_text = pattern.sub(replacement, html_text)
 
     return html_text
\ No newline at end of file
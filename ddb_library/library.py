@@ -1,10 +1,64 @@
 from .book import Book
 from .sources import Sources
 from .myencoder import MyEncoder
+from .parallel import extract_books
+from .content_reference import ContentReference
+from .fs_snapshot import FileSystemSnapshot, find_mount
+from .prefetch import Prefetcher
 from bs4 import BeautifulSoup
+import copy
+import hashlib
 import json
 import re
 import os
+import threading
+import weakref
+
+# each library's update and publish locks. updates are serialized per 
+# library, as is the swapping in of an isolated update's books. locks are
+# kept here rather than on the library, which is saved from its __dict__
+LIBRARY_LOCKS = weakref.WeakKeyDictionary()
+LIBRARY_LOCKS_LOCK = threading.Lock()
+
+def library_locks(library):
+    """Returns the (update, publish) locks of a library.
+    """
+    with LIBRARY_LOCKS_LOCK:
+        locks = LIBRARY_LOCKS.get(library, None)
+        if locks is None:
+            locks = LIBRARY_LOCKS[library] = (threading.RLock(), threading.Lock())
+        return locks
+
+def merge_content(lib_content):
+    """Merges content found in multiple books into a single reference per
+    id, combining their sources. Later entries take precedence for the
+    modified, path and html fields.
+    """
+    content_dict = {}
+    for content in lib_content:
+        if content.id in content_dict:
+            content_dict[content.id].sources += content.sources
+            content_dict[content.id].modified = content.modified
+            content_dict[content.id].path = content.path
+            content_dict[content.id].html = content.html
+            
+        else:
+            content_dict[content.id] = content
+
+    return [v for v in content_dict.values()]
+
+def shard_index(book, shards):
+    """Returns the shard a book belongs to when a library is split into the
+    given number of shards. Books are assigned by a hash of their url so
+    every host agrees on the partition.
+    """
+    key = (book.url or book.path or book.name or '').encode('utf-8')
+    return int(hashlib.blake2b(key, digest_size=8).hexdigest(), 16) % shards
+
+def sections_json_path(json_path):
+    """Returns the path of the section index saved with a library json file.
+    """
+    return os.path.splitext(json_path)[0] + '.sections.json'
 
 class Library:
     def __init__(self, *args, **kwargs):
@@ -13,6 +67,7 @@ class Library:
 
         self.name = d.get('name', None)
         self.path = d.get('path', None)
+        self.hash_files = d.get('hash_files', False)
         if 'sources' in d:
             self.add_sources(d['sources'])
         else:
@@ -23,10 +78,37 @@ class Library:
         self.books = []
         self.add_books(d.get('books', []))
 
+    @classmethod
+    def from_archive(cls, archive_path):
+        """Loads a library packed with `pack` and mounts its archive, so 
+        that its pages are read from the archive rather than the disk.
+        """
+        from .archive import LibraryArchive
+        archive = LibraryArchive(archive_path, mount=True)
+        return cls(archive.library)
+
+    @classmethod
+    def from_shared(cls, shared_path):
+        """Loads a full copy of a library written with `share`.
+        """
+        from .shared_state import attach
+        return attach(shared_path).library()
+
     @classmethod
     def from_json_file(cls, json_path):
+        """Loads a library saved with `save_json`, along with the section
+        index saved next to it if there is one.
+        """
         with open(json_path, 'r') as fin:
             json_dict = json.load(fin)
+        sections_path = sections_json_path(json_path)
+        if os.path.isfile(sections_path):
+            with open(sections_path, 'r') as fin:
+                sections = json.load(fin)
+            for book in json_dict.get('books', []):
+                for page in book.get('pages', []):
+                    if page.get('path', None) in sections:
+                        page['sections'] = sections[page['path']]
         return cls(json_dict)
 
     def __repr__(self):
@@ -80,11 +162,103 @@ class Library:
                 return book
         return None
     
+    def build_shard(self, **kwargs):
+        """Returns a partial library containing only a subset of this 
+        library's books, with their folders loaded.
+
+        Books are selected by `acronyms`, or by hash partition with `shard`
+        and `shards`, e.g. shard=0, shards=4 for the first of four shards. 
+        Sources are loaded first if the library has no books yet.
+        """
+        logging = kwargs.get('logging', True)
+        if not self.books:
+            self.load_sources(logging=logging)
+
+        shard = Library(name=self.name, path=self.path, sources=self.sources.__dict__, hash_files=self.hash_files)
+        for book in self.books:
+            if kwargs.get('acronyms', None) and book.acronym not in kwargs['acronyms']: continue
+            if kwargs.get('shards', None) and shard_index(book, kwargs['shards']) != kwargs.get('shard', 0): continue
+            shard.books.append(book)
+        
+        skip_books = [book.name for book in shard.books if book.pages]
+        if not kwargs.get('reload', False):
+            kwargs['skip_books'] = kwargs.get('skip_books', []) + skip_books
+        shard.load_books(**kwargs)
+        return shard
+
+    @classmethod
+    def merge(cls, libraries, **kwargs):
+        """Merges several partial libraries into one library.
+
+        Books found in more than one library are resolved by `conflict`:
+        'newest' keeps the book with the most recently modified pages, 
+        'first' or 'last' keep the first or last one found, and 'error'
+        raises a ValueError. Books are ordered as they appear in the sources
+        file when it exists, otherwise in the order they were merged.
+        """
+        conflict = kwargs.get('conflict', 'newest')
+        if not libraries:
+            raise ValueError('no libraries to merge')
+
+        first = libraries[0]
+        lib = cls(
+            name=kwargs.get('name', first.name), 
+            path=kwargs.get('path', first.path), 
+            sources=first.sources.__dict__,
+            hash_files=first.hash_files,
+        )
+        for other in libraries:
+            for book in other.books:
+                current = lib.book(path=book.path)
+                if not current:
+                    lib.books.append(book)
+                elif conflict == 'error':
+                    raise ValueError(f'book "{book.name}" found in more than one library')
+                elif conflict == 'last' or (conflict == 'newest' and 
+                        book.last_modified() > current.last_modified()):
+                    lib.add_book(book, replace=True)
+
+        if lib.sources.file_exists():
+            order = [book['path'] for book in lib.sources.load_books()]
+            lib.books.sort(key=lambda book: order.index(book.path) if book.path in order else len(order))
+        return lib
+
+    def manifest(self, **kwargs):
+        """Returns a Manifest of hashes of the library's files. Hashes in
+        the manifest last saved with `save_manifest` are reused for files 
+        that haven't been modified since.
+        """
+        from .manifest import Manifest
+        manifest_path = os.path.join(self.path, kwargs.get('manifest_file', 'manifest.json'))
+        previous = kwargs.get('previous', None)
+        if previous is None and os.path.isfile(manifest_path):
+            previous = Manifest.from_json_file(manifest_path)
+        snapshot = kwargs.get('snapshot', None) or self.scan()
+        return Manifest.from_library(self.view(), previous=previous, snapshot=snapshot)
+
+    def merge_content(self, *content_lists):
+        """Merges content extracted separately, e.g. from shards, into a 
+        single reference per id. Content is ordered by this library's books
+        before merging so the result matches `get_content`.
+        """
+        order = {book.path: i for i, book in enumerate(self.books)}
+        lib_content = []
+        for content_list in content_lists:
+            for content in content_list:
+                if type(content) is dict:
+                    content = ContentReference(content)
+                lib_content.append(content)
+        
+        book_path = lambda content: content.sources[0]['path'] if content.sources else None
+        lib_content.sort(key=lambda content: order.get(book_path(content), len(order)))
+        return merge_content(lib_content)
+
     def copy(self, path, **kwargs):
         """Copies the contents of this library to a new location."""
         
         dryrun = kwargs.get('dryrun', False)
         logging = kwargs.get('logging', True)
+        library = self.view()
 
         if logging: print(f'Copying library contents to "{path}".')
 
@@ -97,9 +271,9 @@ class Library:
                 os.mkdir(path)
         
         # sources file
-        if self.sources and kwargs.get('sources', True):
-            sources_path = os.path.join(path, self.sources.file)
-            self.sources.copy(sources_path, **kwargs)
+        if library.sources and kwargs.get('sources', True):
+            sources_path = os.path.join(path, library.sources.file)
+            library.sources.copy(sources_path, **kwargs)
         
         # sources folder
         sources_path = os.path.join(path, 'sources')
@@ -111,12 +285,15 @@ class Library:
                 os.mkdir(sources_path)
 
         if logging: print(f'Copying books.')
-        for book in self.books:
-            if not book.validate(): continue
-            if not book.name in kwargs.get('book_names', self.get_book_names()): continue
-            book_path = os.path.join(path, 'sources', os.path.basename(book.path))
-            if logging: print(f' - Copying book "{book.name}".')
-            book.copy(book_path, **kwargs)
+        kwargs['snapshot'] = kwargs.get('snapshot', None) or self.scan()
+        book_names = kwargs.get('book_names', library.get_book_names())
+        books = [book for book in library.books if book.name in book_names and book.validate(**kwargs)]
+        paths = [path for book in books for path in book.read_order()]
+        with Prefetcher(paths if kwargs.get('prefetch', True) else []):
+            for book in books:
+                book_path = os.path.join(path, 'sources', os.path.basename(book.path))
+                if logging: print(f' - Copying book "{book.name}".')
+                book.copy(book_path, **kwargs)
 
         return self
 
@@ -125,18 +302,21 @@ class Library:
         """
         logging = kwargs.get('logging', True)
         skip_books = kwargs.get('skip_books', [])
+        snapshot = kwargs.get('snapshot', None) or self.scan()
 
         if logging: print('Loading books.')
-        for book in self.books: 
-            if not book.is_owned_content(): continue
-            if book.name in skip_books: continue
-            
-            try:
-                if logging: print(f' - Loading pages for "{book.name}"', end=' ... ')
-                book.load_folder()
-                if logging: print('success.')
-            except FileNotFoundError as e:
-                if logging: print(f'{e}.')
+        books = [book for book in self.books 
+            if book.is_owned_content() and book.name not in skip_books]
+        paths = [path for book in books if book.folder_exists(snapshot=snapshot) 
+            for path in book.folder_files(snapshot=snapshot)]
+        with Prefetcher(paths if kwargs.get('prefetch', True) else []):
+            for book in books:
+                try:
+                    if logging: print(f' - Loading pages for "{book.name}"', end=' ... ')
+                    book.load_folder(hash=self.hash_files, snapshot=snapshot)
+                    if logging: print('success.')
+                except FileNotFoundError as e:
+                    if logging: print(f'{e}.')
         
         if logging: print('Books loaded.')
         return self
@@ -149,122 +329,397 @@ class Library:
 
     def load_sources(self, **kwargs):
         """loads books from a local sources.html file downloaded from DDB.
+        See `reload_sources`.
+        """
+        self.reload_sources(**kwargs)
+        return self
+
+    def query_content(self, content_type, **kwargs):
+        """Returns the index rows of the given type of content that match
+        every filter, without reading any html. See `StatIndex.query` for
+        the filters, and `get_stat_index` for the other options.
+        """
+        from .stat_index import INDEX_OPTIONS
+        options = {k: v for k, v in kwargs.items() if k in INDEX_OPTIONS}
+        filters = {k: v for k, v in kwargs.items() if k not in INDEX_OPTIONS}
+        return self.get_stat_index(**options).query(content_type, **filters)
+
+    def query_magic_items(self, **kwargs):
+        """Returns the magic items matching the given filters on category,
+        rarity and attunement, e.g. `rarity=['rare', 'very rare']`.
+        """
+        return self.query_content('magic item', **kwargs)
+
+    def query_monsters(self, **kwargs):
+        """Returns the monsters matching the given filters on size,
+        creature_type, alignment, cr, xp, ac and hp, e.g. `cr_min=5, 
+        cr_max=10`.
+        """
+        return self.query_content('monster', **kwargs)
+
+    def query_spells(self, **kwargs):
+        """Returns the spells matching the given filters on level, school
+        and ritual, e.g. `level_max=3, school='evocation'`.
+        """
+        return self.query_content('spell', **kwargs)
+
+    def reload_sources(self, **kwargs):
+        """Loads the books listed in the sources file and applies only what
+        changed: books are compared with the library's by path, new books
+        are added, and the name, acronym, url and ownership of the rest are
+        brought up to date. Pages of existing books are left alone.
+
+        Set `load_folders=True` to load the folders of books that became
+        owned and have no pages yet. Books that aren't listed, including
+        ones added with `add_book`, are kept unless `remove=True`, and even
+        then nothing is removed if the sources file lists no books. Set 
+        `isolated=True` to replace changed books with updated copies rather
+        than changing them. Returns the books that were 'added', 'removed',
+        'owned' (newly owned, including owned books that were added), 
+        'unowned' and 'renamed'.
         """
-        
         logging = kwargs.get('logging', True)
+        snapshot = kwargs.get('snapshot', None)
+        isolated = kwargs.get('isolated', False)
+        digests = kwargs.get('digests', None)
+        changes = {'added': [], 'removed': [], 'owned': [], 'unowned': [], 'renamed': []}
 
         if logging: print('Loading sources', end=' ... ')
+        books = self.sources.load_books(digests=digests)
+        if books is None:
+            if logging: print('sources file not found.')
+            return changes
 
-        books = self.sources.load_books()
-        for book in books:
-            tbook = self.book(path=book['path'])
-            if tbook:
-                tbook.update(**book)
-            else:
-                self.add_book(book, **kwargs)
-                """tbook = self.book(path=book['path'])
-                try:
-                    tbook.load_folder()
-                except FileNotFoundError as e:
-                    pass"""
+        current = {book.path: book for book in self.books}
+        listed = set()
+        for d in books:
+            listed.add(d['path'])
+            book = current.get(d['path'], None)
+            if book is None:
+                book = Book(**d, root_path=self.path)
+                self.books.append(book)
+                current[book.path] = book
+                changes['added'].append(book)
+                if book.owned_content:
+                    changes['owned'].append(book)
+                continue
+
+            listing = (d['name'], d['acronym'], d['url'], d['owned_content'])
+            if isolated and (book.name, book.acronym, book.url, book.owned_content) != listing:
+                index = self.books.index(book)
+                book = self.books[index] = book.clone()
+            if bool(book.owned_content) != bool(d['owned_content']):
+                changes['owned' if d['owned_content'] else 'unowned'].append(book)
+            if (book.name, book.acronym, book.url) != (d['name'], d['acronym'], d['url']):
+                changes['renamed'].append(book)
+            book.name = d['name']
+            book.acronym = d['acronym']
+            book.url = d['url']
+            book.owned_content = d['owned_content']
+
+        # an empty listing is more likely a broken sources file than a
+        # library with no books
+        if kwargs.get('remove', False) and books:
+            changes['removed'] = [book for book in self.books if book.path not in listed]
+            if changes['removed']:
+                self.books = [book for book in self.books if book.path in listed]
+
+        if kwargs.get('load_folders', False):
+            for book in changes['owned']:
+                if book.pages or not book.folder_exists(snapshot=snapshot): continue
+                book.load_folder(hash=self.hash_files, snapshot=snapshot, digests=digests)
         
-        self.sources.update()
+        self.sources.update(hash=self.hash_files, digests=digests)
         if logging: print(f'success.')
         if logging: print(f'Found {self.size()} books in sources.')
         if logging: print(f'Found {len([book.name for book in self.books if book.owned_content])} owned books.')
-        return self
+        if logging and any(changes.values()):
+            print('Changed books: ' + ', '.join(f'{len(v)} {k}' for k, v in changes.items() if v) + '.')
+        return changes
+
+    def find_sections(self, text, **kwargs):
+        """Returns the sections of owned books whose heading contains the
+        given text, ignoring case. Each has the book, page, heading and the
+        section's html, which is read from only that part of the page file
+        and processed with any `html_options`. Set `html=False` to leave the
+        html out.
+        """
+        text = text.lower()
+        html_options = kwargs.get('html_options', {})
+        sections = []
+        for book in self.get_extraction_books(**kwargs):
+            for page, section in book.sections(**kwargs):
+                if text not in section['text'].lower(): continue
+                d = {
+                    'book': book.name,
+                    'page': page.name,
+                    'path': page.path,
+                    'url': page.url + '#' + section['id'] if page.url and section['id'] else page.url,
+                    'book_path': '; '.join([book.name] + section['path']),
+                    'id': section['id'],
+                    'level': section['level'],
+                    'text': section['text'],
+                }
+                if kwargs.get('html', True):
+                    d['html'] = page.get_section(section, **html_options)
+                sections.append(d)
+        return sections
+
+    def diff(self, other, **kwargs):
+        """Returns the books and pages that differ between this library's
+        current files and `other`, a Manifest, a manifest json file, or 
+        another Library. See `Manifest.diff`.
+        """
+        from .manifest import Manifest
+        if type(other) is str:
+            other = Manifest.from_json_file(other)
+        elif type(other) is Library:
+            other = other.manifest()
+        return self.manifest(**kwargs).diff(other)
+
+    def export_content(self, dest, **kwargs):
+        """Extracts content from each owned book and writes it to `dest`
+        as a folder of html files, a JSON Lines file, or a tar or zip file
+        of html files, chosen by `format` or the extension of `dest`. See
+        ContentExporter. Returns the number of entries and bytes written,
+        the seconds taken from the start of extraction, and the rates.
+
+        Content is merged by id, as with `get_content`, and each book's
+        content is added as soon as it's extracted. The merged html is held
+        in a temporary file, not in memory, until it's written. With
+        `merge=False`, each book's content is written straight away.
+        """
+        from .exporter import ContentExporter, MergedContent
+        logging = kwargs.get('logging', True)
+        content_types = kwargs.get('types', ['magic item','monster','spell'])
+        graph = kwargs.get('reference_graph', None)
+        stat_index = kwargs.get('stat_index', None)
+        export_options = {k: v for k, v in kwargs.items() if k != 'logging'}
+        with ContentExporter(dest, logging=logging, **export_options) as exporter, MergedContent() as merged:
+            if logging: print('Exporting content from library.')
+            books = self.get_extraction_books(**kwargs)
+            for book, content in zip(books, extract_books('content', books, **kwargs)):
+                if graph is not None: graph.update_pages(book.page_paths(), content=content)
+                if stat_index is not None:
+                    stat_index.update_pages(book.page_paths(), content=content, types=content_types,
+                        modified={page.path: page.modified for page in book.pages})
+                if logging: print(f' - {book.name}: {len(content)} items found')
+                if kwargs.get('merge', True):
+                    merged.add(content)
+                else:
+                    exporter.write(content)
+            exporter.write(merged)
+            return exporter.finish()
 
     def get_book_names(self, **kwargs):
         if 'update_available' in kwargs:
-            return [book.name for book in self.books if book.update_available() == kwargs['update_available']]
+            snapshot = kwargs.get('snapshot', None) or self.scan()
+            return [book.name for book in self.books 
+                if book.update_available(hash=self.hash_files, snapshot=snapshot) == kwargs['update_available']]
         elif 'validate' in kwargs:
-            return [book.name for book in self.books if book.validate() == kwargs['validate']]
+            snapshot = kwargs.get('snapshot', None) or self.scan()
+            return [book.name for book in self.books if book.validate(snapshot=snapshot) == kwargs['validate']]
         else:
             return [book.name for book in self.books]
     
+    def get_changes(self, **kwargs):
+        """Extracts the library's content and encounters, records them in 
+        its change feed, and returns the changes since checkpoint `since`.
+        
+        The feed is kept in `feed_file` (default `changes.json`) in the 
+        library's folder, and `since` defaults to the checkpoint it held
+        before this call, i.e. the changes since the last run. Runs limited
+        by `types`, `acronyms`, `names` or `skip_books` only record removals
+        among the items they extracted.
+        """
+        from .change_feed import ChangeFeed
+        feed_path = os.path.join(self.path, kwargs.get('feed_file', 'changes.json'))
+        if os.path.isfile(feed_path):
+            feed = ChangeFeed.from_json_file(feed_path)
+        else:
+            feed = ChangeFeed()
+        since = kwargs.get('since', feed.checkpoint)
+
+        options = {k: v for k, v in kwargs.items() if k not in ['feed_file', 'since']}
+        content = self.get_content(**options)
+        encounters = self.get_encounters(**options)
+        paths = None
+        if any(options.get(k, None) for k in ['acronyms', 'names', 'skip_books']):
+            paths = [path for book in self.get_extraction_books(**options) for path in book.page_paths()]
+        feed.record(content=content, encounters=encounters, types=options.get('types', None), paths=paths)
+        feed.save_json(feed_path, logging=kwargs.get('logging', True))
+        return feed.changes(since=since, content=content, encounters=encounters)
+
     def get_content(self, **kwargs):
+        """Extracts content from each owned book in the library, merged by 
+        id. Set `workers` to extract pages in parallel processes.
+        """
         logging = kwargs.get('logging', True)
         content_types = kwargs.get('types', ['magic item','monster','spell'])
+        graph = kwargs.get('reference_graph', None)
+        stat_index = kwargs.get('stat_index', None)
         if logging: print('Extracting '+ ', '.join(content_types)+' content from library.')
         lib_content = []
-        if kwargs.get('acronyms', None):
-            for acronym in kwargs['acronyms']:
-                book = self.book(acronym=acronym)
-                if not book: continue
-                if not book.is_owned_content(): continue
-                if not book.validate(): continue
-                if book.name in kwargs.get('skip_books', []): continue
-                content = book.get_content(**kwargs)
-                if logging: print(f' - {book.name}: {len(content)} items found')
-                lib_content += content
-        else:
-            for name in kwargs.get('names', self.get_book_names()):
-                book = self.book(name)
-                if not book.is_owned_content(): continue
-                if not book.validate(): continue
-                if book.name in kwargs.get('skip_books', []): continue
-                content = book.get_content(**kwargs)
-                if logging: print(f' - {book.name}: {len(content)} items found')
-                lib_content += content
-
-        # merge content found in multiple books
-        content_dict = {}
-        for content in lib_content:
-            if content.id in content_dict:
-                content_dict[content.id].sources += content.sources
-                content_dict[content.id].modified = content.modified
-                content_dict[content.id].path = content.path
-                content_dict[content.id].html = content.html
-                
-            else:
-                content_dict[content.id] = content
+        books = self.get_extraction_books(**kwargs)
+        for book, content in zip(books, extract_books('content', books, **kwargs)):
+            if graph is not None: graph.update_pages(book.page_paths(), content=content)
+            if stat_index is not None:
+                stat_index.update_pages(book.page_paths(), content=content, types=content_types,
+                    modified={page.path: page.modified for page in book.pages})
+            if logging: print(f' - {book.name}: {len(content)} items found')
+            lib_content += content
 
-        lib_content = [v for v in content_dict.values()]
-        
-        return lib_content
+        if not kwargs.get('merge', True):
+            return lib_content
+        return merge_content(lib_content)
     
     def get_encounters(self, **kwargs):
+        """Extracts encounters from each owned book in the library. Set 
+        `workers` to extract pages in parallel processes.
+        """
         logging = kwargs.get('logging', True)
+        graph = kwargs.get('reference_graph', None)
         if logging: print('Extracting encounter content from library.')
         lib_content = []
-        if kwargs.get('acronyms', None):
-            for acronym in kwargs['acronyms']:
-                book = self.book(acronym=acronym)
-                if not book: continue
-                if not book.is_owned_content(): continue
-                if not book.validate(): continue
-                if book.name in kwargs.get('skip_books', []): continue
-                content = book.get_encounters(**kwargs)
-                if logging: print(f' - {book.name}: {len(content)} items found')
-                lib_content += content
-        else:
-            for name in kwargs.get('names', self.get_book_names()):
-                book = self.book(name)
-                if not book.is_owned_content(): continue
-                if not book.validate(): continue
-                if book.name in kwargs.get('skip_books', []): continue
-                content = book.get_encounters(**kwargs)
-                if logging: print(f' - {book.name}: {len(content)} items found')
-                lib_content += content
+        books = self.get_extraction_books(**kwargs)
+        for book, content in zip(books, extract_books('encounters', books, **kwargs)):
+            if graph is not None: graph.update_pages(book.page_paths(), encounters=content)
+            if logging: print(f' - {book.name}: {len(content)} items found')
+            lib_content += content
         
         return lib_content
     
+    def get_encounter_table(self, **kwargs):
+        """Returns the library's encounters as a columnar EncounterTable.
+        Accepts the same options as `get_encounters`.
+        """
+        from .encounter_table import EncounterTable
+        return EncounterTable.from_encounters(self.get_encounters(**kwargs))
+
+    def get_extraction_books(self, **kwargs):
+        """Returns the owned, valid books to extract content from, selected
+        by `acronyms` or `names` and excluding `skip_books`.
+        """
+        library = self.view()
+        if kwargs.get('acronyms', None):
+            books = [library.book(acronym=acronym) for acronym in kwargs['acronyms']]
+        else:
+            books = [library.book(name) for name in kwargs.get('names', library.get_book_names())]
+        
+        snapshot = kwargs.get('snapshot', None) or self.scan()
+        return [book for book in books 
+            if book and book.is_owned_content() and book.validate(snapshot=snapshot)
+            and book.name not in kwargs.get('skip_books', [])]
+
     def get_magic_items(self, **kwargs):
         return self.get_content(types=['magic item'], **kwargs)
     
+    def get_stat_index(self, **kwargs):
+        """Returns a StatIndex of the typed stat block fields of the
+        library's content. The index saved in `stats_file` (default 
+        `stat_index.json`) in the library's folder, or the one given as 
+        `stat_index`, is refreshed with the pages added or modified since, 
+        and saved again if anything changed unless `save=False`.
+        """
+        from .stat_index import StatIndex
+        index = kwargs.get('stat_index', None)
+        index_path = os.path.join(self.path, kwargs.get('stats_file', 'stat_index.json'))
+        if index is None:
+            index = StatIndex.from_json_file(index_path) if os.path.isfile(index_path) else StatIndex()
+        changed = index.refresh(self, **kwargs)
+        if changed and kwargs.get('save', True) and os.path.isdir(self.path):
+            index.save_json(index_path, logging=kwargs.get('logging', False))
+        return index
+    
     def get_monsters(self, **kwargs):
         return self.get_content(types=['monster'], **kwargs)
     
     def get_spells(self, **kwargs):
         return self.get_content(types=['spell'], **kwargs)
 
+    def pack(self, path=None, **kwargs):
+        """Packs every file in the library's sources folder, the sources 
+        file, and the library itself into a single archive. Files are 
+        compressed unless `compress=False`. The default path is 
+        `library.ddbpack` in the library's folder.
+        """
+        from .archive import write_archive
+        path = path or os.path.join(self.path, 'library.ddbpack')
+        logging = kwargs.get('logging', True)
+        snapshot = kwargs.get('snapshot', None) or self.scan()
+
+        if logging: print(f'Packing library to {path}.')
+        write_archive(path, self.path, snapshot.files,
+            library=json.loads(self.to_json()),
+            compress=kwargs.get('compress', True),
+        )
+        return self
+
     def save_json(self, **kwargs):
+        """Saves the library to `file`, library.json by default. The pages'
+        section indexes are saved separately, without indenting, to the
+        file's .sections.json so they don't bloat the library file.
+        """
         path = kwargs.get('path', self.path)
         file = kwargs.get('file', 'library.json')
+        logging = kwargs.get('logging', True)
         file_path = os.path.join(path, file)
-        print(f'Saving library to {file_path}.')
+        if logging: print(f'Saving library to {file_path}.')
+        library = json.loads(self.to_json())
+        sections = {}
+        for book in library.get('books', []):
+            for page in book.get('pages', []):
+                page_sections = page.pop('sections', None)
+                if page.get('path', None) and page_sections is not None:
+                    sections[page['path']] = page_sections
         with open(file_path, 'w') as fout:
-            json.dump(json.loads(self.to_json()), fout, indent=4)
+            json.dump(library, fout, indent=4)
+        with open(sections_json_path(file_path), 'w') as fout:
+            json.dump(sections, fout, separators=(',', ':'))
+
+    def save_manifest(self, **kwargs):
+        """Saves a Manifest of the library's files to `manifest_file` 
+        (default `manifest.json`) in the library's folder, next to 
+        library.json, and returns it.
+        """
+        manifest = self.manifest(**kwargs)
+        manifest_path = os.path.join(self.path, kwargs.get('manifest_file', 'manifest.json'))
+        manifest.save_json(manifest_path, logging=kwargs.get('logging', True))
+        return manifest
+
+    def scan(self):
+        """Returns a FileSystemSnapshot of the library's sources folder and
+        sources file, read in a single walk. Pass it as `snapshot` to avoid 
+        repeated stat calls, and call its `refresh` method to read it again.
+        For a library loaded with `from_archive`, the archive is returned.
+        """
+        archive = find_mount(self.path)
+        if archive: return archive
+        return FileSystemSnapshot(os.path.join(self.path, 'sources'), files=[self.sources.path])
+
+    def serve(self, **kwargs):
+        """Serves read-only JSON queries for this library on localhost.
+        See `server.serve` for options.
+        """
+        from .server import serve
+        return serve(self, **kwargs)
+
+    def share(self, path=None, **kwargs):
+        """Writes the library's metadata to a file that worker processes
+        map into memory instead of each loading their own copy, and returns
+        it as a SharedLibrary. The file defaults to `library.shared` in the
+        library's folder.
+
+        Pass the SharedLibrary as `shared` to extraction methods using 
+        `workers`, so pages are sent to the workers as indexes into it, or
+        pass it to workers of your own, which attach to it when unpickled.
+        """
+        from .shared_state import attach, write_shared
+        logging = kwargs.get('logging', True)
+        path = path or os.path.join(self.path, 'library.shared')
+        if logging: print(f'Sharing library metadata in {path}.')
+        write_shared(self, path)
+        return attach(path)
 
     def size(self):
         """Returns the number of books in the library.
@@ -272,31 +727,97 @@ class Library:
         return len(self.books)
 
     def to_json(self, **kwargs):
-        return json.dumps(self.__dict__, cls=MyEncoder, **kwargs)
+        with library_locks(self)[1]:
+            d = dict(self.__dict__)
+        return json.dumps(d, cls=MyEncoder, **kwargs)
     
     def update(self, **kwargs):
+        """Updates the sources and any books with modified files. If the 
+        library hashes its files, files whose modification time changed but
+        whose contents didn't only have their modification time refreshed.
+
+        With `isolated=True`, other threads can keep reading the library 
+        while it's updated. Books with modified files are copied and the
+        copies updated, and the new list of books is swapped in once every
+        book is done, so readers see either the old books or the new ones
+        and never a book part way through an update. Unchanged books aren't
+        copied.
+
+        The sources and the books are swapped in together, but reading
+        `sources` and then `books` can still pair the old sources with the
+        new books. Use `view` to read one version across several reads. The
+        library's own readers, such as `get_content`, `copy`, `manifest` 
+        and `to_json`, each read a single view.
+        """
         logging = kwargs.get('logging', False)
+        hash = kwargs.get('hash', self.hash_files)
+        snapshot = kwargs.get('snapshot', None) or self.scan()
+        isolated = kwargs.get('isolated', False)
+        # each file is hashed at most once, however many checks need it
+        options = {'hash': hash, 'snapshot': snapshot, 'digests': {}}
 
-        if self.sources.update_available():
-            if logging: print(f'Updating sources.')
-            self.load_sources(replace=False)
-        
-        for book in self.books:
-            if book.update_available():
-                if logging: print(f'Updating book "{book.name}".')
-                book.update()
+        update_lock, publish_lock = library_locks(self)
+        with update_lock:
+            library = self
+            if isolated:
+                library = self.view()
+                library.sources = copy.copy(self.sources)
+
+            if library.sources.update_available(**options):
+                if logging: print(f'Updating sources.')
+                library.reload_sources(load_folders=True, logging=logging, isolated=isolated, **options)
+            elif hash:
+                library.sources.refresh_modified(**options)
+            
+            for i, book in enumerate(library.books):
+                if book.update_available(**options):
+                    if logging: print(f'Updating book "{book.name}".')
+                    if isolated:
+                        book = library.books[i] = book.clone()
+                    book.update(**options)
+                elif hash and book.update_available(snapshot=snapshot):
+                    # only modification times changed
+                    if isolated:
+                        book = library.books[i] = book.clone()
+                    book.refresh_modified(**options)
+
+            if isolated:
+                with publish_lock:
+                    self.sources, self.books = library.sources, library.books
         
         return self
     
-    def update_available(self):
+    def update_available(self, **kwargs):
         """Returns True if the source file or if any of the books in this 
         library have been modified since this was created or last updated.
         """
-        if self.sources.update_available():
+        hash = kwargs.get('hash', self.hash_files)
+        snapshot = kwargs.get('snapshot', None) or self.scan()
+        library = self.view()
+        if library.sources.update_available(hash=hash, snapshot=snapshot):
             return True
         
-        for book in self.books:
-            if book.update_available():
+        for book in library.books:
+            if book.update_available(hash=hash, snapshot=snapshot):
                 return True
         
         return False
+
+    def view(self):
+        """Returns a Library holding the current sources and list of books,
+        which doesn't change when this library is updated with 
+        `isolated=True`. The books and pages themselves are shared, not
+        copied.
+        """
+        view = Library()
+        with library_locks(self)[1]:
+            view.__dict__.update(self.__dict__)
+            view.books = list(self.books)
+        return view
+
+    def watch(self, **kwargs):
+        """Returns a LibraryWatcher that keeps this library and its 
+        extracted content current as its files change.
+        """
+        from .watcher import LibraryWatcher
+        return LibraryWatcher(self, **kwargs)
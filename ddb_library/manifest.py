@@ -0,0 +1,149 @@
+from .fs_snapshot import LIVE_FILE_SYSTEM
+from .hashing import file_hash
+from .myencoder import MyEncoder
+import hashlib
+import json
+import os
+
+VERSION = 1
+
+def tree_hash(items):
+    """Returns a hash of the given (name, hash) pairs, in name order.
+    """
+    digest = hashlib.blake2b(digest_size=16)
+    for name, value in sorted(items):
+        digest.update(f'{name}\0{value}\n'.encode('utf-8'))
+    return digest.hexdigest()
+
+def relative_path(path, root):
+    return os.path.relpath(path, root).replace(os.sep, '/')
+
+class Manifest:
+    """A tree of hashes of a library's files: one for each page, one for
+    each book made from its pages' hashes, and one for the library made
+    from its books' hashes and the sources file's.
+
+    Paths are relative to the library's folder, so manifests of copies of
+    the same library on different hosts can be compared with `diff`. Only
+    books whose hashes differ are compared page by page. Modification times
+    are kept only so an earlier manifest of the same folder can reuse the
+    hashes of unchanged files.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.version = d.get('version', VERSION)
+        self.hash = d.get('hash', None)
+        self.sources = d.get('sources', None)
+        self.books = d.get('books', {})
+
+    @classmethod
+    def from_json_file(cls, json_path):
+        with open(json_path, 'r') as fin:
+            json_dict = json.load(fin)
+        return cls(json_dict)
+
+    @classmethod
+    def from_library(cls, library, **kwargs):
+        """Builds the manifest of a library's current files. Pages whose
+        modification time matches their stored hash, or an entry in the
+        `previous` manifest, aren't read again.
+        """
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
+        previous = kwargs.get('previous', None) or Manifest()
+        previous_files = {}
+        for book in previous.books.values():
+            previous_files.update(book['pages'])
+        if previous.sources:
+            previous_files[previous.sources['file']] = previous.sources
+
+        def entry(path, page=None):
+            name = relative_path(path, library.path)
+            modified = fs.getmtime(path)
+            if page is not None and page.hash and page.modified == modified:
+                return name, {'hash': page.hash, 'modified': modified}
+            known = previous_files.get(name, None)
+            if known and known['modified'] == modified:
+                return name, known
+            return name, {'hash': file_hash(path), 'modified': modified}
+
+        manifest = cls()
+        if library.sources and library.sources.path and fs.isfile(library.sources.path):
+            name, sources = entry(library.sources.path)
+            manifest.sources = dict(sources, file=name)
+
+        for book in library.books:
+            pages = ([book.table_of_contents] if book.table_of_contents else []) + book.pages
+            pages = [page for page in pages if page.path and fs.isfile(page.path)]
+            if not pages: continue
+            entries = dict(entry(page.path, page) for page in pages)
+            manifest.books[relative_path(book.path, library.path)] = {
+                'name': book.name,
+                'hash': tree_hash((name, e['hash']) for name, e in entries.items()),
+                'pages': entries,
+            }
+        manifest.hash = manifest.root_hash()
+        return manifest
+
+    def __repr__(self):
+        return f'Manifest(hash={self.hash!r}, books={len(self.books)}, pages={self.size()})'
+
+    def diff(self, other):
+        """Returns what differs between this manifest and another: whether
+        the sources file differs, and the books and pages that were 'added'
+        (only in this manifest), 'removed' (only in the other) or 'changed'.
+        The pages of added and removed books aren't listed separately.
+        """
+        other = other if type(other) is Manifest else Manifest(other)
+        changes = {
+            'sources': False,
+            'books': {'added': [], 'removed': [], 'changed': []},
+            'pages': {'added': [], 'removed': [], 'changed': []},
+        }
+        if self.hash and self.hash == other.hash:
+            return changes
+
+        changes['sources'] = (self.sources or {}).get('hash', None) != (other.sources or {}).get('hash', None)
+        for path in sorted(set(self.books) | set(other.books)):
+            book, other_book = self.books.get(path, None), other.books.get(path, None)
+            if other_book is None:
+                changes['books']['added'].append(path)
+            elif book is None:
+                changes['books']['removed'].append(path)
+            elif book['hash'] != other_book['hash']:
+                changes['books']['changed'].append(path)
+                pages, other_pages = book['pages'], other_book['pages']
+                for name in sorted(set(pages) | set(other_pages)):
+                    if name not in other_pages:
+                        changes['pages']['added'].append(name)
+                    elif name not in pages:
+                        changes['pages']['removed'].append(name)
+                    elif pages[name]['hash'] != other_pages[name]['hash']:
+                        changes['pages']['changed'].append(name)
+        return changes
+
+    def root_hash(self):
+        items = [(path, book['hash']) for path, book in self.books.items()]
+        if self.sources:
+            items.append(('', self.sources['hash']))
+        return tree_hash(items)
+
+    def save_json(self, path, **kwargs):
+        logging = kwargs.get('logging', True)
+        if logging: print(f'Saving manifest to {path}.')
+        tmp_path = path + '.tmp'
+        with open(tmp_path, 'w') as fout:
+            fout.write(self.to_json(indent=kwargs.get('indent', None)))
+        os.replace(tmp_path, path)
+
+    def size(self):
+        """Returns the number of pages in the manifest.
+        """
+        return sum(len(book['pages']) for book in self.books.values())
+
+    def to_json(self, **kwargs):
+        return json.dumps({
+            'version': self.version,
+            'hash': self.hash,
+            'sources': self.sources,
+            'books': self.books,
+        }, cls=MyEncoder, **kwargs)
@@ -2,4 +2,6 @@ import json
 
 class MyEncoder(json.JSONEncoder):
     def default(self, o):
+        if hasattr(o, 'to_dict'):
+            return o.to_dict()
         return o.__dict__
\ No newline at end of file
@@ -1,25 +1,104 @@
 from .content_reference import ContentReference
+from .encounter_parser import RE_CONTENT_ID, iter_encounters, text_to_number
 from .myencoder import MyEncoder
-from .html_processor import process_html
+from .fs_snapshot import LIVE_FILE_SYSTEM
+from .hashing import file_hash
+from .html_processor import HTML_OPTIONS, format_text, process_html
+from .section_index import index_page, index_sections, unpack_sections
 from bs4 import BeautifulSoup
 import json
 import os
-import re
+import sys
+
+# html options that rewrite a page's file the same way as the html 
+# serialized from its tree, so they can be applied before streaming it
+RAW_TEXT_OPTIONS = ['remove_comments', 'remove_blank_lines']
+
+def intern_string(value):
+    return sys.intern(value) if type(value) is str else value
 
 class Page:
+    """A single html file of a book.
+
+    Pages use slots to keep large libraries small. The path is derived from
+    the book's folder (`root`) and the page's `file` where possible, the 
+    url is stored as an interned prefix shared with the book's other pages
+    plus its last part, and the page links and type are interned.
+    """
+    __slots__ = [
+        'name', 'file', 'root', '_path', '_type', '_url_prefix', '_url_name',
+        '_previous_page', '_next_page', 'modified', 'hash', 'sections',
+    ]
+
+    FIELDS = ['name', 'file', 'path', 'type', 'url', 'previous_page', 'next_page', 'modified', 'hash', 'sections']
+
     def __init__(self, *args, **kwargs):
         d = args[0] if args else kwargs
         self.name = d.get('name', None)
         self.file = d.get('file', None)
+        self.root = intern_string(d.get('root_path', None))
         self.path = d.get('path', None)
         self.type = d.get('type', None)
         self.url = d.get('url', None)
         self.previous_page = d.get('previous_page', '')
         self.next_page = d.get('next_page', '')
         self.modified = d.get('modified', None)
+        self.hash = d.get('hash', None)
+        self.sections = d.get('sections', None)
 
     def __repr__(self):
-        return f'{self.__dict__}'
+        return f'{self.to_dict()}'
+
+    @property
+    def path(self):
+        if self._path is None and self.root and self.file:
+            return os.path.join(self.root, self.file)
+        return self._path
+
+    @path.setter
+    def path(self, value):
+        if value and self.root and self.file and value == os.path.join(self.root, self.file):
+            self._path = None
+        else:
+            self._path = value
+
+    @property
+    def type(self):
+        return self._type
+
+    @type.setter
+    def type(self, value):
+        self._type = intern_string(value)
+
+    @property
+    def url(self):
+        if self._url_name is None:
+            return None
+        return self._url_prefix + self._url_name
+
+    @url.setter
+    def url(self, value):
+        if value is None:
+            self._url_prefix, self._url_name = '', None
+        else:
+            prefix, sep, name = value.rpartition('/')
+            self._url_prefix, self._url_name = sys.intern(prefix + sep), name
+
+    @property
+    def previous_page(self):
+        return self._previous_page
+
+    @previous_page.setter
+    def previous_page(self, value):
+        self._previous_page = intern_string(value)
+
+    @property
+    def next_page(self):
+        return self._next_page
+
+    @next_page.setter
+    def next_page(self, value):
+        self._next_page = intern_string(value)
 
     def copy(self, path, **kwargs):
         """Copies the contents of this file to a new location."""
@@ -27,7 +106,7 @@ class Page:
         dryrun = kwargs.get('dryrun', False)
         logging = kwargs.get('logging', False)
 
-        if not self.file_exists():
+        if not self.file_exists(**kwargs):
             raise FileNotFoundError("file does not exist")
         
         # destination folder
@@ -49,22 +128,44 @@ class Page:
 
         return self
     
-    def file_exists( self ):
-        """Returns True if the file associated with this page exists.
+    def file_exists( self, **kwargs ):
+        """Returns True if the file associated with this page exists. A 
+        FileSystemSnapshot can be given as `snapshot` to avoid a stat call.
         """
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
         if self.path:
-            return os.path.isfile(self.path)
+            return fs.isfile(self.path)
         else:
             return False
     
     def get_html(self, **kwargs):
-        with open(self.path, 'r') as fin:
-            html_text = fin.read()
+        """Returns the page's html processed with the given `process_html`
+        options. If an HtmlCache is given as `html_cache`, the result is 
+        read from and stored in it.
+        """
+        cache = kwargs.get('html_cache', None)
+        if cache is not None:
+            key = cache.key(self.path, self.cache_version(**kwargs), **kwargs)
+            html_text = cache.get(key)
+            if html_text is not None:
+                return html_text
+
+        html_text = process_html(LIVE_FILE_SYSTEM.read_text(self.path), **kwargs)
+        if cache is not None:
+            cache.put(key, html_text)
+        return html_text
 
-        return process_html(html_text, **kwargs)
+    def cache_version(self, **kwargs):
+        """Returns the hash of the page's file if it's known to be current,
+        otherwise the file's modification time.
+        """
+        modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if self.hash and self.modified == modified:
+            return self.hash
+        return modified
     
     def get_content(self, **kwargs):
-        html_options = kwargs.get('html_options', {})
+        html_options = {'html_cache': kwargs.get('html_cache', None), **kwargs.get('html_options', {})}
         soup = BeautifulSoup(self.get_html(**html_options), 'html.parser')
 
         # remove some annoying formatting stuff
@@ -124,7 +225,7 @@ class Page:
                     content_type = None
                 
                 content_id = a['href'].split('/')[-1]
-                m = re.match(r'^(?P<id_num>\d+)-.*$', content_id)
+                m = RE_CONTENT_ID.match(content_id)
                 if not m: continue
                 
                 if content_type in content_types:
@@ -140,32 +241,17 @@ class Page:
         return content
     
     def get_encounters(self, **kwargs):
-        TEXT_TO_NUMBER = {
-            'one': 1,
-            'two': 2,
-            'three': 3,
-            'four': 4,
-            'five': 5,
-            'six': 6,
-            'seven': 7,
-            'eight': 8,
-            'nine': 9,
-            'ten': 10,
-            'eleven': 11,
-            'twelve': 12,
-            'dozen': 12,
-            'thirteen': 13,
-            'fourteen': 14,
-            'fifteen': 15,
-            'sixteen': 16,
-            'seventeen': 17,
-            'eighteen': 18,
-            'nineteen': 19,
-            'twenty': 20,
-            '.': 1,
-        }
-        
-        html_options = kwargs.get('html_options', {})
+        """Returns the encounters in this page: each paragraph that links to
+        monsters, with the number of each and the headings it's under.
+
+        Set `parser='stream'` to find them in a single pass over the html 
+        rather than by building a BeautifulSoup tree. Both give the same 
+        results.
+        """
+        if kwargs.get('parser', 'tree') == 'stream':
+            return list(self.stream_encounters(**kwargs))
+
+        html_options = {'html_cache': kwargs.get('html_cache', None), **kwargs.get('html_options', {})}
         soup = BeautifulSoup(self.get_html(**html_options), 'html.parser')
 
         # remove some annoying formatting stuff
@@ -214,23 +300,19 @@ class Page:
                 if c.name == 'a':
                     if 'monster-tooltip' not in c.get('class', []): continue
                     monster = c['href'].split('/')[-1]
-                    m = re.match(r'^(?P<id_num>\d+)-.*$', monster)
+                    m = RE_CONTENT_ID.match(monster)
                     if not m: continue
                     monsters += [(number, monster)]
                     number = 1
                 elif not c.name:
-                    m = re.match(r'.*\b(?P<number>\d+|one|two|three|four|five|six|seven|eight|nine|ten|eleven|twelve|dozen|thirteen|fourteen|fifteen|sixteen|seventeen|eighteen|nineteen|twenty|\.)\b', c.get_text('', strip=False), re.IGNORECASE)
-                    if not m: continue
-                    number = m['number'].lower()
-                    if re.match('\d+', number):
-                        number = int(number)
-                    else:
-                        number = TEXT_TO_NUMBER.get(number, 1)
+                    n = text_to_number(c.get_text('', strip=False))
+                    if n is None: continue
+                    number = n
                 elif c.name == 'span':
                     if 'plural-monster-tooltip' in c.get('class', ''):
                         if 'monster-tooltip' not in c.a.get('class', []): continue
                         monster = c.a['href'].split('/')[-1]
-                        m = re.match(r'^(?P<id_num>\d+)-.*$', monster)
+                        m = RE_CONTENT_ID.match(monster)
                         if not m: continue
                         monsters += [(number, monster)]
                         number = 1
@@ -251,6 +333,33 @@ class Page:
         
         return content
 
+    def stream_encounters(self, **kwargs):
+        """Yields the encounters in this page as an EncounterParser finds
+        them, each one as soon as its paragraph is closed.
+
+        No tree is built: the page's file is read, rewritten with any of
+        the `RAW_TEXT_OPTIONS`, and fed to the parser. Other html options
+        depend on the html serialized from the page's tree, so with those
+        the processed html from `get_html` is fed instead.
+        """
+        html_options = kwargs.get('html_options', {})
+        options = [k for k in HTML_OPTIONS if html_options.get(k, None)]
+        if all(k in RAW_TEXT_OPTIONS for k in options):
+            html_text = format_text(LIVE_FILE_SYSTEM.read_text(self.path), **html_options)
+        else:
+            html_text = self.get_html(html_cache=kwargs.get('html_cache', None), **html_options)
+
+        for headings, monsters, text in iter_encounters(html_text):
+            yield {
+                'type': 'encounter',
+                'modified': self.modified,
+                'book': None,
+                'path': self.path,
+                'book_path': '; '.join([v for v in [self.name] + headings if v]),
+                'monsters': monsters,
+                'text': text,
+            }
+
     def get_magic_items(self, **kwargs):
         return self.get_content(types=['magic item'], **kwargs)
     
@@ -274,31 +383,84 @@ class Page:
     def get_monsters( self, **kwargs ):
         return self.get_content(types=['monster'], **kwargs)
 
+    def get_section(self, section, **kwargs):
+        """Returns the html of one of the page's sections, processed with
+        the given `process_html` options. Only the section's part of the file
+        is read.
+        """
+        data = LIVE_FILE_SYSTEM.read_range(self.path, section['start'], section['end'])
+        return process_html(data.decode('utf-8', 'replace'), **kwargs)
+
+    def get_sections(self, **kwargs):
+        """Returns the page's headings and the file offsets of their
+        sections, indexing the file again if it changed since the page was
+        updated.
+        """
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
+        if self.sections is None or self.modified != fs.getmtime(self.path):
+            self.sections = index_sections(LIVE_FILE_SYSTEM.read_bytes(self.path))
+        return unpack_sections(self.sections)
+
     def get_spells(self, **kwargs):
         return self.get_content(types=['spell'], **kwargs)
     
+    def refresh_modified(self, **kwargs):
+        """Records the file's new modification time if only that changed,
+        and its contents still match the stored hash. Returns True if it
+        was refreshed.
+        """
+        if not self.hash or not self.modified or not self.file_exists(**kwargs): return False
+        modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if self.modified < modified and \
+                self.hash == file_hash(self.path, digests=kwargs.get('digests', None)):
+            self.modified = modified
+            return True
+        return False
+
+    def set_root(self, root):
+        """Sets the folder this page's path is derived from.
+        """
+        path = self.path
+        self.root = intern_string(root)
+        self.path = path
+        return self
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.FIELDS}
+
     def to_json(self, **kwargs):
-        return json.dumps(self.__dict__, cls=MyEncoder, **kwargs)
+        return json.dumps(self.to_dict(), cls=MyEncoder, **kwargs)
     
-    def update( self ):
-        meta_data = self.get_meta_data()
+    def update( self, **kwargs ):
+        # the meta data and sections come from one parse of the raw file
+        meta_data, sections = index_page(LIVE_FILE_SYSTEM.read_bytes(self.path))
         self.type = meta_data.get('og:type', self.type)
         self.type = 'toc' if self.type == 'article' else self.type
         self.name = meta_data.get('og:title', self.name)
         self.url = meta_data.get('og:url', self.url)
         self.previous_page = meta_data.get('previous_page', self.previous_page)
         self.next_page = meta_data.get('next_page', self.next_page)
-        self.modified = os.path.getmtime(self.path)
+        self.modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if kwargs.get('hash', False) or self.hash:
+            self.hash = file_hash(self.path, digests=kwargs.get('digests', None))
+        if kwargs.get('sections', True):
+            self.sections = sections
         
-    def update_available( self ):
+    def update_available( self, **kwargs ):
         """Returns True if the file for this page has been modified 
         since this was created or last updated.
+
+        With hash=True, a file whose modification time changed but whose
+        contents still match the stored hash isn't reported as updated.
+        Nothing is changed; see `refresh_modified`.
         """
-        if not self.file_exists(): return False
+        if not self.file_exists(**kwargs): return False
         if not self.modified: return True
-        if self.modified < os.path.getmtime(self.path):
-            return True
+        modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if self.modified < modified:
+            if not (kwargs.get('hash', False) and self.hash): return True
+            return self.hash != file_hash(self.path, digests=kwargs.get('digests', None))
         return False
     
-    def validate(self):
-        return self.file_exists()
\ No newline at end of file
+    def validate(self, **kwargs):
+        return self.file_exists(**kwargs)
\ No newline at end of file
@@ -0,0 +1,58 @@
+from .fs_snapshot import MOUNTS
+from .prefetch import Prefetcher
+from concurrent.futures import ProcessPoolExecutor
+
+# options that are only used by the calling process
+LOCAL_OPTIONS = ['reference_graph', 'stat_index', 'shared', 'workers', 'logging', 'snapshot']
+
+def page_task(task):
+    """Extracts content or encounters from a single page of a book. The
+    book and page are either given, or read from a SharedLibrary by index.
+    """
+    if len(task) == 5:
+        kind, shared, book_index, page_index, options = task
+        book, page = shared.book_header(book_index), shared.get_page(book_index, page_index)
+    else:
+        kind, book, page, options = task
+    if kind == 'content':
+        return book.get_page_content(page, **options)
+    return book.get_page_encounters(page, **options)
+
+def mount_archives(archives):
+    """Mounts the archives of the calling process in a worker process."""
+    for archive in archives:
+        archive.mount()
+
+def extract_books(kind, books, **kwargs):
+    """Yields the content or encounters found in each of the given books, 
+    in order. With `workers` greater than one, pages are extracted by a 
+    pool of processes and the results are returned in the same order as a 
+    serial extraction.
+    """
+    workers = kwargs.get('workers', None)
+    if not workers or workers < 2:
+        paths = [path for book in books for path in book.page_paths()]
+        with Prefetcher(paths if kwargs.get('prefetch', True) else []):
+            for book in books:
+                yield [item for page in book.pages for item in page_task((kind, book, page, kwargs))]
+        return
+
+    # books found unchanged in a SharedLibrary are sent to workers as 
+    # indexes into it, rather than as pickled pages
+    shared = kwargs.get('shared', None)
+    options = {k: v for k, v in kwargs.items() if k not in LOCAL_OPTIONS}
+    tasks = []
+    for book in books:
+        index = shared.book_index(path=book.path) if shared else None
+        if index is not None and shared.book_fingerprint(index) == book.fingerprint():
+            tasks += [(kind, shared, index, i, options) for i in range(len(book.pages))]
+        else:
+            header = book.header()
+            tasks += [(kind, header, page, options) for page in book.pages]
+    
+    chunksize = max(1, len(tasks) // (workers * 8))
+    archives = list(MOUNTS.values())
+    with ProcessPoolExecutor(max_workers=workers, initializer=mount_archives, initargs=(archives,)) as executor:
+        results = executor.map(page_task, tasks, chunksize=chunksize)
+        for book in books:
+            yield [item for page in book.pages for item in next(results)]
@@ -0,0 +1,132 @@
+from .fs_snapshot import add_prefetcher, find_mount, remove_prefetcher
+from concurrent.futures import ThreadPoolExecutor
+import os
+import threading
+
+def read_file(path):
+    with open(path, 'rb') as fin:
+        return fin.read()
+
+def advise_willneed(path):
+    """Asks the OS to start reading the given file into its cache.
+    """
+    if not hasattr(os, 'posix_fadvise'): return
+    try:
+        fd = os.open(path, os.O_RDONLY)
+    except OSError:
+        return
+    try:
+        os.posix_fadvise(fd, 0, 0, os.POSIX_FADV_WILLNEED)
+    except OSError:
+        pass
+    finally:
+        os.close(fd)
+
+class Prefetcher:
+    """Reads files on a small thread pool ahead of when they're needed.
+
+    `paths` are given in the order they'll be read. Up to two windows of 
+    `window` files are read ahead, with each window read in folder and 
+    inode order, and the OS is asked to start reading the window after.
+    While running, reads made through the library's file system take 
+    these files from the prefetcher instead of the disk. Files that are
+    passed over are dropped.
+
+    Use as a context manager around the loop reading the files.
+    """
+    def __init__(self, paths, **kwargs):
+        self.paths = [path for path in paths if path and not find_mount(path)]
+        self.workers = kwargs.get('workers', 4)
+        self.window = kwargs.get('window', 16)
+        self.position = {}
+        for i, path in enumerate(self.paths):
+            self.position.setdefault(path, i)
+        self.pending = {}
+        self.scheduled = 0
+        self.advised = 0
+        self.consumed = 0
+        self.inodes = {}
+        self.lock = threading.Lock()
+        self.executor = None
+
+    def __repr__(self):
+        return f'Prefetcher(paths={len(self.paths)}, consumed={self.consumed}, pending={len(self.pending)})'
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
+
+    def start(self):
+        if not self.paths or self.executor: return self
+        self.executor = ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='prefetch')
+        add_prefetcher(self)
+        with self.lock:
+            self.schedule()
+        return self
+
+    def stop(self):
+        remove_prefetcher(self)
+        with self.lock:
+            executor, self.executor = self.executor, None
+            for future in self.pending.values():
+                future.cancel()
+            self.pending = {}
+        if executor:
+            executor.shutdown(wait=True)
+        return self
+
+    def locality_order(self, paths):
+        """Returns the given paths sorted by folder, then by inode.
+        """
+        for dirname in {os.path.dirname(path) for path in paths}:
+            if dirname in self.inodes: continue
+            self.inodes[dirname] = {}
+            try:
+                with os.scandir(dirname) as entries:
+                    for entry in entries:
+                        self.inodes[dirname][entry.path] = entry.inode()
+            except OSError:
+                pass
+        return sorted(paths, key=lambda path: (os.path.dirname(path), 
+            self.inodes[os.path.dirname(path)].get(path, 0)))
+
+    def schedule(self):
+        # keep up to two windows read ahead of the last file taken
+        while self.scheduled < len(self.paths) and self.scheduled < self.consumed + 2 * self.window:
+            window = self.paths[self.scheduled:self.scheduled + self.window]
+            self.scheduled += len(window)
+            for path in self.locality_order(window):
+                if path in self.pending: continue
+                self.pending[path] = self.executor.submit(read_file, path)
+
+        # and hint the window after that
+        end = min(len(self.paths), self.scheduled + self.window)
+        for path in self.paths[max(self.advised, self.scheduled):end]:
+            self.executor.submit(advise_willneed, path)
+        self.advised = max(self.advised, end)
+
+    def take(self, path):
+        """Returns the contents of the given file if it has been scheduled,
+        otherwise None.
+        """
+        with self.lock:
+            index = self.position.get(path, None)
+            # a reader may still hold a prefetcher that was just stopped
+            if index is None or self.executor is None: return None
+            future = self.pending.pop(path, None)
+
+            # files before this one were passed over
+            if index >= self.consumed:
+                for skipped in self.paths[self.consumed:index]:
+                    f = self.pending.pop(skipped, None)
+                    if f: f.cancel()
+                self.consumed = index + 1
+                self.schedule()
+
+        if future is None: return None
+        try:
+            return future.result()
+        except OSError:
+            return None
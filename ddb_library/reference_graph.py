@@ -0,0 +1,151 @@
+from .myencoder import MyEncoder
+import json
+
+class ReferenceGraph:
+    """Maps content ids to the pages and headings that reference them, and
+    pages back to the content ids they reference.
+
+    References come from extracted encounters, which record where monsters
+    are used, and from extracted content, which records where monsters,
+    spells and magic items are described. Each page's references are
+    replaced as a whole when it is extracted again.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.pages = {}
+        self.ids = {}
+        for path, refs in d.get('pages', {}).items():
+            self.set_page(path, refs)
+
+    @classmethod
+    def from_json_file(cls, json_path):
+        with open(json_path, 'r') as fin:
+            json_dict = json.load(fin)
+        return cls(json_dict)
+
+    def __repr__(self):
+        return f'ReferenceGraph(ids={len(self.ids)}, pages={len(self.pages)})'
+
+    def add_content(self, content):
+        """Adds references for a list of ContentReference, replacing any
+        references already held for the pages they were found in.
+        """
+        pages = {}
+        for c in content:
+            for source in c.sources:
+                path = source['page']['path']
+                pages.setdefault(path, []).append({
+                    'id': c.id,
+                    'kind': 'content',
+                    'type': c.type,
+                    'page': path,
+                    'book': source['name'],
+                    'book_path': '; '.join([v for v in [source['name'], source['page']['name'], c.name] if v]),
+                    'count': 1,
+                    'encounters': 0,
+                })
+        for path, refs in pages.items():
+            kept = [r for r in self.pages.get(path, []) if r['kind'] != 'content']
+            self.set_page(path, kept + refs)
+        return self
+
+    def add_encounters(self, encounters):
+        """Adds references for a list of encounters, replacing any encounter
+        references already held for the pages they were found in. Counts
+        are summed for each monster and heading.
+        """
+        pages = {}
+        for e in encounters:
+            refs = pages.setdefault(e['path'], {})
+            for (number, monster) in e['monsters']:
+                key = (monster, e['book_path'])
+                if key not in refs:
+                    refs[key] = {
+                        'id': monster,
+                        'kind': 'encounter',
+                        'type': 'monster',
+                        'page': e['path'],
+                        'book': e['book'],
+                        'book_path': e['book_path'],
+                        'count': 0,
+                        'encounters': 0,
+                    }
+                refs[key]['count'] += number
+                refs[key]['encounters'] += 1
+        for path, refs in pages.items():
+            kept = [r for r in self.pages.get(path, []) if r['kind'] != 'encounter']
+            self.set_page(path, kept + list(refs.values()))
+        return self
+
+    def content_ids(self, path):
+        """Returns the ids of all content referenced by the given page.
+        """
+        return sorted({r['id'] for r in self.pages.get(path, [])})
+
+    def locations(self, content_id, **kwargs):
+        """Returns the heading paths where the given content is used, with
+        the total count and number of encounters at each.
+        """
+        kind = kwargs.get('kind', None)
+        locations = {}
+        for r in self.references(content_id):
+            if kind and r['kind'] != kind: continue
+            loc = locations.setdefault(r['book_path'], {'book_path': r['book_path'], 'page': r['page'], 'count': 0, 'encounters': 0})
+            loc['count'] += r['count']
+            loc['encounters'] += r['encounters']
+        return list(locations.values())
+
+    def references(self, content_id):
+        """Returns every reference to the given content id.
+        """
+        return [r for refs in self.ids.get(content_id, {}).values() for r in refs]
+
+    def remove_pages(self, paths):
+        """Removes all references held for the given pages.
+        """
+        for path in paths:
+            self.set_page(path, [])
+        return self
+
+    def update_pages(self, paths, **kwargs):
+        """Replaces the references held for the given pages with those in
+        the `content` and/or `encounters` extracted from them. Pages with 
+        nothing extracted have their references of that kind removed.
+        """
+        for kind, items, add in [
+                ('content', kwargs.get('content', None), self.add_content),
+                ('encounter', kwargs.get('encounters', None), self.add_encounters)]:
+            if items is None: continue
+            for path in paths:
+                self.set_page(path, [r for r in self.pages.get(path, []) if r['kind'] != kind])
+            add(items)
+        return self
+
+    def save_json(self, path, **kwargs):
+        logging = kwargs.get('logging', True)
+        if logging: print(f'Saving reference graph to {path}.')
+        with open(path, 'w') as fout:
+            json.dump({'pages': self.pages}, fout, indent=kwargs.get('indent', None))
+
+    def set_page(self, path, refs):
+        """Replaces all references held for the given page.
+        """
+        for r in self.pages.pop(path, []):
+            page_refs = self.ids.get(r['id'], {})
+            page_refs.pop(path, None)
+            if not page_refs:
+                self.ids.pop(r['id'], None)
+
+        if not refs: return self
+        self.pages[path] = refs
+        for r in refs:
+            self.ids.setdefault(r['id'], {}).setdefault(path, []).append(r)
+        return self
+
+    def size(self):
+        """Returns the number of content ids with references.
+        """
+        return len(self.ids)
+
+    def to_json(self, **kwargs):
+        return json.dumps({'pages': self.pages}, cls=MyEncoder, **kwargs)
@@ -0,0 +1,178 @@
+from html.parser import HTMLParser
+import re
+
+HEADING_LEVELS = {'h1': 1, 'h2': 2, 'h3': 3, 'h4': 4, 'h5': 5}
+VOID_TAGS = {
+    'area','base','br','col','embed','hr','img','input','keygen','link',
+    'menuitem','meta','param','source','track','wbr',
+}
+RE_NEWLINE = re.compile('\n')
+
+class SectionIndexer(HTMLParser):
+    """Finds the h1 to h5 headings of a page and the part of the file each
+    one's section covers.
+
+    A section starts at its heading and ends at the next heading of the
+    same or a higher level, or at the end of the element containing the
+    heading. Offsets are in bytes of the raw file, so a section can be read
+    without reading the rest of the file.
+
+    The page's meta data is collected in the same pass, see `meta_data`.
+    """
+    def __init__(self, data):
+        super().__init__(convert_charrefs=True)
+        self.data = data
+        self.text = data.decode('utf-8', 'surrogateescape')
+        self.line_starts = [0] + [m.end() for m in RE_NEWLINE.finditer(self.text)]
+        self.meta_data = {}
+        self.nav = None
+        self.last_offset = (0, 0)
+        self.stack = []
+        self.heading = None
+        self.heading_depth = 0
+        self.path = {}
+        self.open_sections = []
+        self.sections = []
+
+    def index(self):
+        self.feed(self.text)
+        self.close()
+        if self.heading:
+            self.end_heading()
+        for section, depth in self.open_sections:
+            section['end'] = len(self.data)
+        return self.sections
+
+    def byte_offset(self):
+        """Returns the byte offset of the current position in the file.
+        """
+        lineno, col = self.getpos()
+        char_offset = self.line_starts[lineno - 1] + col
+        last_char, last_byte = self.last_offset
+        if char_offset < last_char:
+            last_char, last_byte = 0, 0
+        byte_offset = last_byte + len(self.text[last_char:char_offset].encode('utf-8', 'surrogateescape'))
+        self.last_offset = (char_offset, byte_offset)
+        return byte_offset
+
+    def end_sections(self, offset, **kwargs):
+        level = kwargs.get('level', None)
+        depth = kwargs.get('depth', None)
+        still_open = []
+        for section, section_depth in self.open_sections:
+            if (level is not None and section['level'] >= level) or (depth is not None and section_depth >= depth):
+                section['end'] = offset
+            else:
+                still_open.append((section, section_depth))
+        self.open_sections = still_open
+
+    def handle_meta_data(self, tag, attrs):
+        """Keeps the same values as `Page.get_meta_data`: each meta tag's
+        property and content, and the links of the first comp-next-nav div.
+        Newlines are translated as reading the file as text would.
+        """
+        attrs = {k: newlines(v) for k, v in attrs}
+        if tag == 'meta' and attrs.get('property', None):
+            self.meta_data[attrs['property']] = attrs.get('content', None)
+        elif tag == 'div' and self.nav is None and attrs.get('id', None) == 'comp-next-nav':
+            self.nav = attrs
+            self.meta_data['previous_page'] = attrs.get('data-prev-link', None)
+            self.meta_data['next_page'] = attrs.get('data-next-link', None)
+
+    def handle_starttag(self, tag, attrs):
+        if tag in ('meta', 'div'):
+            self.handle_meta_data(tag, attrs)
+        if tag in HEADING_LEVELS and self.heading is None:
+            level = HEADING_LEVELS[tag]
+            offset = self.byte_offset()
+            self.end_sections(offset, level=level)
+            for l in list(self.path):
+                if l >= level: self.path.pop(l)
+            self.heading = {
+                'id': dict(attrs).get('id', None),
+                'level': level,
+                'text': [],
+                'path': None,
+                'start': offset,
+                'end': None,
+            }
+            self.heading_depth = len(self.stack)
+            self.open_sections.append((self.heading, self.heading_depth))
+            self.sections.append(self.heading)
+        if tag not in VOID_TAGS:
+            self.stack.append(tag)
+
+    def handle_startendtag(self, tag, attrs):
+        self.handle_starttag(tag, attrs)
+        if tag not in VOID_TAGS:
+            self.handle_endtag(tag)
+
+    def handle_endtag(self, tag):
+        if tag not in self.stack: return
+        depth = len(self.stack) - 1 - self.stack[::-1].index(tag)
+        del self.stack[depth:]
+
+        if self.heading and len(self.stack) <= self.heading_depth:
+            self.end_heading()
+
+        # sections end with the element containing their heading
+        self.end_sections(self.byte_offset(), depth=len(self.stack) + 1)
+
+    def end_heading(self):
+        heading = self.heading
+        heading['text'] = ' '.join(''.join(heading['text']).split())
+        self.path[heading['level']] = heading['text']
+        heading['path'] = [self.path[l] for l in sorted(self.path)]
+        self.heading = None
+
+    def handle_data(self, data):
+        if self.heading:
+            self.heading['text'].append(data)
+
+def newlines(value):
+    if value is None or '\r' not in value: return value
+    return value.replace('\r\n', '\n').replace('\r', '\n')
+
+def index_page(data):
+    """Returns the meta data of a page's raw bytes and its sections packed
+    for saving, from a single parse. See SectionIndexer and `pack_sections`.
+    """
+    indexer = SectionIndexer(data)
+    sections = indexer.index()
+    return indexer.meta_data, pack_sections(sections)
+
+def index_sections(data):
+    """Returns the headings and section offsets of a page's raw bytes,
+    packed for saving. See SectionIndexer.
+    """
+    return pack_sections(SectionIndexer(data).index())
+
+def pack_sections(sections):
+    """Returns sections as [level, id, text, start, end] lists, which is
+    all that's saved with a page. Heading paths are rebuilt when unpacked.
+    """
+    return [[s['level'], s['id'], s['text'], s['start'], s['end']] for s in sections]
+
+def unpack_sections(packed):
+    """Returns packed sections as dicts with their heading `path`.
+    Sections saved as dicts are returned as they are.
+    """
+    sections = []
+    path = {}
+    for section in packed or []:
+        if isinstance(section, dict):
+            sections.append(section)
+            continue
+        level, id, text, start, end = section
+        for l in list(path):
+            if l >= level: path.pop(l)
+        path[level] = text
+        sections.append({
+            'id': id,
+            'level': level,
+            'text': text,
+            'path': [path[l] for l in sorted(path)],
+            'start': start,
+            'end': end,
+        })
+    return sections
@@ -0,0 +1,233 @@
+from .myencoder import MyEncoder
+from .watcher import LibraryWatcher
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, unquote, urlparse
+import hashlib
+import ipaddress
+import json
+import threading
+
+LOCAL_HOSTS = ['localhost']
+
+def make_etag(*parts):
+    """Returns a quoted ETag from the given values."""
+    digest = hashlib.blake2b(json.dumps(parts, default=str).encode('utf-8'), digest_size=12)
+    return '"' + digest.hexdigest() + '"'
+
+def is_local_host(host):
+    if host in LOCAL_HOSTS:
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+def etag_matches(etag, header):
+    """Returns True if an If-None-Match header lists the given ETag, or is
+    `*`. Tags are compared exactly, so a weak tag doesn't match.
+    """
+    tags = [tag.strip() for tag in (header or '').split(',')]
+    return '*' in tags or etag in tags
+
+def find_book(books, key):
+    """Returns the book with the given acronym, or else name."""
+    for attribute in ['acronym', 'name']:
+        for book in books:
+            if getattr(book, attribute) == key:
+                return book
+    return None
+
+class LibraryService:
+    """Read-only queries against a library, shared by all request threads.
+
+    Content and encounters are extracted once per page and kept in a
+    LibraryWatcher. Requests are served from a copy of the books and the
+    lookup tables built from them, which is replaced as a whole whenever
+    the watcher's generation changes, so requests never see the watcher
+    part way through applying a change.
+    """
+    def __init__(self, library, **kwargs):
+        self.library = library
+        self.watcher = kwargs.get('watcher', None) or LibraryWatcher(
+            library, checkpoint=False, logging=False,
+            types=kwargs.get('types', ['magic item','monster','spell']),
+        )
+        self.lock = threading.Lock()
+        self.generation = None
+        self.state = None
+
+    def refresh(self):
+        """Rebuilds the served copy if the library content has changed, and
+        returns it.
+        """
+        with self.lock:
+            if not self.watcher.content:
+                self.watcher.load_content()
+            if self.state is not None and self.generation == self.watcher.generation:
+                return self.state
+            with self.watcher.lock:
+                generation = self.watcher.generation
+                books = [book.clone() for book in self.library.view().books]
+                content = {c.id: c for c in self.watcher.get_content()}
+                encounters = self.watcher.get_encounters()
+            pages = [page for book in books if book.is_owned_content() for page in book.pages]
+            self.state = {
+                'generation': generation,
+                'books': books,
+                'pages': pages,
+                'content': content,
+                'encounters': encounters,
+                'page_modified': {page.path: page.modified for page in pages if page.path},
+            }
+            self.generation = generation
+            return self.state
+
+    def book_summary(self, book):
+        return {
+            'name': book.name,
+            'acronym': book.acronym,
+            'url': book.url,
+            'owned_content': book.owned_content,
+            'pages': book.size(),
+            'modified': book.last_modified() if book.pages else None,
+        }
+
+    def content_summary(self, content):
+        d = dict(content.__dict__)
+        d.pop('html', None)
+        return d
+
+    def content_etag(self, state, content):
+        paths = [s['page']['path'] for s in content.sources]
+        return make_etag(content.id, [(p, state['page_modified'].get(p)) for p in paths])
+
+    def library_etag(self, state):
+        return make_etag(state['generation'], sorted(state['page_modified'].items()))
+
+    def get(self, path, query):
+        """Returns (status, body, etag) for the given request path.
+        """
+        state = self.refresh()
+        parts = [unquote(p) for p in path.strip('/').split('/') if p]
+        q = {k: v[0] for k, v in query.items()}
+
+        if parts == ['books']:
+            return 200, [self.book_summary(b) for b in state['books']], self.library_etag(state)
+
+        if len(parts) in [2, 3] and parts[0] == 'books':
+            book = find_book(state['books'], parts[1])
+            if not book:
+                return 404, {'error': f'book "{parts[1]}" not found'}, None
+            etag = make_etag(book.path, book.last_modified() if book.pages else None)
+            if len(parts) == 2:
+                return 200, self.book_summary(book), etag
+            if parts[2] == 'pages':
+                return 200, [page.to_dict() for page in book.pages], etag
+
+        if parts == ['pages']:
+            for page in state['pages']:
+                if page.path == q.get('path', None):
+                    d = page.to_dict()
+                    d['html'] = page.get_html()
+                    return 200, d, make_etag(page.path, page.modified)
+            return 404, {'error': 'page not found'}, None
+
+        if parts == ['content']:
+            content = [c for c in state['content'].values()
+                if (not q.get('type') or c.type == q['type'])
+                and (not q.get('name') or q['name'].lower() in (c.name or '').lower())]
+            return 200, [self.content_summary(c) for c in content], self.library_etag(state)
+
+        if len(parts) == 2 and parts[0] == 'content':
+            content = state['content'].get(parts[1], None)
+            if not content:
+                return 404, {'error': f'content "{parts[1]}" not found'}, None
+            return 200, content.__dict__, self.content_etag(state, content)
+
+        if parts == ['encounters']:
+            encounters = [e for e in state['encounters']
+                if (not q.get('book') or e['book'] == q['book'])
+                and (not q.get('monster') or q['monster'] in [m for (n, m) in e['monsters']])]
+            return 200, encounters, self.library_etag(state)
+
+        if parts == ['search']:
+            text = q.get('q', '').lower()
+            if not text:
+                return 400, {'error': 'missing query parameter "q"'}, None
+            return 200, {
+                'content': [self.content_summary(c) for c in state['content'].values()
+                    if text in (c.name or '').lower()],
+                'pages': [{'name': p.name, 'url': p.url, 'path': p.path}
+                    for p in state['pages'] if text in (p.name or '').lower()],
+            }, self.library_etag(state)
+
+        return 404, {'error': f'unknown path "{path}"'}, None
+
+def make_handler(service):
+    class LibraryRequestHandler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            url = urlparse(self.path)
+            try:
+                status, body, etag = service.get(url.path, parse_qs(url.query))
+            except Exception as e:
+                status, body, etag = 500, {'error': str(e)}, None
+
+            if etag and etag_matches(etag, self.headers.get('If-None-Match', None)):
+                self.send_response(304)
+                self.send_header('ETag', etag)
+                self.end_headers()
+                return
+
+            data = json.dumps(body, cls=MyEncoder).encode('utf-8')
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json; charset=utf-8')
+            self.send_header('Content-Length', str(len(data)))
+            if etag:
+                self.send_header('ETag', etag)
+                self.send_header('Cache-Control', 'no-cache')
+            self.end_headers()
+            self.wfile.write(data)
+
+        def log_message(self, format, *args):
+            if service.logging:
+                super().log_message(format, *args)
+
+    return LibraryRequestHandler
+
+def serve(library, **kwargs):
+    """Serves read-only JSON queries for the given library on localhost.
+
+    Set `block=False` to run the server in a background thread, in which
+    case the server is returned and can be stopped with `shutdown()`. Set
+    `watch=True` to keep the served content current as files change.
+    """
+    host = kwargs.get('host', '127.0.0.1')
+    port = kwargs.get('port', 8000)
+    logging = kwargs.get('logging', True)
+
+    if not is_local_host(host):
+        raise ValueError(f'Refusing to serve on non-local host "{host}".')
+
+    service = LibraryService(library, **kwargs)
+    service.logging = logging
+    service.refresh()
+
+    server = ThreadingHTTPServer((host, port), make_handler(service))
+    server.daemon_threads = True
+    server.service = service
+    if kwargs.get('watch', False):
+        service.watcher.start(load_content=False)
+
+    if logging: print(f'Serving "{library.name}" on http://{host}:{server.server_address[1]}/.')
+    if not kwargs.get('block', True):
+        threading.Thread(target=server.serve_forever, daemon=True).start()
+        return server
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.watcher.stop()
+    return server
@@ -0,0 +1,209 @@
+from .book import Book
+from .myencoder import MyEncoder
+from .page import Page
+import json
+import mmap
+import os
+import struct
+
+MAGIC = b'DDBSHRD2'
+HEADER = struct.Struct('=QQQQQQ')
+BOOK_ENTRY = struct.Struct('=QQQQQ')
+PAGE_ENTRY = struct.Struct('=QQ')
+
+# shared libraries attached in this process, by path
+ATTACHED = {}
+
+def attach(path):
+    """Returns the SharedLibrary at the given path, attaching to it once per
+    process.
+    """
+    path = os.path.abspath(path)
+    shared = ATTACHED.get(path, None)
+    if shared is None or shared.data is None:
+        shared = ATTACHED[path] = SharedLibrary(path)
+    return shared
+
+def encode(d):
+    return json.dumps(d, cls=MyEncoder, separators=(',', ':')).encode('utf-8')
+
+def write_shared(library, path):
+    """Writes the library's metadata, including each page's section index,
+    to `path` in the layout read by SharedLibrary.
+
+    The file holds a header, a table of books and a table of pages giving
+    where each record is, and the records themselves as json. Each book's
+    entry also holds its `Book.fingerprint`.
+    """
+    books, pages, blobs = [], [], []
+    offset = len(MAGIC) + HEADER.size
+    for book in library.books:
+        header = book.to_dict()
+        header['pages'] = []
+        first_page = len(pages)
+        for page in book.pages:
+            blobs.append(encode(page.to_dict()))
+            pages.append(len(blobs) - 1)
+        blobs.append(encode(header))
+        books.append((len(blobs) - 1, first_page, len(book.pages), book.fingerprint()))
+    blobs.append(encode({
+        'name': library.name,
+        'path': library.path,
+        'hash_files': library.hash_files,
+        'sources': json.loads(library.sources.to_json()) if library.sources else None,
+    }))
+
+    book_table = offset
+    page_table = book_table + BOOK_ENTRY.size * len(books)
+    position = page_table + PAGE_ENTRY.size * len(pages)
+    positions = []
+    for blob in blobs:
+        positions.append(position)
+        position += len(blob)
+
+    tmp_path = path + '.tmp'
+    with open(tmp_path, 'wb') as fout:
+        fout.write(MAGIC)
+        fout.write(HEADER.pack(len(books), len(pages), book_table, page_table, positions[-1], len(blobs[-1])))
+        for blob_index, first_page, page_count, fingerprint in books:
+            fout.write(BOOK_ENTRY.pack(positions[blob_index], len(blobs[blob_index]), first_page, page_count, fingerprint))
+        for blob_index in pages:
+            fout.write(PAGE_ENTRY.pack(positions[blob_index], len(blobs[blob_index])))
+        for blob in blobs:
+            fout.write(blob)
+    os.replace(tmp_path, path)
+
+    # processes attached to the old file keep it until they reattach
+    ATTACHED.pop(os.path.abspath(path), None)
+    return path
+
+class SharedLibrary:
+    """A library's metadata laid out in a read-only file that processes
+    map into memory rather than loading.
+
+    Any number of processes can attach to the same file and share the one
+    copy held by the OS. Books and pages are only decoded when they're
+    asked for, so attaching takes about as long as opening the file. A
+    SharedLibrary pickles as its path, and is attached to again, at most
+    once per process, when it's unpickled.
+    """
+    def __init__(self, path):
+        self.path = os.path.abspath(path)
+        self.data = None
+        with open(self.path, 'rb') as fin:
+            self.data = mmap.mmap(fin.fileno(), 0, access=mmap.ACCESS_READ)
+        if self.data[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f'"{path}" is not a shared library file.')
+
+        self.book_count, self.page_count, book_table, page_table, meta_offset, meta_size = HEADER.unpack_from(self.data, len(MAGIC))
+        self.book_table = memoryview(self.data)[book_table:page_table].cast('Q')
+        self.page_table = memoryview(self.data)[page_table:page_table + PAGE_ENTRY.size * self.page_count].cast('Q')
+        self.meta = json.loads(self.data[meta_offset:meta_offset + meta_size])
+        self.book_paths = None
+
+    def __repr__(self):
+        return f'SharedLibrary(path={self.path!r}, books={self.book_count}, pages={self.page_count})'
+
+    def __reduce__(self):
+        return (attach, (self.path,))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        self.close()
+
+    def close(self):
+        if self.data is None: return
+        for view in [getattr(self, 'book_table', None), getattr(self, 'page_table', None)]:
+            if view is not None: view.release()
+        self.book_table = self.page_table = None
+        self.data.close()
+        self.data = None
+
+    def record(self, offset, size):
+        return json.loads(self.data[offset:offset + size])
+
+    def book_entry(self, index):
+        i = index * 5
+        return tuple(self.book_table[i:i + 5])
+
+    def book_fingerprint(self, index):
+        """Returns the `Book.fingerprint` of book `index` when the file was
+        written.
+        """
+        return self.book_entry(index)[4]
+
+    def book_header(self, index):
+        """Returns book `index` without its pages.
+        """
+        offset, size, first_page, page_count, fingerprint = self.book_entry(index)
+        return Book(self.record(offset, size))
+
+    def book(self, *args, **kwargs):
+        """Returns the book with the given name, `acronym` or `path`, with
+        its pages, or None.
+        """
+        index = self.book_index(*args, **kwargs)
+        return None if index is None else self.get_book(index)
+
+    def book_index(self, *args, **kwargs):
+        """Returns the index of the book with the given name, `acronym` or
+        `path`.
+        """
+        path = kwargs.get('path', None)
+        if path is not None and not args and 'acronym' not in kwargs:
+            if self.book_paths is None:
+                self.book_paths = {self.book_header(i).path: i for i in range(self.book_count)}
+            return self.book_paths.get(path, None)
+
+        name = args[0] if args else kwargs.get('name', None)
+        acronym = kwargs.get('acronym', None)
+        for i in range(self.book_count):
+            book = self.book_header(i)
+            if (name and book.name == name) or (acronym and book.acronym == acronym) or (path and book.path == path):
+                return i
+        return None
+
+    def book_page_count(self, index):
+        return self.book_entry(index)[3]
+
+    def books(self):
+        """Yields each book, with its pages.
+        """
+        for i in range(self.book_count):
+            yield self.get_book(i)
+
+    def get_book(self, index):
+        """Returns book `index` with its pages.
+        """
+        offset, size, first_page, page_count, fingerprint = self.book_entry(index)
+        d = self.record(offset, size)
+        d['pages'] = [self.page_record(first_page + i) for i in range(page_count)]
+        return Book(d)
+
+    def get_page(self, book_index, page_index):
+        """Returns page `page_index` of book `book_index`.
+        """
+        offset, size, first_page, page_count, fingerprint = self.book_entry(book_index)
+        if not 0 <= page_index < page_count:
+            raise IndexError('page index out of range')
+        d = self.record(offset, size)
+        return Page(**self.page_record(first_page + page_index), root_path=d['path'])
+
+    def library(self):
+        """Returns a full copy of the library.
+        """
+        from .library import Library
+        return Library(dict(self.meta, books=[self.get_book(i).to_dict() for i in range(self.book_count)]))
+
+    def page_record(self, index):
+        i = index * 2
+        offset, size = self.page_table[i:i + 2]
+        return self.record(offset, size)
+
+    def size(self):
+        """Returns the number of books.
+        """
+        return self.book_count
@@ -1,9 +1,50 @@
 from .myencoder import MyEncoder
-from bs4 import BeautifulSoup
+from bs4 import BeautifulSoup, SoupStrainer
+from .fs_snapshot import LIVE_FILE_SYSTEM
+from .hashing import file_hash
 from .html_processor import process_html
+from collections import OrderedDict
 import json
 import os
 import re
+import threading
+
+RE_URL = re.compile(
+    r'(?P<url>'
+        r'(?P<root_url>https://[^#]+\.com)?'
+        r'(?P<url_path>[^#]+)'
+    r')'
+    r'(?P<tag>#.+)?'
+    , re.IGNORECASE)
+
+RE_SOURCE_CARD = re.compile(r'SourceCard_nameGroup_.*')
+
+# matches the listing class among any others while the file is parsed,
+# when class attributes are still whole strings
+RE_LISTING_ITEM = re.compile(r'(^|\s)sources-listing--item(\s|$)')
+
+# books parsed from the most recently loaded sources files, keyed by path
+BOOKS_CACHE = OrderedDict()
+BOOKS_CACHE_SIZE = 16
+BOOKS_CACHE_LOCK = threading.Lock()
+
+def get_cached_books(path):
+    with BOOKS_CACHE_LOCK:
+        cached = BOOKS_CACHE.get(path, None)
+        if cached is not None:
+            BOOKS_CACHE.move_to_end(path)
+        return cached
+
+def cache_books(path, cached):
+    """Caches the books parsed from a sources file, dropping the least
+    recently used files beyond BOOKS_CACHE_SIZE.
+    """
+    with BOOKS_CACHE_LOCK:
+        BOOKS_CACHE[path] = cached
+        BOOKS_CACHE.move_to_end(path)
+        while len(BOOKS_CACHE) > BOOKS_CACHE_SIZE:
+            BOOKS_CACHE.popitem(last=False)
+    return cached
 
 def create_book_acronym(name):
     """Returns and acronym from the given book title.
@@ -23,6 +64,7 @@ class Sources:
         self.path = d.get('path', './sources.html')
         self.url = d.get('url', 'https://www.dndbeyond.com/sources')
         self.modified = d.get('modified', None)
+        self.hash = d.get('hash', None)
         if not self.modified: self.update()
 
     def __repr__(self):
@@ -54,11 +96,12 @@ class Sources:
 
         return self
 
-    def file_exists( self ):
+    def file_exists( self, **kwargs ):
         """Returns True if the file associated with this page exists.
         """
+        fs = kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM
         if self.path:
-            return os.path.isfile(self.path)
+            return fs.isfile(self.path)
         else:
             return False
     
@@ -66,44 +109,95 @@ class Sources:
         if not self.file_exists():
             raise FileNotFoundError("File does not exist.")
         
-        with open(self.path, 'r') as fin:
-            html_text = fin.read()
-
+        html_text = LIVE_FILE_SYSTEM.read_text(self.path)
         return process_html(html_text, **kwargs)
     
-    def load_books(self):
+    def load_books(self, **kwargs):
         """loads books from a local sources.html file downloaded from DDB.
-        """
-        RE_URL = re.compile(
-            r'(?P<url>'
-                r'(?P<root_url>https://[^#]+\.com)?'
-                r'(?P<url_path>[^#]+)'
-            r')'
-            r'(?P<tag>#.+)?'
-            , re.IGNORECASE)
 
+        Results are cached by file path for the last BOOKS_CACHE_SIZE 
+        files, and reused while the file's modification time or contents 
+        are unchanged.
+        """
         if not self.file_exists(): return
-        soup = BeautifulSoup(self.get_html(), 'html.parser')
-        
+
+        modified = LIVE_FILE_SYSTEM.getmtime(self.path)
+        cached = get_cached_books(self.path)
+        if cached and kwargs.get('cache', True):
+            if cached['modified'] == modified:
+                return [dict(book) for book in cached['books']]
+            digest = file_hash(self.path, digests=kwargs.get('digests', None))
+            if cached['hash'] == digest:
+                cached['modified'] = modified
+                return [dict(book) for book in cached['books']]
+        else:
+            digest = file_hash(self.path, digests=kwargs.get('digests', None))
+
+        html_text = LIVE_FILE_SYSTEM.read_text(self.path)
+        books = self.parse_books(html_text)
+
+        cache_books(self.path, {
+            'modified': modified,
+            'hash': digest,
+            'books': [dict(book) for book in books],
+        })
+        return books
+
+    def parse_books(self, html_text):
+        """Returns the books listed in the given sources html. Only the 
+        source card and listing elements are parsed.
+        """
         books = []
 
         # new library format
-        div = soup.find('div', {'id': 'S:0'})
-        if div:
-            for c in div.find_all('div', {'class': re.compile(r'SourceCard_nameGroup_.*')}):
-                a = c.a
-                p = c.p
+        if 'S:0' in html_text:
+            soup = BeautifulSoup(html_text, 'html.parser', parse_only=SoupStrainer('div', id='S:0'))
+            div = soup.find('div', {'id': 'S:0'})
+            if div:
+                for c in div.find_all('div', {'class': RE_SOURCE_CARD}):
+                    a = c.a
+                    p = c.p
+
+                    # get book url and convert to a local path
+                    if not a['href']: continue
+                    url = 'https://www.dndbeyond.com' + a['href']
+                    path = self.local_path(url)
+
+                    # determine if the book is owned
+                    status = p.get_text('', strip=True)
+                    owned_content = status in ['Purchased','Free','Shared with me']
 
+                    # get the book name
+                    name = a.get_text('', strip=True)
+                    acronym = create_book_acronym(name)
+
+                    # construct the book
+                    books.append(dict(
+                        name=name, 
+                        acronym=acronym, 
+                        url=url, 
+                        path=path, 
+                        owned_content=owned_content
+                    ))
+        
+        # old library format
+        if 'sources-listing--item' in html_text:
+            soup = BeautifulSoup(html_text, 'html.parser', 
+                parse_only=SoupStrainer('a', class_=RE_LISTING_ITEM))
+            for a in soup.find_all('a', class_=RE_LISTING_ITEM):
                 # get book url and convert to a local path
                 if not a['href']: continue
-                url = 'https://www.dndbeyond.com' + a['href']
-                url_path = f'{os.path.dirname(self.path)}' + RE_URL.match(url).group('url_path')
-                path = re.sub(r'compendium\/(rules|adventures)|sources\/dnd', 'sources', str(url_path))
-
-                # determine if the book is owned
-                status = p.get_text('', strip=True)
-                owned_content = status in ['Purchased','Free','Shared with me']
+                url = 'https://www.dndbeyond.com/' + a['href']
+                path = self.local_path(url)
 
+                # determine if the book is owned and then remove that data
+                # to make extracting the book name easier
+                matches = a.findAll('span', class_='owned-content')
+                owned_content = True if matches else False
+                if matches:
+                    for match in a.findAll('span', class_='owned-content'):
+                        match.decompose()
+                
                 # get the book name
                 name = a.get_text('', strip=True)
                 acronym = create_book_acronym(name)
@@ -117,56 +211,54 @@ class Sources:
                     owned_content=owned_content
                 ))
         
-        # old library format
-        for a in soup.find_all('a', class_='sources-listing--item'):
-            # get book url and convert to a local path
-            if not a['href']: continue
-            url = 'https://www.dndbeyond.com/' + a['href']
-            url_path = f'{os.path.dirname(self.path)}' + RE_URL.match(url).group('url_path')
-            path = re.sub(r'compendium\/(rules|adventures)|sources\/dnd', 'sources', str(url_path))
-
-            # determine if the book is owned and then remove that data
-            # to make extracting the book name easier
-            matches = a.findAll('span', class_='owned-content')
-            owned_content = True if matches else False
-            if matches:
-                for match in a.findAll('span', class_='owned-content'):
-                    match.decompose()
-            
-            # get the book name
-            name = a.get_text('', strip=True)
-            acronym = create_book_acronym(name)
-
-            # construct the book
-            books.append(dict(
-                name=name, 
-                acronym=acronym, 
-                url=url, 
-                path=path, 
-                owned_content=owned_content
-            ))
-        
         return books
 
+    def local_path(self, url):
+        """Converts a book url into the path of its local folder.
+        """
+        url_path = f'{os.path.dirname(self.path)}' + RE_URL.match(url).group('url_path')
+        return re.sub(r'compendium\/(rules|adventures)|sources\/dnd', 'sources', str(url_path))
+
+    def refresh_modified(self, **kwargs):
+        """Records the file's new modification time if only that changed,
+        and its contents still match the stored hash. Returns True if it
+        was refreshed.
+        """
+        if not self.hash or not self.modified or not self.file_exists(**kwargs): return False
+        modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if self.modified < modified and \
+                self.hash == file_hash(self.path, digests=kwargs.get('digests', None)):
+            self.modified = modified
+            return True
+        return False
+
     def to_json(self, **kwargs):
         return json.dumps(self.__dict__, cls=MyEncoder, **kwargs)
     
-    def update( self ):
+    def update( self, **kwargs ):
         if not self.file_exists():
             raise FileNotFoundError("File does not exist.")
         
-        self.modified = os.path.getmtime(self.path)
+        self.modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if kwargs.get('hash', False) or self.hash:
+            self.hash = file_hash(self.path, digests=kwargs.get('digests', None))
         return self
         
-    def update_available( self ):
+    def update_available( self, **kwargs ):
         """Returns True if the file for this page has been modified 
         since this was created or last updated.
+
+        With hash=True, a file whose modification time changed but whose
+        contents still match the stored hash isn't reported as updated.
+        Nothing is changed; see `refresh_modified`.
         """
-        if not self.file_exists(): return False
+        if not self.file_exists(**kwargs): return False
         if not self.modified: return True
-        if self.modified < os.path.getmtime(self.path):
-            return True
+        modified = (kwargs.get('snapshot', None) or LIVE_FILE_SYSTEM).getmtime(self.path)
+        if self.modified < modified:
+            if not (kwargs.get('hash', False) and self.hash): return True
+            return self.hash != file_hash(self.path, digests=kwargs.get('digests', None))
         return False
     
-    def validate(self):
-        return self.file_exists()
\ No newline at end of file
+    def validate(self, **kwargs):
+        return self.file_exists(**kwargs)
\ No newline at end of file
@@ -0,0 +1,302 @@
+from .myencoder import MyEncoder
+import html
+import json
+import numpy as np
+import os
+import re
+
+VERSION = 1
+
+RE_TAG = re.compile(r'<[^>]+>')
+
+SIZES = 'Tiny|Small|Medium|Large|Huge|Gargantuan'
+RE_MONSTER_META = re.compile(r'^(?P<size>' + SIZES + r')(?: or (?:' + SIZES + r'))?\s+(?P<type>[A-Za-z ]+?)\s*(?:\([^)]*\))?\s*,\s*(?P<alignment>[A-Za-z ]+)$', re.IGNORECASE)
+RE_CHALLENGE = re.compile(r'^(?:Challenge|CR)\s*(?P<cr>\d+(?:/\d+)?)\s*\((?:XP\s*)?(?P<xp>[\d,]+)', re.IGNORECASE)
+RE_ARMOR_CLASS = re.compile(r'^(?:Armor Class|AC)\s*(?P<ac>\d+)', re.IGNORECASE)
+RE_HIT_POINTS = re.compile(r'^(?:Hit Points|HP)\s*(?P<hp>\d+)', re.IGNORECASE)
+RE_SPELL_LEVEL = re.compile(r'^(?:(?P<level>\d+)(?:st|nd|rd|th)[- ]level (?P<school>[a-z]+)|Level (?P<level2>\d+) (?P<school2>[a-z]+))', re.IGNORECASE)
+RE_CANTRIP = re.compile(r'^(?P<school>[a-z]+) cantrip', re.IGNORECASE)
+RE_ITEM = re.compile(r'^(?P<category>[A-Za-z ]+?)\s*(?:\([^)]*\))?\s*,\s*(?P<rarity>common|uncommon|rare|very rare|legendary|artifact|varies|rarity varies|unknown rarity)\b(?P<rest>.*)$', re.IGNORECASE)
+
+# options of the query methods that aren't filters, including the
+# extraction options accepted by get_content
+INDEX_OPTIONS = [
+    'stat_index', 'stats_file', 'save', 'logging', 'snapshot', 'html_cache',
+    'html_options', 'names', 'acronyms', 'skip_books', 'workers', 'shared',
+    'prefetch', 'reference_graph',
+]
+
+# typed fields of each type of content, by how they're filtered
+NUMERIC_FIELDS = {
+    'monster': ['cr', 'xp', 'ac', 'hp'],
+    'spell': ['level'],
+    'magic item': [],
+}
+CATEGORY_FIELDS = {
+    'monster': ['size', 'creature_type', 'alignment'],
+    'spell': ['school', 'ritual'],
+    'magic item': ['category', 'rarity', 'attunement'],
+}
+
+def text_lines(html_text):
+    """Returns the non-empty lines of text in a piece of content's html.
+    """
+    text = html.unescape(RE_TAG.sub('', html_text or '')).replace('\xa0', ' ')
+    return [' '.join(line.split()) for line in text.splitlines() if line.strip()]
+
+def challenge_rating(value):
+    if '/' in value:
+        numerator, denominator = value.split('/')
+        return int(numerator) / int(denominator)
+    return float(value)
+
+def monster_attributes(lines):
+    attributes = {}
+    for line in lines:
+        if 'size' not in attributes:
+            m = RE_MONSTER_META.match(line)
+            if m:
+                attributes['size'] = m['size'].lower()
+                attributes['creature_type'] = m['type'].strip().lower()
+                attributes['alignment'] = m['alignment'].strip().lower()
+                continue
+        m = RE_CHALLENGE.match(line)
+        if m and 'cr' not in attributes:
+            attributes['cr'] = challenge_rating(m['cr'])
+            attributes['xp'] = int(m['xp'].replace(',', ''))
+            continue
+        m = RE_ARMOR_CLASS.match(line)
+        if m and 'ac' not in attributes:
+            attributes['ac'] = int(m['ac'])
+            continue
+        m = RE_HIT_POINTS.match(line)
+        if m and 'hp' not in attributes:
+            attributes['hp'] = int(m['hp'])
+    return attributes
+
+def spell_attributes(lines):
+    for line in lines:
+        m = RE_SPELL_LEVEL.match(line)
+        if m:
+            return {
+                'level': int(m['level'] or m['level2']),
+                'school': (m['school'] or m['school2']).lower(),
+                'ritual': 'ritual' in line.lower(),
+            }
+        m = RE_CANTRIP.match(line)
+        if m:
+            return {'level': 0, 'school': m['school'].lower(), 'ritual': False}
+    return {}
+
+def item_attributes(lines):
+    for line in lines:
+        m = RE_ITEM.match(line)
+        if m:
+            return {
+                'category': m['category'].strip().lower(),
+                'rarity': m['rarity'].lower(),
+                'attunement': 'requires attunement' in m['rest'].lower(),
+            }
+    return {}
+
+def content_attributes(content):
+    """Returns the typed fields parsed from the header and stat block lines
+    of a ContentReference: size, creature_type, alignment, cr, xp, ac and
+    hp for monsters, level, school and ritual for spells, and category,
+    rarity and attunement for magic items. Fields that aren't found are
+    left out.
+    """
+    lines = text_lines(content.html)[1:]
+    if content.type == 'monster':
+        attributes = monster_attributes(lines)
+    elif content.type == 'spell':
+        attributes = spell_attributes(lines)
+    elif content.type == 'magic item':
+        attributes = item_attributes(lines)
+    else:
+        attributes = {}
+    return dict({'id': content.id, 'type': content.type, 'name': content.name, 'path': content.path}, **attributes)
+
+class StatTable:
+    """The index rows of one type of content as sorted numpy columns.
+
+    Each numeric field is stored as its values in sorted order along with
+    the rows they belong to, so a range filter is two binary searches.
+    Category fields are stored as integer codes into a list of values.
+    """
+    def __init__(self, content_type, rows):
+        self.rows = rows
+        self.numeric = {}
+        self.categories = {}
+        for field in NUMERIC_FIELDS.get(content_type, []):
+            values = np.array([row.get(field, np.nan) for row in rows], dtype=np.float64)
+            order = np.argsort(values, kind='stable').astype(np.int32)
+            self.numeric[field] = (values[order], order)
+        for field in CATEGORY_FIELDS.get(content_type, []):
+            categories = {}
+            codes = np.fromiter((categories.setdefault(row.get(field, None), len(categories)) for row in rows),
+                dtype=np.int32, count=len(rows))
+            self.categories[field] = (list(categories), codes)
+
+    def __repr__(self):
+        return f'StatTable(rows={len(self.rows)})'
+
+    def mask(self, **filters):
+        """Returns a boolean mask of the rows matching every filter. See
+        `StatIndex.query`.
+        """
+        mask = np.ones(len(self.rows), dtype=bool)
+        for key, value in filters.items():
+            if value is None: continue
+            field, bound = key, None
+            if key.endswith('_min') or key.endswith('_max'):
+                field, bound = key[:-4], key[-3:]
+
+            if field in self.numeric:
+                values, order = self.numeric[field]
+                low = value if bound in [None, 'min'] else -np.inf
+                high = value if bound in [None, 'max'] else np.inf
+                start = np.searchsorted(values, low, side='left')
+                end = np.searchsorted(values, high, side='right')
+                selected = np.zeros(len(self.rows), dtype=bool)
+                selected[order[start:end]] = True
+                mask &= selected
+            elif field in self.categories and bound is None:
+                categories, codes = self.categories[field]
+                wanted = value if type(value) in [list, tuple, set] else [value]
+                wanted = [w.lower() if type(w) is str else w for w in wanted]
+                matches = [i for i, c in enumerate(categories) if c in wanted]
+                mask &= np.isin(codes, matches)
+            else:
+                raise ValueError(f'Unknown filter "{key}".')
+        return mask
+
+    def select(self, **filters):
+        return [self.rows[i] for i in np.flatnonzero(self.mask(**filters))]
+
+class StatIndex:
+    """Typed stat block and header fields of a library's monsters, spells
+    and magic items, parsed once when content is extracted so they can be
+    filtered without reading any html.
+
+    Rows are kept by page along with the page's modification time, so the
+    index can be refreshed one page at a time. Filtering uses a StatTable
+    per type, rebuilt from the rows when the index changes. Like content,
+    rows are merged by id with later pages taking precedence.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.version = d.get('version', VERSION)
+        self.pages = d.get('pages', {})
+        self.tables = {}
+
+    @classmethod
+    def from_json_file(cls, json_path):
+        with open(json_path, 'r') as fin:
+            json_dict = json.load(fin)
+        return cls(json_dict)
+
+    def __repr__(self):
+        return f'StatIndex(pages={len(self.pages)}, rows={self.size()})'
+
+    def query(self, content_type, **filters):
+        """Returns the rows of the given type matching every filter. Numeric
+        fields can be filtered by range with `<field>_min` and `<field>_max`
+        or by value with `<field>`, e.g. `cr_min=5, cr_max=10`. Category
+        fields are matched ignoring case against a value or a list of
+        values, e.g. `size=['large', 'huge']`.
+        """
+        if content_type not in self.tables:
+            rows = {}
+            for page in self.pages.values():
+                for row in page['items']:
+                    if row['type'] == content_type:
+                        rows[row['id']] = row
+            self.tables[content_type] = StatTable(content_type, list(rows.values()))
+        return self.tables[content_type].select(**filters)
+
+    def refresh(self, library, **kwargs):
+        """Brings the index up to date with the library's owned pages,
+        extracting content only from pages added or modified since they
+        were indexed. Returns the number of pages indexed again.
+
+        When books are selected with `names`, `acronyms` or `skip_books`,
+        only the pages of the selected books are refreshed, and the rows
+        of every other book are kept as they are.
+        """
+        options = {k: v for k, v in kwargs.items() if k not in ['stat_index', 'reference_graph', 'workers']}
+        books = library.get_extraction_books(**dict(options, logging=False))
+        refreshed = {}
+        changed = 0
+        for book in books:
+            for page in book.pages:
+                indexed = self.pages.get(page.path, None)
+                if indexed is not None and indexed['modified'] == page.modified:
+                    refreshed[page.path] = indexed
+                    continue
+                content = book.get_page_content(page, **dict(options, types=list(NUMERIC_FIELDS)))
+                refreshed[page.path] = {'modified': page.modified, 'items': [content_attributes(c) for c in content]}
+                changed += 1
+
+        if any(kwargs.get(k, None) for k in ['names', 'acronyms', 'skip_books']):
+            # keep the other books' pages, and their order, replacing the
+            # selected books' pages with the refreshed ones
+            folders = [os.path.join(book.path, '') for book in books if book.path]
+            pages = {}
+            for path, indexed in self.pages.items():
+                if path in refreshed:
+                    pages[path] = refreshed[path]
+                elif not any(path.startswith(folder) for folder in folders):
+                    pages[path] = indexed
+            for path, indexed in refreshed.items():
+                pages.setdefault(path, indexed)
+        else:
+            pages = refreshed
+        changed += len(set(self.pages) - set(pages))
+
+        if changed or list(pages) != list(self.pages):
+            self.pages = pages
+            self.tables = {}
+        return changed
+
+    def remove_pages(self, paths):
+        """Removes the rows held for the given pages.
+        """
+        for path in paths:
+            self.pages.pop(path, None)
+        self.tables = {}
+        return self
+
+    def save_json(self, path, **kwargs):
+        logging = kwargs.get('logging', True)
+        if logging: print(f'Saving stat index to {path}.')
+        with open(path, 'w') as fout:
+            fout.write(self.to_json(indent=kwargs.get('indent', None)))
+
+    def size(self):
+        """Returns the number of rows held, before merging by id.
+        """
+        return sum(len(page['items']) for page in self.pages.values())
+
+    def to_json(self, **kwargs):
+        return json.dumps({'version': self.version, 'pages': self.pages}, cls=MyEncoder, **kwargs)
+
+    def update_pages(self, paths, **kwargs):
+        """Replaces the rows held for the given pages with those parsed from
+        the given `content`, as returned by `get_content`. `modified` maps
+        each page to its modification time. Nothing is replaced unless the
+        content was extracted with all of the indexed `types`.
+        """
+        if not set(NUMERIC_FIELDS) <= set(kwargs.get('types', NUMERIC_FIELDS)):
+            return self
+        modified = kwargs.get('modified', {})
+        items = {path: [] for path in paths}
+        for content in kwargs.get('content', None) or []:
+            if content.type not in NUMERIC_FIELDS: continue
+            path = content.path
+            if path in items:
+                items[path].append(content_attributes(content))
+        for path, rows in items.items():
+            self.pages[path] = {'modified': modified.get(path, None), 'items': rows}
+        self.tables = {}
+        return self
@@ -0,0 +1,241 @@
+from .fs_snapshot import FileSystemSnapshot
+from .library import merge_content
+from .reference_graph import ReferenceGraph
+import copy
+import os
+import threading
+import time
+
+class LibraryWatcher:
+    """Keeps a library and its extracted content current while the files
+    in its sources folder and sources file change.
+
+    Files are polled for changes. Once no new changes have been seen for
+    `debounce` seconds, the affected pages are updated, their content and
+    encounters are extracted again, and the library is saved to disk.
+    """
+    def __init__(self, library, **kwargs):
+        self.library = library
+        self.interval = kwargs.get('interval', 2.0)
+        self.debounce = kwargs.get('debounce', 1.0)
+        self.json_file = kwargs.get('json_file', 'library.json')
+        self.checkpoint = kwargs.get('checkpoint', True)
+        self.logging = kwargs.get('logging', True)
+        self.extract_options = {
+            'types': kwargs.get('types', ['magic item','monster','spell']),
+            'html_options': kwargs.get('html_options', {}),
+            'html_cache': kwargs.get('html_cache', None),
+            'logging': False,
+        }
+
+        self.snapshot = None
+        self.files = self.scan()
+        self.pending = set()
+        self.last_change = None
+        self.content = {}
+        self.encounters = {}
+        self.references = kwargs.get('reference_graph', None) or ReferenceGraph()
+        self.stat_index = kwargs.get('stat_index', None)
+        self.generation = 0
+        self.lock = threading.RLock()
+        self.stop_event = threading.Event()
+
+    def __repr__(self):
+        return f'LibraryWatcher(path={self.library.path!r}, files={len(self.files)})'
+
+    def apply(self, paths):
+        """Updates the library for the given changed files and refreshes
+        the content extracted from the affected pages.
+        """
+        library = self.library
+        options = {'hash': library.hash_files, 'digests': {}}
+        if library.sources.path in paths:
+            if self.logging: print('Updating sources.')
+            changes = library.reload_sources(load_folders=True, logging=False, digests=options['digests'])
+            for book in changes['removed'] + changes['unowned']:
+                self.remove_pages(book.page_paths())
+            for book in changes['owned']:
+                for page in book.pages:
+                    self.extract_page(book, page)
+
+        book_paths = {}
+        for path in paths:
+            book = self.find_book(path)
+            if book and book.is_owned_content():
+                book_paths.setdefault(book.path, (book, []))[1].append(path)
+
+        for book, changed in book_paths.values():
+            if self.logging: print(f'Updating {len(changed)} file(s) in "{book.name}".')
+            removed = [path for path in changed if path not in self.files]
+            added = [path for path in changed if path in self.files and not self.find_page(book, path)]
+            modified = [path for path in changed if path in self.files and path not in added]
+
+            if removed:
+                book.pages = [page for page in book.pages if page.path not in removed]
+                if book.table_of_contents and book.table_of_contents.path in removed:
+                    book.table_of_contents = None
+
+            for path in modified:
+                page = self.find_page(book, path)
+                if page is book.table_of_contents:
+                    added.append(path)
+                elif page.update_available(**options):
+                    page.update(**options)
+                elif library.hash_files:
+                    page.refresh_modified(**options)
+
+            if added:
+                book.load_files(added, **options)
+
+            self.remove_pages(removed)
+            for page in book.pages:
+                if page.path in changed:
+                    self.extract_page(book, page)
+
+        self.generation += 1
+        if self.checkpoint:
+            library.save_json(file=self.json_file, logging=self.logging)
+
+        return self
+
+    def extract_page(self, book, page):
+        """Extracts and caches the content and encounters of a single page.
+        """
+        if not page.validate():
+            return
+        self.content[page.path] = book.get_page_content(page, **self.extract_options)
+        self.encounters[page.path] = book.get_page_encounters(page, **self.extract_options)
+        self.references.update_pages([page.path], 
+            content=self.content[page.path], encounters=self.encounters[page.path])
+        if self.stat_index is not None:
+            self.stat_index.update_pages([page.path], content=self.content[page.path],
+                types=self.extract_options['types'], modified={page.path: page.modified})
+
+    def find_book(self, path):
+        """Returns the book whose folder contains the given file.
+        """
+        matches = [book for book in self.library.books
+            if book.path and path.startswith(book.path + os.sep)]
+        return max(matches, key=lambda book: len(book.path)) if matches else None
+
+    def find_page(self, book, path):
+        if book.table_of_contents and book.table_of_contents.path == path:
+            return book.table_of_contents
+        return book.page(path=path)
+
+    def get_content(self, **kwargs):
+        """Returns the current library content, merged by id in book order.
+        """
+        content_types = kwargs.get('types', self.extract_options['types'])
+        with self.lock:
+            lib_content = []
+            for page in self.owned_pages():
+                for content in self.content.get(page.path, []):
+                    if content.type not in content_types: continue
+                    content = copy.copy(content)
+                    content.sources = list(content.sources)
+                    lib_content.append(content)
+        return merge_content(lib_content)
+
+    def get_encounters(self, **kwargs):
+        """Returns the current library encounters in book order.
+        """
+        with self.lock:
+            encounters = []
+            for page in self.owned_pages():
+                encounters += [dict(e) for e in self.encounters.get(page.path, [])]
+        return encounters
+
+    def load_content(self):
+        """Extracts the content and encounters for every page in the library.
+        """
+        with self.lock:
+            self.content = {}
+            self.encounters = {}
+            for book in self.library.books:
+                if not book.is_owned_content(): continue
+                if not book.validate(): continue
+                for page in book.pages:
+                    self.extract_page(book, page)
+            self.generation += 1
+        return self
+
+    def owned_pages(self):
+        for book in self.library.books:
+            if not book.is_owned_content(): continue
+            for page in book.pages:
+                yield page
+
+    def poll(self):
+        """Checks the library files once, applying any pending changes that
+        have settled for longer than the debounce time. Returns the set of
+        files that were applied.
+        """
+        files = self.scan()
+        changed = {path for path in set(files) | set(self.files)
+            if files.get(path) != self.files.get(path)}
+        self.files = files
+
+        now = time.monotonic()
+        if changed:
+            self.pending |= changed
+            self.last_change = now
+            return set()
+
+        if not self.pending or now - self.last_change < self.debounce:
+            return set()
+
+        applied, self.pending = self.pending, set()
+        with self.lock:
+            self.apply(applied)
+        return applied
+
+    def remove_pages(self, paths):
+        """Drops the content extracted from the given pages.
+        """
+        for path in paths:
+            self.content.pop(path, None)
+            self.encounters.pop(path, None)
+        self.references.remove_pages(paths)
+        if self.stat_index is not None:
+            self.stat_index.remove_pages(paths)
+
+    def run(self, **kwargs):
+        """Polls for changes until `stop` is called or the watcher is
+        interrupted.
+        """
+        if kwargs.get('load_content', True) and not self.content:
+            self.load_content()
+
+        if self.logging: print(f'Watching "{self.library.path}" for changes.')
+        self.stop_event.clear()
+        try:
+            while not self.stop_event.is_set():
+                self.poll()
+                self.stop_event.wait(self.interval)
+        except KeyboardInterrupt:
+            pass
+        if self.logging: print('Stopped watching.')
+        return self
+
+    def scan(self):
+        """Returns the modification time of each html file in the sources
+        folder and of the sources file, read with a FileSystemSnapshot.
+        """
+        sources_path = self.library.sources.path
+        if self.snapshot is None or self.snapshot.extra_files != [sources_path]:
+            self.snapshot = FileSystemSnapshot(os.path.join(self.library.path, 'sources'), files=[sources_path])
+        else:
+            self.snapshot.refresh()
+        return {path: modified for path, modified in self.snapshot.files.items()
+            if path.endswith('.html') or path == sources_path}
+
+    def start(self, **kwargs):
+        """Runs the watcher in a background thread and returns the thread.
+        """
+        thread = threading.Thread(target=self.run, kwargs=kwargs, daemon=True)
+        thread.start()
+        return thread
+
+    def stop(self):
+        self.stop_event.set()
@@ -0,0 +1,29 @@
+import os
+import shutil
+import sys
+
+import pytest
+
+# run the tests against the ddb_library folder in this repository
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from ddb_library import Library
+
+DATA_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'data')
+
+@pytest.fixture
+def library_path(tmp_path):
+    """A copy of the test library's files, without a library.json.
+    """
+    path = str(tmp_path / 'library')
+    shutil.copytree(os.path.join(DATA_PATH, 'library'), path)
+    return path
+
+@pytest.fixture
+def library(library_path):
+    """A library built from the test library's files.
+    """
+    lib = Library(name='test library', path=library_path)
+    lib.load_sources(logging=False)
+    lib.load_books(logging=False)
+    return lib
@@ -0,0 +1,63 @@
+from ddb_library import ChangeFeed, ContentReference
+
+def monster(id, path, html='<p>stats</p>', type='monster'):
+    return ContentReference(name=id, type=type, id=id, modified=1.0, path=path, html=html,
+        sources=[{'name': 'Book', 'page': {'name': 'Page', 'path': path}}])
+
+def encounter(path, name='Goblin'):
+    return {'path': path, 'book_path': 'Book; Page; Ambush', 'monsters': [name], 'modified': 1.0}
+
+def keys(changes, change):
+    return [d['key'] for d in changes[change]]
+
+def test_partial_extraction_only_removes_what_it_covers():
+    feed = ChangeFeed()
+    content = [monster('1-goblin', '/a/p.html'), monster('2-wolf', '/b/p.html'),
+        monster('3-fireball', '/a/p.html', type='spell')]
+    encounters = [encounter('/a/p.html'), encounter('/b/p.html')]
+    assert feed.record(content=content, encounters=encounters) == 1
+
+    # only the monsters of book a, one of them changed
+    assert feed.record(content=[monster('1-goblin', '/a/p.html', html='<p>new</p>')],
+        encounters=[encounter('/a/p.html')], types=['monster'], paths=['/a/p.html']) == 2
+    changes = feed.changes(since=1)
+    assert keys(changes, 'modified') == ['content/1-goblin']
+    assert changes['removed'] == [] and feed.size() == 5
+
+    # a monster removed from book a
+    assert feed.record(content=[], encounters=[], types=['monster'], paths=['/a/p.html']) == 3
+    assert keys(feed.changes(since=2), 'removed') == ['content/1-goblin', 'encounter//a/p.html#Book; Page; Ambush#0']
+    assert sorted(feed.entries) == ['content/2-wolf', 'content/3-fireball', 'encounter//b/p.html#Book; Page; Ambush#0']
+
+    # a full extraction removes the rest
+    assert feed.record(content=[], encounters=[]) == 4
+    assert len(feed.changes(since=3)['removed']) == 3 and feed.size() == 0
+
+def test_partial_get_changes(library):
+    changes = library.get_changes(logging=False)
+    assert changes['added'] and changes['checkpoint'] == 1
+
+    changes = library.get_changes(acronyms=['VGtM'], types=['spell'], logging=False)
+    assert changes['checkpoint'] == 1 and not changes['removed']
+    changes = library.get_changes(skip_books=['Lost Mine of Phandelver'], logging=False)
+    assert changes['checkpoint'] == 1 and not changes['removed']
+    assert library.get_changes(logging=False)['checkpoint'] == 1
+
+def test_tombstones_expire():
+    feed = ChangeFeed(keep=2)
+    feed.record(content=[monster('1-goblin', '/a/p.html'), monster('2-wolf', '/a/p.html')])
+    feed.record(content=[monster('2-wolf', '/a/p.html')])
+    assert list(feed.removed) == ['content/1-goblin'] and feed.oldest == 0
+    assert keys(feed.changes(since=1), 'removed') == ['content/1-goblin']
+
+    feed.record(content=[monster('2-wolf', '/a/p.html', html='<p>3</p>')])
+    assert list(feed.removed) == ['content/1-goblin'] and feed.oldest == 1
+    feed.record(content=[monster('2-wolf', '/a/p.html', html='<p>4</p>')])
+    assert feed.removed == {} and feed.oldest == 2
+
+    feed = ChangeFeed(feed.__dict__)
+    changes = feed.changes(since=1)
+    assert changes['reset'] and changes['since'] == 0
+    assert keys(changes, 'added') == ['content/2-wolf'] and not changes['removed']
+    changes = feed.changes(since=2)
+    assert not changes['reset'] and keys(changes, 'modified') == ['content/2-wolf']
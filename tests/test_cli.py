@@ -0,0 +1,83 @@
+import json
+import os
+
+import pytest
+
+from ddb_library import Library
+from ddb_library.cli import main
+
+def test_update_refuses_packed_archive(library):
+    library.save_json(logging=False)
+    archive_path = os.path.join(library.path, 'library.ddbpack')
+    library.pack(archive_path, logging=False)
+    with open(archive_path, 'rb') as fin:
+        packed = fin.read()
+
+    with pytest.raises(SystemExit, match='packed archive'):
+        main(['update', archive_path, '--json'])
+    with open(archive_path, 'rb') as fin:
+        assert fin.read() == packed
+    assert main(['stats', archive_path, '--json']) == 0
+
+def run(capsys, *argv):
+    """Runs a command and returns its result."""
+    capsys.readouterr()
+    assert main(list(argv) + ['--json']) == 0
+    return json.loads(capsys.readouterr().out)['result']
+
+def touch(path, seconds):
+    modified = os.path.getmtime(path) + seconds
+    os.utime(path, (modified, modified))
+
+def test_incremental_extract_reuses_only_matching_output(library, tmp_path, capsys):
+    library.save_json(logging=False)
+    output = str(tmp_path / 'content.json')
+    extract = ['extract', library.path, '--output', output, '--incremental']
+
+    assert run(capsys, *extract)['reused'] is False
+    with open(output, 'r') as fin:
+        content = json.load(fin)
+    assert run(capsys, *extract)['reused'] is True
+
+    assert run(capsys, *extract, '--types', 'spell')['reused'] is False
+    with open(output, 'r') as fin:
+        spells = json.load(fin)
+    assert spells and len(spells) < len(content) and all(c['type'] == 'spell' for c in spells)
+    assert run(capsys, *extract, '--types', 'spell')['reused'] is True
+    assert run(capsys, *extract)['reused'] is False
+    assert run(capsys, *extract, '--acronyms', 'LMoP')['reused'] is False
+    assert run(capsys, *extract, '--encounters')['reused'] is False
+    assert run(capsys, *extract, '--encounters', '--parser', 'stream')['reused'] is False
+    assert run(capsys, *extract, '--encounters', '--parser', 'stream')['reused'] is True
+
+    # outputs written without their arguments aren't reused
+    os.remove(output + '.args.json')
+    assert run(capsys, *extract, '--encounters', '--parser', 'stream')['reused'] is False
+
+    page = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    touch(page.path, 100)
+    assert run(capsys, *extract, '--encounters', '--parser', 'stream')['reused'] is False
+
+def test_update(library, capsys):
+    library.save_json(logging=False)
+    assert run(capsys, 'update', library.path) == {'sources_updated': False, 'books_updated': []}
+
+    page = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    touch(page.path, 100)
+    touch(library.sources.path, 100)
+    assert run(capsys, 'update', library.path) == {'sources_updated': True, 'books_updated': ['Lost Mine of Phandelver']}
+    assert run(capsys, 'update', library.path) == {'sources_updated': False, 'books_updated': []}
+    updated = Library.from_json_file(os.path.join(library.path, 'library.json'))
+    assert updated.book(acronym='LMoP').page(path=page.path).modified == os.path.getmtime(page.path)
+
+def test_update_hashed_library_ignores_touched_files(library, capsys):
+    library.hash_files = True
+    library.update(hash=True)
+    for page in [library.sources] + [p for book in library.books for p in book.pages]:
+        if page.path: page.update(hash=True)
+    library.save_json(logging=False)
+
+    touch(library.sources.path, 100)
+    touch(library.book(acronym='LMoP').pages[0].path, 100)
+    assert run(capsys, 'update', library.path) == {'sources_updated': False, 'books_updated': []}
+    assert run(capsys, 'stats', library.path)['sources_update_available'] is False
@@ -0,0 +1,55 @@
+import random
+
+from ddb_library.encounter_table import EncounterTable
+
+def random_encounters(rng, count):
+    monsters = ['16907-goblin', '17023-stirge', '16969-ogre']
+    encounters = []
+    for i in range(count):
+        book = rng.choice(['Book A', 'Book B'])
+        encounters.append({
+            'book': book,
+            'book_path': '; '.join([book, rng.choice(['Ch 1', 'Ch 2']), rng.choice(['Cave', 'Room'])]),
+            'path': f'/{book}/page-{rng.randint(0, 2)}.html',
+            'monsters': [(rng.randint(1, 5), rng.choice(monsters)) for _ in range(rng.randint(0, 3))],
+        })
+    return encounters
+
+def test_aggregations_match_loops():
+    rng = random.Random(26)
+    encounters = random_encounters(rng, 60)
+    table = EncounterTable.from_encounters(encounters)
+    rows = [(i, e, n, m) for i, e in enumerate(encounters) for (n, m) in e['monsters']]
+    assert table.size() == len(rows)
+    assert table.encounter_count() == len({r[0] for r in rows})
+
+    counts, totals, chapters, frequency = {}, {}, {}, {}
+    for i, e, n, m in rows:
+        counts[m] = counts.get(m, 0) + 1
+        totals[e['book_path']] = totals.get(e['book_path'], 0) + n
+        chapter = '; '.join(e['book_path'].split('; ')[:2])
+        chapters[chapter] = chapters.get(chapter, 0) + n
+        frequency[(e['book'], m)] = frequency.get((e['book'], m), 0) + n
+    assert table.count_by('monster') == counts
+    assert table.total_by('book_path') == totals
+    assert table.total_by('book_path', depth=2) == chapters
+
+    books, monsters, matrix = table.monster_frequency(by='book', weighted=True)
+    assert {(b, m): int(matrix[i, j]) for i, b in enumerate(books) for j, m in enumerate(monsters)
+        if matrix[i, j]} == frequency
+
+    assert table.encounters_with('16907-goblin').tolist() == \
+        sorted({i for i, e, n, m in rows if m == '16907-goblin'})
+    assert table.encounters_with('missing').tolist() == []
+    assert list(table.column('monster')) == [r[3] for r in rows]
+
+def test_round_trips_through_dict():
+    table = EncounterTable.from_encounters(random_encounters(random.Random(1), 20))
+    copy = EncounterTable(table.to_dict())
+    assert copy.to_dict() == table.to_dict()
+    assert copy.count_by('book') == table.count_by('book')
+
+def test_library_encounter_table(library):
+    encounters = library.get_encounters(logging=False)
+    table = library.get_encounter_table(logging=False)
+    assert table.size() == sum(len(e['monsters']) for e in encounters) > 0
@@ -0,0 +1,123 @@
+import random
+
+import pytest
+
+import ddb_library.html_processor
+import ddb_library.page
+from ddb_library import Page
+from ddb_library.encounter_parser import EncounterParser
+
+HTML_OPTIONS = [
+    {},
+    {'remove_comments': True, 'remove_blank_lines': True},
+    {'replace_invisibles': True, 'prettify': True},
+    {'extract_main_body': True, 'remove_tag_attributes': ['style', 'id']},
+]
+
+def random_page(rng):
+    """Returns the html of a page mixing the structures encounters are
+    found in: headings, paragraphs with numbered monster links, plural
+    spans, stat block titles, skipped columns and nested tags.
+    """
+    monsters = ['16907-goblin', '17023-stirge', '16969-ogre', '16000-thug', 'not-a-monster']
+    numbers = ['', 'Two ', 'three ', 'a dozen ', '5 ', 'twenty ', 'one or ', '. ', 'eleven\n']
+    def link(kind='monster-tooltip'):
+        return f'<a class="tooltip-hover {kind}" href="/monsters/{rng.choice(monsters)}">m{rng.randint(0, 9)}</a>'
+    def inline():
+        choice = rng.randint(0, 7)
+        if choice == 0: return f'{rng.choice(numbers)}{link()}'
+        if choice == 1: return f'<span class="plural-monster-tooltip">{link()}</span>'
+        if choice == 2: return f'<em>{rng.choice(numbers)}{link("spell-tooltip")}</em>'
+        if choice == 3: return f'<strong>{rng.choice(numbers)}</strong>'
+        if choice == 4: return '<br/>'
+        if choice == 5: return rng.choice(['&nbsp;', '&amp;', ' \n ', '–', ' '])
+        return rng.choice(numbers) + 'text'
+    parts = []
+    for _ in range(rng.randint(1, 25)):
+        choice = rng.randint(0, 9)
+        if choice < 2:
+            h = rng.choice(['h2', 'h3', 'h4', 'h5'])
+            parts.append(f'<{h} id="x">{rng.choice(["Cave", "The <em>Ambush</em>", " Room  1 "])}</{h}>')
+        elif choice == 2:
+            parts.append(f'<p class="Stat-Block-Styles_Stat-Block-Title">{link()}</p>')
+        elif choice == 3:
+            parts.append(f'<div class="flexible-double-column"><p>{inline()}{inline()}</p></div>')
+        elif choice == 4:
+            parts.append(f'<blockquote><p>{inline()}<p>{inline()}</p>{inline()}</p></blockquote>')
+        elif choice == 5:
+            parts.append(f'<!-- {rng.randint(0, 9)} -->\n\n')
+        else:
+            parts.append('<p>' + ''.join(inline() for _ in range(rng.randint(0, 6))) + '</p>\n')
+    body = ''.join(parts)
+    return (
+        '<!DOCTYPE html>\n<html><head><meta property="og:title" content="Page"/></head>\n'
+        f'<body><div class="main content-container">\n{body}\n</div></body></html>'
+    )
+
+def make_page(tmp_path, name, html_text):
+    path = tmp_path / name
+    path.write_text(html_text)
+    return Page(name='Page', file=name, path=str(path), root_path=str(tmp_path), modified=1.0)
+
+@pytest.mark.parametrize('html_options', HTML_OPTIONS)
+def test_stream_matches_tree_on_fixture_library(library, html_options):
+    pages = 0
+    for book in library.books:
+        for page in book.pages:
+            if not page.path: continue
+            tree = book.get_page_encounters(page, html_options=html_options)
+            stream = book.get_page_encounters(page, html_options=html_options, parser='stream')
+            assert stream == tree
+            pages += 1
+    assert pages == 4
+
+@pytest.mark.parametrize('html_options', HTML_OPTIONS[:3])
+def test_stream_matches_tree_on_random_pages(tmp_path, html_options):
+    rng = random.Random(41)
+    found = 0
+    for i in range(300):
+        page = make_page(tmp_path, f'page-{i}.html', random_page(rng))
+        tree = page.get_encounters(html_options=html_options)
+        assert page.get_encounters(html_options=html_options, parser='stream') == tree
+        found += len(tree)
+    assert found > 300
+
+@pytest.mark.parametrize('html_options', HTML_OPTIONS[:2])
+def test_stream_builds_no_tree(library, monkeypatch, html_options):
+    trees = []
+    class CountingSoup(ddb_library.page.BeautifulSoup):
+        def __init__(self, *args, **kwargs):
+            trees.append(1)
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(ddb_library.page, 'BeautifulSoup', CountingSoup)
+    monkeypatch.setattr(ddb_library.html_processor, 'BeautifulSoup', CountingSoup)
+
+    encounters = library.get_encounters(parser='stream', html_options=html_options, logging=False)
+    assert encounters and not trees
+    library.get_encounters(html_options=html_options, logging=False)
+    assert trees
+
+def test_encounters_are_yielded_as_they_close():
+    blocks = ['<h2>Cave</h2><p>Two <a class="monster-tooltip" href="/monsters/16907-goblin">goblins</a></p>']
+    blocks += ['<p>filler</p>'] * 1000
+    blocks += ['<p><a class="monster-tooltip" href="/monsters/17023-stirge">stirge</a></p>']
+
+    fed = []
+    def feed():
+        for block in blocks:
+            fed.append(block)
+            yield block
+
+    encounters = EncounterParser().iter_parse(feed())
+    headings, monsters, text = next(encounters)
+    assert (headings[0], monsters) == ('Cave', [(2, '16907-goblin')])
+    assert len(fed) == 1
+    assert [m for _, m, _ in encounters] == [[(1, '17023-stirge')]]
+
+def test_block_boundaries_dont_change_encounters():
+    rng = random.Random(7)
+    for _ in range(200):
+        html_text = random_page(rng)
+        size = rng.randint(1, 40)
+        blocks = [html_text[i:i + size] for i in range(0, len(html_text), size)]
+        assert list(EncounterParser().iter_parse(blocks)) == EncounterParser().parse(html_text)
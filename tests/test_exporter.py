@@ -0,0 +1,53 @@
+import json
+import os
+import random
+
+from ddb_library import ContentReference
+from ddb_library.exporter import MergedContent
+from ddb_library.library import merge_content
+
+def random_content(rng, count):
+    content = []
+    for i in range(count):
+        content.append(ContentReference(
+            name=f'name {i}',
+            type=rng.choice(['monster', 'spell']),
+            id=rng.choice([None, *[f'{n}-thing' for n in range(30)]]),
+            modified=float(i),
+            path=f'/book-{rng.randint(0, 3)}/page.html',
+            sources=[{'book': f'book {i}'}],
+            html=rng.choice([None, '', f'<p>{i} é</p>' * rng.randint(1, 50)]),
+        ))
+    return content
+
+def test_merged_content_matches_merge_content():
+    rng = random.Random(44)
+    books = [random_content(rng, rng.randint(0, 40)) for _ in range(10)]
+    expected = merge_content([ContentReference(dict(c.__dict__, sources=list(c.sources)))
+        for content in books for c in content])
+
+    with MergedContent() as merged:
+        for content in books:
+            merged.add(content)
+        assert all(c.html is None for c in merged.content.values())
+        assert [c.__dict__ for c in merged] == [c.__dict__ for c in expected]
+        assert len(merged) == len(expected)
+
+def test_merged_export_matches_get_content(library, tmp_path):
+    dest = str(tmp_path / 'content.jsonl')
+    stats = library.export_content(dest, logging=False)
+
+    with open(dest, 'r') as fin:
+        exported = [json.loads(line) for line in fin]
+    expected = [json.loads(c.to_json()) for c in library.get_content(logging=False)]
+    assert exported == expected
+    assert stats['entries'] == len(expected) > 0
+    assert not os.path.exists(dest + '.tmp')
+
+def test_unmerged_export_matches_get_content(library, tmp_path):
+    dest = str(tmp_path / 'content.jsonl')
+    library.export_content(dest, merge=False, logging=False)
+
+    with open(dest, 'r') as fin:
+        exported = [json.loads(line) for line in fin]
+    assert exported == [json.loads(c.to_json()) for c in library.get_content(merge=False, logging=False)]
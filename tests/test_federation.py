@@ -0,0 +1,61 @@
+import os
+import shutil
+
+from ddb_library import Federation, Library
+from ddb_library.fs_snapshot import MOUNTS
+
+from conftest import DATA_PATH
+
+def packed_library(folder, monkeypatch, replace=None):
+    """Packs a copy of the test library at `folder`/lib, loaded with the
+    relative path 'lib', then removes its sources so its pages can only be
+    read from the archive.
+    """
+    os.makedirs(folder)
+    shutil.copytree(os.path.join(DATA_PATH, 'library'), os.path.join(folder, 'lib'))
+    monkeypatch.chdir(folder)
+    if replace:
+        path = os.path.join('lib', 'sources', 'lmop', 'chapter-1.html')
+        with open(path, 'r') as fin:
+            html_text = fin.read()
+        with open(path, 'w') as fout:
+            fout.write(html_text.replace(*replace))
+    lib = Library(name=os.path.basename(folder), path='lib')
+    lib.load_sources(logging=False)
+    lib.load_books(logging=False)
+    lib.pack(logging=False)
+    lib.save_json(logging=False)
+    os.utime(os.path.join('lib', 'library.ddbpack'))
+    content = [(c.id, c.html) for c in lib.get_content(merge=False, logging=False)]
+    shutil.rmtree(os.path.join('lib', 'sources'))
+    return content
+
+def test_mounts_are_resolved_against_absolute_roots(tmp_path, monkeypatch):
+    first = packed_library(str(tmp_path / 'first'), monkeypatch)
+    second = packed_library(str(tmp_path / 'second'), monkeypatch, replace=('Goblin', 'Hobgoblin'))
+    monkeypatch.chdir(str(tmp_path))
+
+    fed = Federation(libraries=[str(tmp_path / 'first' / 'lib'), str(tmp_path / 'second' / 'lib')])
+    try:
+        content = [(c.id, c.html) for c in fed.get_content(merge=False, logging=False)]
+        roots = [member.library.path for member in fed.members]
+        assert roots == [str(tmp_path / 'first' / 'lib'), str(tmp_path / 'second' / 'lib')]
+        assert all(root in MOUNTS for root in roots)
+        assert content == first + second
+        assert not any('Hobgoblin' in html for id, html in first) and any('Hobgoblin' in html for id, html in second)
+    finally:
+        for root in list(MOUNTS):
+            if root.startswith(str(tmp_path)): MOUNTS[root].close()
+
+def test_members_load_on_first_use(library, tmp_path):
+    library.save_json(logging=False)
+    fed = Federation(name='fed', libraries=[library.path, {'path': str(tmp_path / 'missing'), 'name': 'later'}])
+    assert fed.book(acronym='LMoP').name == 'Lost Mine of Phandelver'
+    assert fed.members[0].is_loaded() and not fed.members[1].is_loaded()
+
+    path = str(tmp_path / 'federation.json')
+    fed.save_json(path, logging=False)
+    loaded = Federation.from_json_file(path)
+    assert loaded.to_json() == fed.to_json()
+    assert [c.id for c in loaded.library(library.path).get_content(logging=False)] == \
+        [c.id for c in library.get_content(logging=False)]
@@ -0,0 +1,48 @@
+import os
+
+import pytest
+
+from ddb_library.fs_snapshot import FileSystemSnapshot
+
+def test_snapshot_matches_the_file_system(library_path):
+    root = os.path.join(library_path, 'sources')
+    sources_path = os.path.join(library_path, 'sources.html')
+    snapshot = FileSystemSnapshot(root, files=[sources_path])
+
+    walked = list(os.walk(root))
+    assert sorted(path for path, dirs, files in snapshot.walk(root)) == sorted(path for path, dirs, files in walked)
+    for path, dirnames, filenames in walked:
+        assert snapshot.isdir(path) and not snapshot.isfile(path)
+        assert sorted(snapshot.listdir(path)) == sorted(os.listdir(path))
+        for name in filenames:
+            file_path = os.path.join(path, name)
+            assert snapshot.isfile(file_path)
+            assert snapshot.getmtime(file_path) == os.path.getmtime(file_path)
+    assert snapshot.getmtime(sources_path) == os.path.getmtime(sources_path)
+
+    missing = os.path.join(root, 'missing.html')
+    assert not snapshot.isfile(missing) and not snapshot.isdir(missing)
+    with pytest.raises(FileNotFoundError):
+        snapshot.getmtime(missing)
+    assert not snapshot.isfile(None)
+
+    # paths outside the snapshot are read from the file system
+    outside = os.path.join(library_path, 'outside.txt')
+    with open(outside, 'w') as fout:
+        fout.write('x')
+    assert snapshot.isfile(outside) and snapshot.getmtime(outside) == os.path.getmtime(outside)
+
+def test_snapshot_changes_only_on_refresh(library_path):
+    root = os.path.join(library_path, 'sources')
+    snapshot = FileSystemSnapshot(root)
+    page = next(path for path in snapshot.files if path.endswith('.html'))
+    modified = snapshot.getmtime(page)
+    os.utime(page, (modified + 100, modified + 100))
+    added = os.path.join(root, 'added.html')
+    with open(added, 'w') as fout:
+        fout.write('<html></html>')
+
+    assert snapshot.getmtime(page) == modified and not snapshot.isfile(added)
+    snapshot.refresh()
+    assert snapshot.getmtime(page) == modified + 100 and snapshot.isfile(added)
+    assert 'added.html' in snapshot.listdir(root)
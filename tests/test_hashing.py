@@ -0,0 +1,71 @@
+import hashlib
+import os
+
+from ddb_library import Library
+from ddb_library import hashing
+from ddb_library.archive import LibraryArchive
+from ddb_library.hashing import file_hash
+
+def test_hash_depends_only_on_contents(tmp_path):
+    path = str(tmp_path / 'page.html')
+    data = os.urandom(3 * 1000 + 7)
+    with open(path, 'wb') as fout:
+        fout.write(data)
+
+    digest = file_hash(path)
+    assert digest == hashlib.blake2b(data, digest_size=16).hexdigest()
+    assert all(file_hash(path, chunk_size=size) == digest for size in [1, 64, 1000, 1 << 20])
+    os.utime(path, (1e9, 1e9))
+    assert file_hash(path) == digest
+
+    copy = str(tmp_path / 'copy.html')
+    with open(copy, 'wb') as fout:
+        fout.write(data)
+    assert file_hash(copy) == digest
+    with open(copy, 'ab') as fout:
+        fout.write(b' ')
+    assert file_hash(copy) != digest
+
+def test_page_hashes_are_stable(library_path):
+    lib = Library(name='hashed', path=library_path, hash_files=True)
+    lib.load_sources(logging=False)
+    lib.load_books(logging=False)
+    hashes = {page.path: page.hash for book in lib.books for page in book.pages}
+    assert hashes and all(hashes.values())
+    assert all(file_hash(path) == digest for path, digest in hashes.items())
+
+    lib.save_json(logging=False)
+    loaded = Library.from_json_file(os.path.join(library_path, 'library.json'))
+    assert {page.path: page.hash for book in loaded.books for page in book.pages} == hashes
+
+    # pages read from a mounted archive hash the same as on disk
+    lib.pack(logging=False)
+    path = next(iter(hashes))
+    with open(path, 'a') as fout:
+        fout.write(' ')
+    assert file_hash(path) != hashes[path]
+    with LibraryArchive(os.path.join(library_path, 'library.ddbpack'), mount=True):
+        assert all(file_hash(path) == digest for path, digest in hashes.items())
+
+def test_update_hashes_each_file_once(library_path, monkeypatch):
+    lib = Library(name='hashed', path=library_path, hash_files=True)
+    lib.load_sources(logging=False)
+    lib.load_books(logging=False)
+    pages = [p for p in lib.book(acronym='LMoP').pages]
+    for page in pages:
+        os.utime(page.path, (page.modified + 100, page.modified + 100))
+    with open(pages[0].path, 'a') as fout:
+        fout.write(' ')
+    os.utime(lib.sources.path, (lib.sources.modified + 100, lib.sources.modified + 100))
+
+    hashed = []
+    find_mount = hashing.find_mount
+    def record(path):
+        hashed.append(path)
+        return find_mount(path)
+    monkeypatch.setattr(hashing, 'find_mount', record)
+    lib.update()
+
+    assert sorted(hashed) == sorted({lib.sources.path} | {page.path for page in pages})
+    assert all(page.modified == os.path.getmtime(page.path) for page in pages)
+    assert pages[0].hash == file_hash(pages[0].path)
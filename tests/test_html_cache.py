@@ -0,0 +1,60 @@
+import os
+import threading
+
+from ddb_library import HtmlCache
+from ddb_library import html_cache
+
+def chapter(library):
+    return [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+
+def test_hit_then_miss_after_the_page_changes(library, tmp_path):
+    cache = HtmlCache(str(tmp_path / 'cache'))
+    page = chapter(library)
+    html_text = page.get_html(html_cache=cache)
+    assert (cache.hits, cache.misses) == (0, 1)
+    assert page.get_html(html_cache=cache) == html_text
+    assert (cache.hits, cache.misses) == (1, 1)
+
+    modified = page.modified + 100
+    os.utime(page.path, (modified, modified))
+    assert page.get_html(html_cache=cache) == html_text
+    assert (cache.hits, cache.misses) == (1, 2)
+    assert len(cache.entries()) == 2
+
+def test_key_includes_the_cache_version(monkeypatch):
+    cache = HtmlCache('unused')
+    key = cache.key('/page.html', 1.0)
+    assert cache.key('/page.html', 1.0) == key
+    monkeypatch.setattr(html_cache, 'VERSION', html_cache.VERSION + 1)
+    assert cache.key('/page.html', 1.0) != key
+
+def test_least_recently_used_entries_are_evicted(tmp_path):
+    cache = HtmlCache(str(tmp_path / 'cache'), max_size=350)
+    for i, key in enumerate(['a', 'b', 'c']):
+        cache.put(key, 'x' * 100)
+        os.utime(cache.entry_path(key), (1000 + i, 1000 + i))
+    assert cache.get('a') is not None  # now the most recently used
+    cache.put('d', 'x' * 100)
+
+    assert cache.get('b') is None
+    assert all(cache.get(key) is not None for key in ['a', 'c', 'd'])
+    assert cache.size == cache.disk_size() == 300
+
+def test_concurrent_puts(tmp_path):
+    cache = HtmlCache(str(tmp_path / 'cache'))
+    errors = []
+    def put(i):
+        try:
+            for n in range(50):
+                cache.put(f'key-{n % 5}', f'{i} ' * 1000)
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=put, args=(i,)) for i in range(8)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors
+    assert sorted(os.listdir(cache.path)) == [f'key-{n}.html' for n in range(5)]
+    for n in range(5):
+        values = set(cache.get(f'key-{n}').split())
+        assert len(values) == 1
@@ -0,0 +1,90 @@
+import glob
+import itertools
+import os
+import random
+import re
+
+import pytest
+
+from conftest import DATA_PATH
+from ddb_library.html_processor import TAG_ATTRIBUTES, format_text, options_fingerprint, process_html
+
+TEXT_OPTIONS = ['remove_comments', 'remove_blank_lines', 'replace_invisibles', 'prettify']
+
+TREE_OPTIONS = [
+    {},
+    {'extract_main_body': True},
+    {'extract_main_body': True, 'remove_tag_attributes': TAG_ATTRIBUTES, 'cleanup_divs': True},
+    {'remove_empty_tags': ['p', ('div', {'class': 'flexible-double-column'})], 'unwrap_tags': ['span', 'a']},
+]
+
+def reference_format_text(html_text, **kwargs):
+    """The text passes of process_html as they were before being combined,
+    one option and one rule at a time.
+    """
+    if kwargs.get('remove_comments', False):
+        html_text = re.sub(r'<!--.*-->[\r\n]', '', html_text)
+
+    if kwargs.get('remove_blank_lines', False):
+        html_text = re.sub(r'[\r\n]+', '\n', html_text)
+        html_text = '\n'.join([l for l in html_text.split('\n') if len(l) > 0])
+
+    if kwargs.get('replace_invisibles', False):
+        html_text = html_text.replace('\u00a0', ' ')
+        html_text = html_text.replace('\u00ad', '')
+
+    if kwargs.get('prettify', False):
+        html_text = re.sub(r'\s+(?=[\r\n])', '', html_text)
+        html_text = re.sub(r'(\s*<br/>\s*)+', '<br/>\n', html_text)
+        html_text = re.sub(r'</div>(?=</div>)', '</div>\n', html_text)
+        html_text = re.sub(r'<(\w+)> +', r'<\1>', html_text)
+        html_text = re.sub(r' +</(\w+)>', r'</\1>', html_text)
+        html_text = re.sub(r'[\u2212\u2013\u2014]', '-', html_text)
+        html_text = re.sub(r'\s*<(li|p)>\s*', r'\n<\1>', html_text)
+        html_text = re.sub(r'\s*</(li|p)>\s*', r'</\1>\n', html_text)
+        html_text = re.sub(r'(?<!>)\n(?=[^<]+</p>)', '', html_text)
+        html_text = re.sub(r'\s*(</?blockquote>)\s*', r'\n\1\n', html_text)
+        html_text = re.sub(r'\s*(</?caption>)\s*', r'\n\1\n', html_text)
+
+    return html_text
+
+def text_option_sets():
+    for values in itertools.product([False, True], repeat=len(TEXT_OPTIONS)):
+        yield dict(zip(TEXT_OPTIONS, values))
+
+def fixture_pages():
+    paths = sorted(glob.glob(os.path.join(DATA_PATH, 'library', 'sources', '*', '*.html')))
+    pages = []
+    for path in paths:
+        with open(path, 'r') as fin:
+            pages.append(fin.read())
+    return pages
+
+def random_fragments(count, seed=32):
+    tokens = [
+        '<p>', '</p>', '<li>', '</li>', '<div>', '</div>', '<br/>', '<blockquote>', '</blockquote>',
+        '<caption>', '</caption>', '<em>', '</em>', '<!-- note -->', ' ', '  ', '\n', '\r\n', '\t',
+        '\u00a0', '\u00ad', '\u2212', '\u2013', '\u2014', 'text', 'a', '>', '<', 'x y',
+    ]
+    rng = random.Random(seed)
+    return [''.join(rng.choice(tokens) for _ in range(rng.randint(0, 40))) for _ in range(count)]
+
+@pytest.mark.parametrize('tree_options', TREE_OPTIONS)
+def test_process_html_matches_reference_on_fixture_pages(tree_options):
+    for html_text in fixture_pages():
+        tree_html = process_html(html_text, **tree_options)
+        for text_options in text_option_sets():
+            options = dict(tree_options, **text_options)
+            assert process_html(html_text, **options) == reference_format_text(tree_html, **text_options)
+
+def test_format_text_matches_reference_on_random_fragments():
+    for fragment in random_fragments(3000):
+        for text_options in text_option_sets():
+            assert format_text(fragment, **text_options) == reference_format_text(fragment, **text_options)
+
+def test_options_fingerprint():
+    assert options_fingerprint() == options_fingerprint(prettify=False, workers=4)
+    assert options_fingerprint(prettify=True) != options_fingerprint()
+    assert options_fingerprint(html_start='<html>') == options_fingerprint()
+    assert (options_fingerprint(extract_main_body=True, html_start='<html>')
+        != options_fingerprint(extract_main_body=True))
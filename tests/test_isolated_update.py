@@ -0,0 +1,205 @@
+import json
+import os
+import threading
+import time
+
+import pytest
+
+from ddb_library import Library
+from ddb_library.library import library_locks
+
+BOOKS, PAGES = ['aa', 'bb', 'cc'], 12
+
+def page_html(book, i, generation):
+    previous_page = f'/sources/dnd/{book}/p{i - 1}' if i else ''
+    next_page = f'/sources/dnd/{book}/p{i + 1}' if i < PAGES - 1 else ''
+    return (
+        f'<html><head><meta property="og:title" content="P{i} G{generation}"/>'
+        '<meta property="og:type" content="website"/>'
+        f'<meta property="og:url" content="https://www.dndbeyond.com/sources/dnd/{book}/p{i}"/></head><body>'
+        f'<div id="comp-next-nav" data-prev-link="{previous_page}" data-next-link="{next_page}"></div>'
+        + ''.join(f'<h2 id="h{j}">Heading {j}</h2><p>{"text " * 50}</p>' for j in range(5))
+        + '</body></html>'
+    )
+
+def toc_html(book, generation):
+    """Returns a table of contents listing the pages in order for even
+    generations and in reverse for odd ones.
+    """
+    order = range(PAGES) if generation % 2 == 0 else reversed(range(PAGES))
+    links = ''.join(f'<a href="https://www.dndbeyond.com/sources/dnd/{book}/p{i}">P{i}</a>' for i in order)
+    return (
+        f'<html><head><meta property="og:title" content="{book} G{generation}"/>'
+        '<meta property="og:type" content="article"/>'
+        f'<meta property="og:url" content="https://www.dndbeyond.com/sources/dnd/{book}"/></head><body>'
+        f'<div class="compendium-toc-full">{links}</div></body></html>'
+    )
+
+def write_generation(path, generation):
+    for book in BOOKS:
+        folder = os.path.join(path, 'sources', book)
+        os.makedirs(folder, exist_ok=True)
+        files = {'toc.html': toc_html(book, generation)}
+        files.update({f'p{i}.html': page_html(book, i, generation) for i in range(PAGES)})
+        for name, text in files.items():
+            with open(os.path.join(folder, name), 'w') as fout:
+                fout.write(text)
+            os.utime(os.path.join(folder, name), (1e9 + generation, 1e9 + generation))
+
+def make_library(path, **kwargs):
+    os.makedirs(path)
+    cards = ''.join(f'<div class="SourceCard_nameGroup__x"><a href="/sources/dnd/{b}">Book {b}</a><p>Purchased</p></div>'
+        for b in BOOKS)
+    with open(os.path.join(path, 'sources.html'), 'w') as fout:
+        fout.write(f'<html><body><div id="S:0">{cards}</div></body></html>')
+    write_generation(path, 0)
+    lib = Library(name='isolated', path=path, **kwargs)
+    lib.load_sources(load_folders=True, logging=False)
+    return lib
+
+def generation(name):
+    return int(name.rsplit('G', 1)[1])
+
+def check_book(book):
+    """Returns what's wrong with a book that mixes pages from different
+    generations, or whose page order doesn't match its toc.
+    """
+    generations = {generation(page.name) for page in book.pages}
+    if len(generations) != 1: return f'mixed generations {sorted(generations)}'
+    g = generations.pop()
+    if generation(book.table_of_contents.name) != g: return 'toc from another generation'
+    order = [int(page.name.split()[0][1:]) for page in book.pages]
+    if order != (list(range(PAGES)) if g % 2 == 0 else list(reversed(range(PAGES)))): return 'page order'
+    return None
+
+def test_readers_see_consistent_views_during_updates(tmp_path):
+    path = str(tmp_path / 'library')
+    lib = make_library(path)
+    assert all(check_book(book) is None for book in lib.books)
+
+    stop = threading.Event()
+    errors, reads, updates = [], [0], [0]
+
+    def reader():
+        while not stop.is_set():
+            view = lib.view()
+            generations = set()
+            for book in view.books:
+                error = check_book(book)
+                if error: errors.append(f'{book.name}: {error}')
+                else: generations.add(generation(book.pages[0].name))
+            if len(generations) > 1:
+                errors.append(f'view mixes generations {sorted(generations)}')
+            reads[0] += 1
+            time.sleep(0.001)
+
+    def updater():
+        g = 0
+        while not stop.is_set():
+            g += 1
+            write_generation(path, g)
+            lib.update(isolated=True)
+            updates[0] += 1
+
+    threads = [threading.Thread(target=reader) for _ in range(3)] + [threading.Thread(target=updater)]
+    for thread in threads: thread.start()
+    time.sleep(2)
+    stop.set()
+    for thread in threads: thread.join()
+
+    assert not errors, errors[:3]
+    assert updates[0] > 1 and reads[0] > updates[0]
+    assert all(check_book(book) is None for book in lib.books)
+
+def test_update_locks_are_per_library(tmp_path):
+    first = make_library(str(tmp_path / 'first'))
+    second = make_library(str(tmp_path / 'second'))
+    assert library_locks(first) is library_locks(first)
+    assert library_locks(first)[0] is not library_locks(second)[0]
+
+    write_generation(second.path, 1)
+    update_lock = library_locks(first)[0]
+    held, release = threading.Event(), threading.Event()
+    def hold():
+        with update_lock:
+            held.set()
+            release.wait(10)
+    holder = threading.Thread(target=hold)
+    holder.start()
+    held.wait(10)
+    try:
+        updater = threading.Thread(target=second.update)
+        updater.start()
+        updater.join(10)
+        assert not updater.is_alive()
+        assert generation(second.books[0].pages[0].name) == 1
+    finally:
+        release.set()
+        holder.join()
+
+    # the locks aren't saved with the library
+    assert set(json.loads(first.to_json())) == {'name', 'path', 'hash_files', 'sources', 'books'}
+
+@pytest.mark.parametrize('isolated', [False, True])
+def test_update_available_has_no_side_effects(tmp_path, isolated):
+    path = str(tmp_path / 'library')
+    lib = make_library(path, hash_files=True)
+    page = lib.books[0].pages[0]
+    assert page.hash
+    modified = page.modified
+    os.utime(page.path, (modified + 50, modified + 50))
+
+    assert page.update_available(hash=True) is False
+    assert page.update_available() is True
+    assert lib.books[0].update_available(hash=True) is False
+    assert not lib.update_available()
+    assert page.modified == modified
+
+    view = lib.view()
+    lib.update(isolated=isolated)
+    updated = lib.books[0].pages[0]
+    assert updated.modified == modified + 50 and updated.name == page.name
+    assert updated.update_available() is False
+    assert (view.books[0].pages[0].modified == modified) is isolated
+
+def test_library_readers_use_one_view(tmp_path):
+    path = str(tmp_path / 'library')
+    lib = make_library(path)
+    os.utime(lib.sources.path, (1e9, 1e9))
+    lib.sources.modified = 1e9
+    stop = threading.Event()
+    errors, reads = [], [0]
+
+    def read(books, what):
+        generations = set()
+        for book in books:
+            error = check_book(book)
+            if error: errors.append(f'{what} {book.name}: {error}')
+            else: generations.add(generation(book.pages[0].name))
+        if len(generations) > 1:
+            errors.append(f'{what} mixes generations {sorted(generations)}')
+
+    def reader():
+        while not stop.is_set():
+            copy = Library(json.loads(lib.to_json()))
+            read(copy.books, 'to_json')
+            if copy.sources.modified != 1e9 + generation(copy.books[0].pages[0].name):
+                errors.append('to_json pairs sources and books from different updates')
+            read(lib.get_extraction_books(), 'get_extraction_books')
+            reads[0] += 1
+
+    def updater():
+        g = 0
+        while not stop.is_set():
+            g += 1
+            write_generation(path, g)
+            os.utime(lib.sources.path, (1e9 + g, 1e9 + g))
+            lib.update(isolated=True)
+
+    threads = [threading.Thread(target=reader) for _ in range(2)] + [threading.Thread(target=updater)]
+    for thread in threads: thread.start()
+    time.sleep(1)
+    stop.set()
+    for thread in threads: thread.join()
+    assert not errors, errors[:3]
+    assert reads[0] > 1
@@ -0,0 +1,97 @@
+import os
+
+from ddb_library import Library
+
+def make_library(tmp_path, books):
+    sources = {'file': 'sources.html', 'path': str(tmp_path / 'sources.html'), 'modified': 1.0}
+    return Library(name='test', path=str(tmp_path), sources=sources, books=books)
+
+def make_book(tmp_path, modified):
+    path = str(tmp_path / 'sources' / 'lmop')
+    return {
+        'name': 'Lost Mine of Phandelver',
+        'acronym': 'LMoP',
+        'url': 'https://www.dndbeyond.com/sources/dnd/lmop',
+        'owned_content': True,
+        'path': path,
+        'pages': [
+            {'name': 'Introduction', 'file': 'intro.html', 'path': path + '/intro.html',
+                'url': 'https://www.dndbeyond.com/sources/dnd/lmop/intro', 'modified': modified},
+            # a page listed in the table of contents but not downloaded
+            {'url': '/lmop/chapter-1'},
+        ],
+    }
+
+def test_merge_newest_with_placeholder_pages(tmp_path):
+    older = make_library(tmp_path, [make_book(tmp_path, 100.0)])
+    newer = make_library(tmp_path, [make_book(tmp_path, 200.0)])
+
+    for shards in [[older, newer], [newer, older]]:
+        lib = Library.merge(shards, conflict='newest')
+        assert lib.size() == 1
+        assert lib.books[0].last_modified() == 200.0
+        assert lib.books[0].size() == 2
+
+def test_last_modified_ignores_placeholder_pages(tmp_path):
+    lib = make_library(tmp_path, [make_book(tmp_path, None)])
+    assert lib.books[0].last_modified() == 0
+
+def write_sources(library, cards, seconds=100):
+    """Rewrites the library's sources file with the given (slug, name,
+    owned) books and moves its mtime forward.
+    """
+    html = ''.join(f'<div class="SourceCard_nameGroup__x"><a href="/sources/dnd/{slug}">{name}</a>'
+        f'<p>{"Purchased" if owned else "Locked"}</p></div>' for slug, name, owned in cards)
+    with open(library.sources.path, 'w') as fout:
+        fout.write(f'<html><body><div id="S:0">{html}</div></body></html>')
+    modified = library.sources.modified + seconds
+    os.utime(library.sources.path, (modified, modified))
+
+CHANGED_CARDS = [
+    ('lmop', 'Lost Mine of Phandelver', False),
+    ('cos', 'Curse of Strahd', True),
+    ('new', 'New Book', True),
+]
+
+def test_reload_sources_applies_changes(library):
+    vgm = library.book(acronym='VGtM')
+    write_sources(library, CHANGED_CARDS)
+    changes = library.reload_sources(logging=False)
+
+    names = lambda books: sorted(book.name for book in books)
+    assert names(changes['added']) == ['New Book']
+    assert names(changes['owned']) == ['Curse of Strahd', 'New Book']
+    assert names(changes['unowned']) == ['Lost Mine of Phandelver']
+    assert changes['removed'] == []
+    assert library.book(acronym='VGtM') is vgm and vgm.pages
+    assert not library.book(acronym='LMoP').is_owned_content()
+    assert library.book(acronym='LMoP').pages
+
+def test_load_sources_keeps_unlisted_books(library, tmp_path):
+    library.add_book({'name': 'Homebrew', 'acronym': 'HB', 'path': str(tmp_path / 'homebrew'), 'owned_content': True})
+    count = library.size()
+    write_sources(library, CHANGED_CARDS)
+    library.load_sources(logging=False)
+    assert library.book('Homebrew') and library.book(acronym='VGtM')
+    assert library.size() == count + 1
+
+def test_reload_sources_removes_unlisted_books_when_asked(library):
+    write_sources(library, CHANGED_CARDS)
+    changes = library.reload_sources(remove=True, logging=False)
+    assert sorted(book.name for book in changes['removed']) == ['Old Book', 'Volos Guide to Monsters']
+    assert library.book(acronym='VGtM') is None
+    assert sorted(book.name for book in library.books) == ['Curse of Strahd', 'Lost Mine of Phandelver', 'New Book']
+
+def test_reload_sources_never_removes_everything(library):
+    names = sorted(book.name for book in library.books)
+    write_sources(library, [])
+    changes = library.reload_sources(remove=True, logging=False)
+    assert changes['removed'] == []
+    assert sorted(book.name for book in library.books) == names
+
+def test_parallel_extraction_matches_serial(library):
+    content = [c.to_json() for c in library.get_content(logging=False)]
+    encounters = library.get_encounters(logging=False)
+    assert content and encounters
+    assert [c.to_json() for c in library.get_content(logging=False, workers=2)] == content
+    assert library.get_encounters(logging=False, workers=2) == encounters
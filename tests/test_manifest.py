@@ -0,0 +1,53 @@
+import os
+import shutil
+
+from ddb_library import Library
+from ddb_library import manifest as manifest_module
+from ddb_library.manifest import Manifest
+
+def load(path):
+    lib = Library(name='test library', path=path)
+    lib.load_sources(logging=False)
+    lib.load_books(logging=False)
+    return lib
+
+def test_changing_a_page_changes_only_its_path_to_the_root(library):
+    before = Manifest.from_library(library)
+    chapter = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    book_path = os.path.relpath(library.book(acronym='LMoP').path, library.path)
+    name = os.path.relpath(chapter.path, library.path)
+    with open(chapter.path, 'a') as fout:
+        fout.write(' ')
+    after = Manifest.from_library(library)
+
+    assert after.hash != before.hash
+    assert after.sources == before.sources
+    for path, book in after.books.items():
+        if path == book_path:
+            assert book['hash'] != before.books[path]['hash']
+            assert [n for n in book['pages'] if book['pages'][n]['hash'] != before.books[path]['pages'][n]['hash']] == [name]
+        else:
+            assert book == before.books[path]
+    assert after.diff(before) == {
+        'sources': False,
+        'books': {'added': [], 'removed': [], 'changed': [book_path]},
+        'pages': {'added': [], 'removed': [], 'changed': [name]},
+    }
+
+def test_copies_have_the_same_manifest(library, tmp_path):
+    manifest = Manifest.from_library(library)
+    copy = str(tmp_path / 'copy')
+    shutil.copytree(library.path, copy)
+    assert Manifest.from_library(load(copy)).to_json() == manifest.to_json()
+    assert manifest.diff(Manifest.from_library(load(copy)))['books'] == {'added': [], 'removed': [], 'changed': []}
+
+    path = str(tmp_path / 'manifest.json')
+    manifest.save_json(path, logging=False)
+    assert Manifest.from_json_file(path).to_json() == manifest.to_json()
+
+def test_previous_manifest_hashes_are_reused(library, monkeypatch):
+    previous = Manifest.from_library(library)
+    def fail(path, **kwargs):
+        raise AssertionError(f'hashed {path}')
+    monkeypatch.setattr(manifest_module, 'file_hash', fail)
+    assert Manifest.from_library(library, previous=previous).to_json() == previous.to_json()
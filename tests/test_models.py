@@ -0,0 +1,100 @@
+import json
+import tracemalloc
+
+from ddb_library import Library, Page
+
+def synthetic_library(path, books=20, pages=100):
+    """Returns the json of a library like one saved to library.json.
+    """
+    d = {
+        'name': 'memory test',
+        'path': path,
+        'sources': {'file': 'sources.html', 'path': path + '/sources.html', 'modified': 1.0},
+        'books': [],
+    }
+    for b in range(books):
+        book_path = f'{path}/sources/book-{b}'
+        url = f'https://www.dndbeyond.com/sources/dnd/book-{b}'
+        d['books'].append({
+            'name': f'Book {b}', 'acronym': f'B{b}', 'url': url, 'owned_content': True, 'path': book_path,
+            'pages': [{
+                'name': f'Chapter {p}', 'file': f'chapter-{p}.html', 'path': f'{book_path}/chapter-{p}.html',
+                'type': 'website', 'url': f'{url}/chapter-{p}',
+                'previous_page': f'/sources/dnd/book-{b}/chapter-{p - 1}' if p else '',
+                'next_page': f'/sources/dnd/book-{b}/chapter-{p + 1}',
+                'modified': 1000.0 + p, 'hash': None,
+            } for p in range(pages)],
+        })
+    return json.dumps(d)
+
+class DictPage:
+    """A page held in an instance dict, as Page was before it used slots,
+    with the fields pages have since gained.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.name = d.get('name', None)
+        self.file = d.get('file', None)
+        self.path = d.get('path', None)
+        self.type = d.get('type', None)
+        self.url = d.get('url', None)
+        self.previous_page = d.get('previous_page', '')
+        self.next_page = d.get('next_page', '')
+        self.modified = d.get('modified', None)
+        self.hash = d.get('hash', None)
+        self.sections = d.get('sections', None)
+
+class DictBook:
+    """A book held in an instance dict, as Book was before it used slots.
+    """
+    def __init__(self, *args, **kwargs):
+        d = args[0] if args else kwargs
+        self.name = d.get('name', None)
+        self.acronym = d.get('acronym', None)
+        self.url = d.get('url', None)
+        self.owned_content = d.get('owned_content', None)
+        if 'path' in d:
+            self.path = d.get('path', None)
+        else:
+            self.path = d.get('root_path', '.') + f'/{self.acronym}'
+        self.table_of_contents = DictPage(d['table_of_contents']) if d.get('table_of_contents', None) else None
+        self.pages = [DictPage(**page, root_path=self.path) for page in d.get('pages', [])]
+
+def dict_models(d):
+    return [DictBook(book) for book in d['books']]
+
+def retained_memory(build, text):
+    """Returns the memory still held by what `build` makes from the json.
+    """
+    tracemalloc.start()
+    model = build(json.loads(text))
+    current, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    assert model
+    return current
+
+def test_page_root_path_from_dict():
+    page = Page({'file': 'intro.html', 'path': '/library/book/intro.html', 'root_path': '/library/book'})
+    assert page.root == '/library/book'
+    assert page.path == '/library/book/intro.html'
+    assert page._path is None
+
+def test_pages_share_interned_strings(library):
+    book = library.book(acronym='LMoP')
+    assert not hasattr(book.pages[0], '__dict__')
+    assert book.pages[0]._url_prefix is book.pages[1]._url_prefix
+    assert book.pages[0].root is book.pages[1].root is book.path
+
+def test_content_shares_source_descriptors(library):
+    content = library.book(acronym='LMoP').get_content(types=['monster', 'spell', 'magic item'])
+    by_page = {}
+    for c in content:
+        by_page.setdefault(c.path, set()).add(id(c.sources[0]))
+    assert by_page and all(len(ids) == 1 for ids in by_page.values())
+
+def test_loaded_library_memory(tmp_path):
+    text = synthetic_library(str(tmp_path))
+    slotted = retained_memory(Library, text)
+    plain = retained_memory(dict_models, text)
+    print(f'slotted models: {slotted / 1024:.0f} KiB, dict models: {plain / 1024:.0f} KiB')
+    assert slotted < 0.75 * plain
@@ -0,0 +1,59 @@
+import os
+import threading
+
+from ddb_library import fs_snapshot
+from ddb_library.fs_snapshot import LIVE_FILE_SYSTEM
+from ddb_library.prefetch import Prefetcher
+
+def write_files(tmp_path, count):
+    paths = []
+    for i in range(count):
+        path = str(tmp_path / f'{i:03}.html')
+        with open(path, 'w') as fout:
+            fout.write(f'<p>{i}</p>')
+        paths.append(path)
+    return paths
+
+def test_reads_come_from_the_prefetcher(tmp_path):
+    paths = write_files(tmp_path, 50)
+    with Prefetcher(paths, window=4) as prefetcher:
+        assert fs_snapshot.PREFETCHERS == [prefetcher]
+        assert LIVE_FILE_SYSTEM.read_bytes(paths[0]) == b'<p>0</p>'
+        assert prefetcher.consumed == 1
+
+        # files passed over are dropped, and reads go on ahead
+        assert LIVE_FILE_SYSTEM.read_text(paths[10]) == '<p>10</p>'
+        assert prefetcher.consumed == 11
+        assert not any(path in prefetcher.pending for path in paths[:11])
+        assert prefetcher.scheduled <= 11 + 2 * 4 + 4
+
+        # a file read twice comes from the disk the second time
+        with open(paths[10], 'w') as fout:
+            fout.write('changed')
+        assert prefetcher.take(paths[10]) is None
+        assert LIVE_FILE_SYSTEM.read_text(paths[10]) == 'changed'
+        assert [LIVE_FILE_SYSTEM.read_text(path) for path in paths[11:]] == [f'<p>{i}</p>' for i in range(11, 50)]
+    assert fs_snapshot.PREFETCHERS == []
+
+def test_concurrent_prefetchers(tmp_path):
+    paths = write_files(tmp_path, 40)
+    errors = []
+    def read(order):
+        try:
+            for _ in range(20):
+                with Prefetcher(order, window=2):
+                    if [LIVE_FILE_SYSTEM.read_bytes(path) for path in order] != \
+                            [open(path, 'rb').read() for path in order]:
+                        errors.append('wrong contents')
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=read, args=(paths if i % 2 else paths[::-1],)) for i in range(6)]
+    for thread in threads: thread.start()
+    for thread in threads: thread.join()
+    assert not errors
+    assert fs_snapshot.PREFETCHERS == []
+
+def test_prefetched_extraction_matches(library):
+    content = [c.to_json() for c in library.get_content(prefetch=False, logging=False)]
+    assert [c.to_json() for c in library.get_content(logging=False)] == content
@@ -0,0 +1,43 @@
+from ddb_library import ContentReference, ReferenceGraph
+
+def content(id, path, name='Goblin'):
+    return ContentReference(name=name, type='monster', id=id, path=path,
+        sources=[{'name': 'Book', 'page': {'name': 'Page', 'path': path}}])
+
+def encounter(path, heading, monsters):
+    return {'book': 'Book', 'book_path': f'Book; Page; {heading}', 'path': path, 'monsters': monsters}
+
+def test_pages_are_replaced_as_a_whole():
+    graph = ReferenceGraph()
+    graph.update_pages(['/a.html'], content=[content('1-goblin', '/a.html')],
+        encounters=[encounter('/a.html', 'Cave', [(2, '1-goblin'), (1, '2-wolf')]),
+            encounter('/a.html', 'Cave', [(3, '1-goblin')])])
+    graph.update_pages(['/b.html'], encounters=[encounter('/b.html', 'Road', [(1, '1-goblin')])])
+    assert graph.content_ids('/a.html') == ['1-goblin', '2-wolf']
+    assert graph.locations('1-goblin', kind='encounter') == [
+        {'book_path': 'Book; Page; Cave', 'page': '/a.html', 'count': 5, 'encounters': 2},
+        {'book_path': 'Book; Page; Road', 'page': '/b.html', 'count': 1, 'encounters': 1},
+    ]
+    assert [r['book_path'] for r in graph.references('1-goblin') if r['kind'] == 'content'] == ['Book; Page; Goblin']
+
+    # extracting encounters again keeps the page's content references
+    graph.update_pages(['/a.html'], encounters=[])
+    assert graph.content_ids('/a.html') == ['1-goblin']
+    assert graph.references('2-wolf') == []
+    assert graph.size() == 1
+
+    graph.remove_pages(['/a.html', '/b.html'])
+    assert graph.size() == 0 and graph.pages == {}
+
+def test_library_graph_round_trips(library, tmp_path):
+    graph = ReferenceGraph()
+    content = library.get_content(reference_graph=graph, logging=False)
+    encounters = library.get_encounters(reference_graph=graph, logging=False)
+    assert {c.id for c in content} <= set(graph.ids)
+    assert {m for e in encounters for (n, m) in e['monsters']} <= set(graph.ids)
+
+    path = str(tmp_path / 'graph.json')
+    graph.save_json(path, logging=False)
+    loaded = ReferenceGraph.from_json_file(path)
+    assert loaded.to_json() == graph.to_json()
+    assert all(loaded.locations(id) == graph.locations(id) for id in graph.ids)
@@ -0,0 +1,99 @@
+import json
+import os
+import random
+
+import ddb_library.html_processor
+import ddb_library.page
+from ddb_library import Library, Page
+from ddb_library.section_index import SectionIndexer, index_page, index_sections, unpack_sections
+
+def random_page(rng):
+    """Returns the bytes of a page with meta tags, navigation links,
+    nested headings, multi-byte text, entities and mixed newlines.
+    """
+    texts = ['Cave', 'Room – 1', 'The <em>Ambush</em>', 'Tom &amp; Jerry', 'Café Stop', '  a \n b ']
+    newline = rng.choice(['\n', '\r\n'])
+    parts = ['<!DOCTYPE html>', '<html><head>']
+    for _ in range(rng.randint(0, 4)):
+        prop = rng.choice(['og:title', 'og:type', 'og:url', 'description', None])
+        attrs = f' property="{prop}"' if prop else ''
+        if rng.randint(0, 4):
+            attrs += f' content="{rng.choice(texts)}{rng.choice(["", "&quot;", newline])}"'
+        parts.append(f'<meta{attrs}{rng.choice(["/", ""])}>')
+    parts.append('</head><body>')
+    for _ in range(rng.randint(0, 20)):
+        choice = rng.randint(0, 6)
+        if choice == 0:
+            parts.append(f'<div id="comp-next-nav" data-prev-link="/a/{rng.randint(0, 9)}" '
+                f'data-next-link="/b/{rng.randint(0, 9)}"></div>')
+        elif choice <= 2:
+            h = rng.choice(['h1', 'h2', 'h3', 'h4', 'h5'])
+            parts.append(f'<{h} id="h{rng.randint(0, 99)}">{rng.choice(texts)}</{h}>')
+        elif choice == 3:
+            parts.append(f'<div class="x"><h3>{rng.choice(texts)}</h3><p>inside</p></div>')
+        else:
+            parts.append(f'<p>{rng.choice(texts)}</p>')
+    parts.append('</body></html>')
+    return newline.join(parts).encode('utf-8')
+
+def test_line_starts():
+    data = 'a\néé\r\n\nb\nc'.encode('utf-8')
+    text = data.decode('utf-8')
+    expected = [0] + [i + 1 for i, c in enumerate(text) if c == '\n']
+    assert SectionIndexer(data).line_starts == expected
+
+def test_meta_data_matches_get_meta_data(library, tmp_path):
+    pages = [page for book in library.books for page in book.pages if page.path]
+    rng = random.Random(43)
+    for i in range(300):
+        path = tmp_path / f'page-{i}.html'
+        path.write_bytes(random_page(rng))
+        pages.append(Page(file=path.name, path=str(path), root_path=str(tmp_path)))
+
+    for page in pages:
+        with open(page.path, 'rb') as fin:
+            meta_data, sections = index_page(fin.read())
+        assert meta_data == page.get_meta_data()
+
+def test_packed_sections_unpack_to_full_records():
+    rng = random.Random(7)
+    for _ in range(200):
+        data = random_page(rng)
+        assert unpack_sections(index_sections(data)) == SectionIndexer(data).index()
+
+def test_update_parses_once(library, monkeypatch):
+    page = [p for p in library.book(acronym='LMoP').pages if p.file == 'intro.html'][0]
+    meta_data = page.get_meta_data()
+    sections = page.sections
+    page.name = page.url = page.next_page = page.sections = None
+
+    trees = []
+    class CountingSoup(ddb_library.page.BeautifulSoup):
+        def __init__(self, *args, **kwargs):
+            trees.append(1)
+            super().__init__(*args, **kwargs)
+    monkeypatch.setattr(ddb_library.page, 'BeautifulSoup', CountingSoup)
+    monkeypatch.setattr(ddb_library.html_processor, 'BeautifulSoup', CountingSoup)
+
+    page.update()
+    assert not trees
+    assert (page.name, page.url) == (meta_data['og:title'], meta_data['og:url'])
+    assert page.next_page == meta_data['next_page'] and page.next_page
+    assert page.sections == sections
+
+def test_sections_saved_beside_library_json(library, library_path):
+    library.save_json(logging=False)
+    json_path = os.path.join(library_path, 'library.json')
+    with open(json_path, 'r') as fin:
+        saved = json.load(fin)
+    assert all('sections' not in page for book in saved['books'] for page in book['pages'])
+
+    loaded = Library.from_json_file(json_path)
+    for book, loaded_book in zip(library.books, loaded.books):
+        for page, loaded_page in zip(book.pages, loaded_book.pages):
+            assert loaded_page.sections == page.sections
+            assert loaded_page.get_sections() == page.get_sections()
+
+    found = loaded.find_sections('goblin', logging=False)
+    assert [s['book_path'] for s in found] == [s['book_path'] for s in library.find_sections('goblin', logging=False)]
+    assert found
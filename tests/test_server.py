@@ -0,0 +1,83 @@
+import json
+import os
+import threading
+import urllib.error
+import urllib.request
+
+import pytest
+
+from ddb_library import LibraryWatcher
+from ddb_library.server import etag_matches, serve
+
+@pytest.fixture
+def server(library):
+    watcher = LibraryWatcher(library, checkpoint=False, logging=False, debounce=0)
+    server = serve(library, watcher=watcher, port=0, block=False, logging=False)
+    yield server
+    server.shutdown()
+    server.server_close()
+
+def get(server, path, etag=None):
+    """Returns (status, etag, body) for a request to the server."""
+    url = f'http://127.0.0.1:{server.server_address[1]}{path}'
+    request = urllib.request.Request(url, headers={'If-None-Match': etag} if etag else {})
+    try:
+        with urllib.request.urlopen(request) as response:
+            return response.status, response.headers['ETag'], json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        return e.code, e.headers['ETag'], None
+
+def test_etag_matches():
+    assert etag_matches('"abc"', '"abc"')
+    assert etag_matches('"abc"', '"x", "abc"')
+    assert etag_matches('"abc"', '*')
+    assert not etag_matches('"abc"', '"abcd"')
+    assert not etag_matches('"abc"', 'W/"abc"')
+    assert not etag_matches('"abc"', '')
+    assert not etag_matches('"abc"', None)
+
+def test_not_modified_until_a_page_changes(server, library):
+    status, etag, books = get(server, '/books/LMoP')
+    assert status == 200 and etag and books['acronym'] == 'LMoP'
+    assert get(server, '/books/LMoP', etag)[:2] == (304, etag)
+    assert get(server, '/books/LMoP', '"' + etag[1:-2] + '"')[0] == 200
+    assert get(server, '/books/LMoP', 'W/' + etag)[0] == 200
+
+    page = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    modified = page.modified + 100
+    os.utime(page.path, (modified, modified))
+    watcher = server.service.watcher
+    watcher.poll()
+    assert watcher.poll() == {page.path}
+
+    status, new_etag, books = get(server, '/books/LMoP', etag)
+    assert status == 200 and new_etag != etag
+    assert books['modified'] == modified
+    assert get(server, '/books/LMoP', new_etag)[0] == 304
+
+def test_requests_read_a_consistent_copy(server, library):
+    """Requests keep being served while the watcher applies changes."""
+    watcher = server.service.watcher
+    page = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    errors = []
+    stop = threading.Event()
+
+    def reader():
+        while not stop.is_set():
+            for path in ['/books', '/books/LMoP/pages', '/content', '/encounters', '/search?q=goblin']:
+                status = get(server, path)[0]
+                if status != 200: errors.append((path, status))
+
+    readers = [threading.Thread(target=reader) for _ in range(3)]
+    for thread in readers: thread.start()
+    try:
+        for i in range(10):
+            modified = page.modified + 10 + i
+            os.utime(page.path, (modified, modified))
+            watcher.poll()
+            watcher.poll()
+    finally:
+        stop.set()
+        for thread in readers: thread.join()
+    assert not errors
+    assert server.service.refresh()['generation'] == watcher.generation
@@ -0,0 +1,38 @@
+import os
+import time
+
+from ddb_library import Library
+
+def content_json(content):
+    return [c.to_json() for c in content]
+
+def test_shared_library_matches_library(library):
+    shared = library.share(logging=False)
+    assert Library.from_shared(shared.path).to_json() == library.to_json()
+    for i, book in enumerate(library.books):
+        assert shared.book_fingerprint(i) == book.fingerprint()
+
+def test_updated_books_are_not_read_from_shared_file(library):
+    shared = library.share(logging=False)
+    book = library.book(acronym='LMoP')
+    index = shared.book_index(path=book.path)
+    chapter = [p for p in book.pages if p.file == 'chapter-1.html'][0]
+
+    with open(chapter.path, 'r') as fin:
+        html_text = fin.read()
+    with open(chapter.path, 'w') as fout:
+        fout.write(html_text.replace('Goblin', 'Hobgoblin'))
+    modified = time.time() + 10
+    os.utime(chapter.path, (modified, modified))
+    library.update(logging=False)
+
+    # same page count, different pages
+    assert shared.book_page_count(index) == len(book.pages)
+    assert shared.book_fingerprint(index) != book.fingerprint()
+
+    serial = content_json(library.get_content(logging=False))
+    assert content_json(library.get_content(logging=False, workers=2, shared=shared)) == serial
+    assert chapter.modified == os.path.getmtime(chapter.path)
+    assert any('Hobgoblin' in c for c in serial)
+    serial = library.get_encounters(logging=False)
+    assert library.get_encounters(logging=False, workers=2, shared=shared) == serial
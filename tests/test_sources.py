@@ -0,0 +1,51 @@
+from collections import OrderedDict
+
+from ddb_library import sources as sources_module
+from ddb_library.sources import Sources
+
+def make_sources(tmp_path):
+    return Sources(path=str(tmp_path / 'sources.html'), modified=1)
+
+def test_old_format_listing_with_several_classes(tmp_path):
+    html_text = (
+        '<html><body>'
+        '<a class="sources-listing--item other" href="sources/dnd/old">Old Book<span class="owned-content">owned</span></a>'
+        '<a class="featured sources-listing--item" href="sources/dnd/new">New Book</a>'
+        '<a class="sources-listing--items" href="sources/dnd/not">Not a Book</a>'
+        '</body></html>'
+    )
+    books = make_sources(tmp_path).parse_books(html_text)
+    assert [(b['name'], b['owned_content']) for b in books] == [('Old Book', True), ('New Book', False)]
+    assert books[0]['url'] == 'https://www.dndbeyond.com/sources/dnd/old'
+    assert books[0]['path'] == str(tmp_path / 'sources' / 'old')
+
+def test_new_format_source_cards(tmp_path):
+    html_text = (
+        '<html><body><div id="S:0">'
+        '<div class="SourceCard_nameGroup__x"><a href="/sources/dnd/lmop">Lost Mine of Phandelver</a><p>Purchased</p></div>'
+        '<div class="SourceCard_nameGroup__x"><a href="/sources/dnd/cos">Curse of Strahd</a><p>Locked</p></div>'
+        '</div></body></html>'
+    )
+    books = make_sources(tmp_path).parse_books(html_text)
+    assert [(b['acronym'], b['owned_content']) for b in books] == [('LMoP', True), ('CoS', False)]
+
+def test_books_cache_keeps_the_most_recently_used_files(tmp_path, monkeypatch):
+    monkeypatch.setattr(sources_module, 'BOOKS_CACHE', OrderedDict())
+    monkeypatch.setattr(sources_module, 'BOOKS_CACHE_SIZE', 2)
+    card = '<div class="SourceCard_nameGroup__x"><a href="/sources/dnd/{0}">Book {0}</a><p>Purchased</p></div>'
+    sources = []
+    for name in ['a', 'b', 'c']:
+        path = str(tmp_path / f'{name}.html')
+        with open(path, 'w') as fout:
+            fout.write(f'<html><body><div id="S:0">{card.format(name)}</div></body></html>')
+        sources.append(Sources(path=path))
+
+    assert sources[0].load_books()[0]['name'] == 'Book a'
+    sources[1].load_books()
+    sources[0].load_books()
+    sources[2].load_books()
+    assert list(sources_module.BOOKS_CACHE) == [sources[0].path, sources[2].path]
+
+    # cached books are copies
+    sources[2].load_books()[0]['name'] = 'changed'
+    assert sources[2].load_books()[0]['name'] == 'Book c'
@@ -0,0 +1,40 @@
+import os
+import time
+
+from ddb_library.stat_index import StatIndex
+
+def test_query_accepts_extraction_options(library):
+    expected = library.query_monsters(cr_min=1, save=False, logging=False)
+    assert expected
+    assert library.query_monsters(cr_min=1, save=False, logging=False, workers=2) == expected
+    assert library.query_monsters(cr_min=1, save=False, logging=False, prefetch=False) == expected
+
+def test_refresh_selected_books_keeps_other_books(library):
+    index = StatIndex()
+    assert index.refresh(library) == 4
+    pages = dict(index.pages)
+
+    assert index.refresh(library, acronyms=['LMoP']) == 0
+    assert index.pages == pages and list(index.pages) == list(pages)
+    assert index.refresh(library, names=['Volos Guide to Monsters']) == 0
+    assert index.pages == pages
+
+    chapter = [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+    modified = time.time() + 10
+    os.utime(chapter.path, (modified, modified))
+    chapter.modified = os.path.getmtime(chapter.path)
+
+    assert index.refresh(library, acronyms=['VGtM']) == 0
+    assert index.refresh(library, acronyms=['LMoP']) == 1
+    assert list(index.pages) == list(pages)
+    assert index.pages[chapter.path]['modified'] == chapter.modified
+    assert {path: v for path, v in index.pages.items() if path != chapter.path} == \
+        {path: v for path, v in pages.items() if path != chapter.path}
+    assert index.refresh(library) == 0
+
+def test_refresh_skipped_books_keeps_their_rows(library):
+    index = StatIndex()
+    index.refresh(library)
+    pages = dict(index.pages)
+    assert index.refresh(library, skip_books=['Lost Mine of Phandelver']) == 0
+    assert index.pages == pages
@@ -0,0 +1,64 @@
+import os
+
+from ddb_library import LibraryWatcher
+from ddb_library import watcher as watcher_module
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+def chapter(library):
+    return [p for p in library.book(acronym='LMoP').pages if p.file == 'chapter-1.html'][0]
+
+def rewrite(path, old, new, modified):
+    with open(path, 'r') as fin:
+        html_text = fin.read()
+    with open(path, 'w') as fout:
+        fout.write(html_text.replace(old, new))
+    os.utime(path, (modified, modified))
+
+def test_changes_are_applied_once_settled(library, monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(watcher_module.time, 'monotonic', clock)
+    watcher = LibraryWatcher(library, debounce=5, logging=False)
+    watcher.load_content()
+    generation = watcher.generation
+    assert not any('Hobgoblin' in c.to_json() for c in watcher.get_content())
+
+    page = chapter(library)
+    rewrite(page.path, 'Goblin', 'Hobgoblin', page.modified + 100)
+    assert watcher.poll() == set()
+    assert watcher.pending == {page.path}
+
+    # another change before the first settles restarts the wait
+    clock.now += 4
+    intro = [p for p in library.book(acronym='LMoP').pages if p.file == 'intro.html'][0]
+    os.utime(intro.path, (intro.modified + 100, intro.modified + 100))
+    assert watcher.poll() == set()
+    clock.now += 4
+    assert watcher.poll() == set()
+    assert watcher.generation == generation
+
+    clock.now += 1
+    assert watcher.poll() == {page.path, intro.path}
+    assert watcher.pending == set() and watcher.generation == generation + 1
+    assert page.modified == os.path.getmtime(page.path)
+    assert any('Hobgoblin' in c.to_json() for c in watcher.get_content())
+    assert os.path.isfile(os.path.join(library.path, 'library.json'))
+    assert watcher.poll() == set()
+
+def test_removed_pages_drop_their_content(library):
+    watcher = LibraryWatcher(library, debounce=0, checkpoint=False, logging=False)
+    watcher.load_content()
+    page = chapter(library)
+    assert watcher.content[page.path] or watcher.encounters[page.path]
+
+    os.remove(page.path)
+    watcher.poll()
+    assert watcher.poll() == {page.path}
+    assert page.path not in watcher.content and page.path not in watcher.encounters
+    assert library.book(acronym='LMoP').page(path=page.path) is None
+    assert not any(e['path'] == page.path for e in watcher.get_encounters())